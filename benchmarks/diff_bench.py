@@ -0,0 +1,58 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Compares a textual diff of the YAML outputs of two renders (previous workflow, with difflib) against the
+structural diff of the definitions, for a change to a few services and the ports of one service reordered.
+The time to dump the YAML outputs is reported on its own, along with the number of lines of each diff.
+
+Usage: PYTHONPATH=. python benchmarks/diff_bench.py [services] [changed services]
+"""
+
+import difflib
+import sys
+import time
+from copy import deepcopy
+
+from benchmarks.generators import ProjectShape, project_contents, project_environ
+from compose_x_render.compose_x_render import (
+    ComposeDefinition,
+    merge_config_files_chain,
+)
+from compose_x_render.diff import diff_definitions, format_changes
+from compose_x_render.output import dump_output
+
+if __name__ == "__main__":
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    changed = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    shape = ProjectShape(services=services)
+    environ = project_environ(shape)
+    merged = merge_config_files_chain(project_contents(shape), environ)
+    old = ComposeDefinition(None, content=deepcopy(merged), environ=environ).definition
+    new = deepcopy(old)
+    names = sorted(new["services"])
+    for name in names[:: max(1, len(names) // changed)][:changed]:
+        new["services"][name]["image"] = f"{new['services'][name]['image']}-changed"
+    new["services"][names[-1]]["ports"].reverse()
+
+    start = time.perf_counter()
+    old_text, new_text = dump_output(old), dump_output(new)
+    dump_duration = time.perf_counter() - start
+    start = time.perf_counter()
+    text_diff = list(
+        difflib.unified_diff(
+            old_text.splitlines(), new_text.splitlines(), lineterm="", n=0
+        )
+    )
+    text_duration = time.perf_counter() - start
+    start = time.perf_counter()
+    changes = diff_definitions(old, new)
+    structural_duration = time.perf_counter() - start
+    structural_diff = format_changes(changes).splitlines()
+
+    print(f"yaml dump  {dump_duration:8.3f}s")
+    print(f"difflib    {text_duration:8.3f}s  {len(text_diff)} lines")
+    print(
+        f"structural {structural_duration:8.3f}s  {len(structural_diff)} lines"
+        f"  x{(dump_duration + text_duration) / structural_duration:.1f} with the dump"
+    )
@@ -0,0 +1,80 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Compares writing a rendered definition with yaml.safe_dump into a string then into the file (previous behaviour)
+against dump_yaml streaming into the file, on a ~5MB output, all ASCII, then with a non-ASCII label in one
+service. Reports the emit time and the peak memory allocated by python while emitting, and checks both outputs
+are identical.
+
+Usage: python benchmarks/dump_bench.py [services]
+"""
+
+import sys
+import time
+import tracemalloc
+from tempfile import TemporaryDirectory
+
+import yaml
+
+from benchmarks.generators import ProjectShape, project_contents, project_environ
+from compose_x_render.compose_x_render import (
+    interpolate_env_vars,
+    merge_config_files_chain,
+    render_services_ports,
+)
+from compose_x_render.yaml_dumper import c_emittable, dump_yaml
+
+
+def legacy_write(definition: dict, file_path: str) -> None:
+    content = yaml.safe_dump(definition)
+    with open(file_path, "w") as file_fd:
+        file_fd.write(content)
+
+
+def streamed_write(definition: dict, file_path: str) -> None:
+    with open(file_path, "w") as file_fd:
+        dump_yaml(definition, file_fd)
+
+
+def measure(function, *args) -> tuple:
+    """Returns the duration of the call, and its peak memory measured on a second, traced, call"""
+    start = time.perf_counter()
+    function(*args)
+    duration = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duration, peak
+
+
+if __name__ == "__main__":
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 2500
+    shape = ProjectShape(services=services, extensions=2000, depth=2)
+    environ = project_environ(shape)
+    definition = merge_config_files_chain(project_contents(shape), environ)
+    render_services_ports(definition["services"])
+    interpolate_env_vars(definition, "", environ)
+    non_ascii = dict(definition, services=dict(definition["services"]))
+    first_service = next(iter(non_ascii["services"]))
+    non_ascii["services"][first_service] = dict(
+        non_ascii["services"][first_service], labels={"team": "équipe données"}
+    )
+    for case, content in [("ASCII", definition), ("one non-ASCII label", non_ascii)]:
+        print(f"{case}: C emittable: {c_emittable(content)}")
+        with TemporaryDirectory() as directory:
+            results = {}
+            for name, function in [
+                ("legacy", legacy_write),
+                ("streamed", streamed_write),
+            ]:
+                file_path = f"{directory}/{name}.yaml"
+                duration, peak = measure(function, content, file_path)
+                with open(file_path) as file_fd:
+                    results[name] = file_fd.read()
+                print(
+                    f"  {name:<10} {duration:8.3f}s  peak {peak / 1024 / 1024:8.2f}MiB"
+                    f"  output {len(results[name]) / 1024 / 1024:.2f}MiB"
+                )
+            print(f"  Identical outputs: {results['legacy'] == results['streamed']}")
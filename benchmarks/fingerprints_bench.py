@@ -0,0 +1,53 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Measures fingerprinting a large rendered definition, against dumping its YAML output, which the fingerprints
+manifest is written along with, and checks one changed service only changes its own fingerprint.
+
+Usage: PYTHONPATH=. python benchmarks/fingerprints_bench.py [services]
+"""
+
+import sys
+import time
+from copy import deepcopy
+
+from benchmarks.generators import ProjectShape, project_contents, project_environ
+from compose_x_render.compose_x_render import (
+    ComposeDefinition,
+    merge_config_files_chain,
+)
+from compose_x_render.fingerprints import definition_fingerprints
+from compose_x_render.output import dump_output
+
+if __name__ == "__main__":
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    shape = ProjectShape(services=services)
+    environ = project_environ(shape)
+    merged = merge_config_files_chain(project_contents(shape), environ)
+    definition = ComposeDefinition(None, content=merged, environ=environ).definition
+
+    start = time.perf_counter()
+    dump_output(definition)
+    dump_duration = time.perf_counter() - start
+    start = time.perf_counter()
+    fingerprints = definition_fingerprints(definition)
+    fingerprints_duration = time.perf_counter() - start
+    print(f"yaml dump    {dump_duration:8.3f}s")
+    print(
+        f"fingerprints {fingerprints_duration:8.3f}s"
+        f"  {fingerprints_duration / dump_duration:.0%} of the dump"
+    )
+
+    changed = deepcopy(definition)
+    name = next(iter(changed["services"]))
+    changed["services"][name]["image"] = "changed"
+    changed_fingerprints = definition_fingerprints(changed)
+    print(
+        "Changed services:",
+        [
+            service
+            for service, value in changed_fingerprints["services"].items()
+            if value != fingerprints["services"][service]
+        ],
+    )
@@ -0,0 +1,182 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Generators of synthetic compose projects, to benchmark compose_x_render at any size.
+
+The shape of a project is set by a few parameters:
+
+* services: number of services in the base file
+* ports: number of ports per service, in the short and long syntaxes
+* depth: number of override files applied on top of the base file
+* extensions: number of resources in each ``x-*`` section
+* interpolation: share (0 to 1) of the string values that reference environment variables
+
+The same parameters always generate the same content.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+from dataclasses import asdict, dataclass
+from os import path
+
+import yaml
+
+EXTENSIONS_SECTIONS = ["x-sqs", "x-s3", "x-dynamodb"]
+VARIABLES_COUNT = 50
+
+
+@dataclass(frozen=True)
+class ProjectShape:
+    services: int = 50
+    ports: int = 2
+    depth: int = 3
+    extensions: int = 20
+    interpolation: float = 0.2
+    seed: int = 42
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def maybe_interpolated(value: str, rng: random.Random, shape: ProjectShape) -> str:
+    """Returns the value, or a variable reference defaulting to it, depending on the interpolation density."""
+    if rng.random() >= shape.interpolation:
+        return value
+    variable = f"BENCH_VAR_{rng.randrange(VARIABLES_COUNT)}"
+    return rng.choice(
+        [
+            f"${{{variable}:-{value}}}",
+            f"${{{variable}-{value}}}",
+            f"{value}-${variable}",
+        ]
+    )
+
+
+def service_ports(service: int, shape: ProjectShape) -> list:
+    ports = []
+    for count in range(shape.ports):
+        published = 10000 + service * shape.ports + count
+        if count % 3 == 0:
+            ports.append(f"{published}:{80 + count}")
+        elif count % 3 == 1:
+            ports.append(f"{published}:{80 + count}/udp")
+        else:
+            ports.append(
+                {"target": 80 + count, "published": published, "protocol": "tcp"}
+            )
+    return ports
+
+
+def base_content(shape: ProjectShape) -> dict:
+    rng = random.Random(shape.seed)
+    services = {}
+    for count in range(shape.services):
+        services[f"app{count:04d}"] = {
+            "image": maybe_interpolated(f"registry/app{count}:latest", rng, shape),
+            "ports": service_ports(count, shape),
+            "environment": {
+                f"SETTING_{setting}": maybe_interpolated(f"value{setting}", rng, shape)
+                for setting in range(5)
+            },
+            "volumes": [f"data{count}:/data", "shared:/shared"],
+            "secrets": ["shared_secret"],
+            "labels": {"team": maybe_interpolated("platform", rng, shape)},
+            "deploy": {
+                "resources": {"limits": {"cpus": "0.5", "memory": "512M"}},
+                "labels": {"ecs.task.family": f"family{count % 10}"},
+            },
+        }
+    content = {
+        "version": "3.8",
+        "services": services,
+        "volumes": {
+            "shared": {},
+            **{f"data{count}": {} for count in range(shape.services)},
+        },
+        "secrets": {"shared_secret": {"file": "./secret.txt"}},
+    }
+    for section in EXTENSIONS_SECTIONS:
+        content[section] = {
+            f"resource{count:04d}": {
+                "Properties": {
+                    "Name": maybe_interpolated(f"resource-{count}", rng, shape),
+                    "Tags": [{"Key": "team", "Value": "platform"}],
+                },
+                "Services": [
+                    {
+                        "name": f"app{(count + offset) % shape.services:04d}",
+                        "access": "RW",
+                    }
+                    for offset in range(2)
+                ],
+                "Settings": {"ManagedPolicyArns": ["arn:aws:iam::aws:policy/Admin"]},
+            }
+            for count in range(shape.extensions)
+        }
+    return content
+
+
+def override_content(number: int, shape: ProjectShape) -> dict:
+    rng = random.Random(shape.seed + number + 1)
+    changed = rng.sample(range(shape.services), max(1, shape.services // 4))
+    services = {}
+    for count in changed:
+        services[f"app{count:04d}"] = {
+            "image": maybe_interpolated(f"registry/app{count}:{number}", rng, shape),
+            "ports": service_ports(count + shape.services * (number + 1), shape)[:1],
+            "environment": {
+                f"OVERRIDE_{number}": maybe_interpolated("true", rng, shape)
+            },
+            "volumes": ["shared:/shared", f"override{number}:/override"],
+        }
+    content = {
+        "services": services,
+        "volumes": {f"override{number}": {}},
+    }
+    for section in EXTENSIONS_SECTIONS:
+        content[section] = {
+            f"resource{count:04d}": {
+                "Properties": {"Tags": [{"Key": "override", "Value": str(number)}]},
+                "Settings": {"ManagedPolicyArns": ["arn:aws:iam::aws:policy/Admin"]},
+            }
+            for count in rng.sample(
+                range(shape.extensions), max(0, shape.extensions // 4)
+            )
+        }
+    return content
+
+
+def project_contents(shape: ProjectShape) -> list[dict]:
+    """Returns the content of the base file followed by the override files"""
+    return [base_content(shape)] + [
+        override_content(number, shape) for number in range(shape.depth)
+    ]
+
+
+def project_environ(shape: ProjectShape) -> dict:
+    """The environment variables referenced by the project. Some are left undefined, to use the defaults."""
+    rng = random.Random(shape.seed)
+    return {
+        f"BENCH_VAR_{count}": f"env{count}"
+        for count in range(VARIABLES_COUNT)
+        if rng.random() < 0.5
+    }
+
+
+def write_project(shape: ProjectShape, directory: str) -> list[str]:
+    """
+    Writes the project files into the directory
+
+    :return: The files paths, base file first
+    """
+    os.makedirs(directory, exist_ok=True)
+    files_list = []
+    for count, content in enumerate(project_contents(shape)):
+        file_path = path.join(directory, f"docker-compose.{count:03d}.yaml")
+        with open(file_path, "w") as file_fd:
+            yaml.safe_dump(content, file_fd)
+        files_list.append(file_path)
+    return files_list
@@ -0,0 +1,73 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Compares the regex based expandvars (previous implementation, kept below as legacy_expandvars)
+against the compiled templates engine, over a mix of strings with and without variables.
+
+Usage: python benchmarks/interpolation_bench.py [iterations]
+"""
+
+import os
+import re
+import sys
+import timeit
+
+from compose_x_render.envsubst import (
+    IF_DEFINED,
+    IF_ESCAPED,
+    IF_LITTERAL,
+    IF_UNDEFINED,
+    SPECIAL_INTERPOLATION,
+    expandvars,
+)
+
+STRINGS = [
+    "nginx:latest",
+    "/var/tmp/shared",
+    "${IMAGE_REGISTRY}/app:${IMAGE_TAG:-latest}",
+    "$LOG_LEVEL",
+    "${AWS::Region}-${ENV_NAME}",
+    "\\$ESCAPED and ${!LITTERAL}",
+    "${DEFINED_VAR:+override-${IMAGE_TAG}}",
+    "net.core.somaxconn=2048",
+]
+
+
+def legacy_expandvars(path, default=None, skip_escaped=True, enable_litteral=True):
+    def replace_var(match):
+        if IF_LITTERAL.match(match.group(0)) and enable_litteral:
+            return re.sub(r"\!", "", IF_LITTERAL.match(match.group(0)).group(0))
+        if re.match(SPECIAL_INTERPOLATION, match.group(0)):
+            groups = re.findall(SPECIAL_INTERPOLATION, match.group(0))
+            if groups[0][-2] == IF_UNDEFINED:
+                return os.environ.get(groups[0][-3]) or legacy_expandvars(
+                    groups[0][-1], default, skip_escaped
+                )
+            elif groups[0][-2] == IF_DEFINED:
+                return legacy_expandvars(groups[0][-1])
+        return os.environ.get(
+            match.group(2) or match.group(1),
+            match.group(0) if default is None else default,
+        )
+
+    re_string = (IF_ESCAPED if skip_escaped else "") + r"\$(\w+|\{(?!AWS::)([^}]*)\})"
+    return re.sub(re_string, replace_var, path)
+
+
+def main(iterations: int = 20000):
+    os.environ.update({"IMAGE_REGISTRY": "registry.local", "DEFINED_VAR": "yes"})
+    for string in STRINGS:
+        assert expandvars(string, default="") == legacy_expandvars(string, default="")
+    for name, func in [("legacy", legacy_expandvars), ("compiled", expandvars)]:
+        duration = timeit.timeit(
+            lambda: [func(string, default="") for string in STRINGS],
+            number=iterations,
+        )
+        print(
+            f"{name:>10}: {duration / (iterations * len(STRINGS)) * 1e6:.3f} us/string"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,94 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Compares the previous lists merge, which filtered the lists once per type of item and deduplicated the strings
+through a set, against the single pass merge with fingerprints, on volumes and secrets lists of thousands of entries.
+
+Usage: python benchmarks/lists_bench.py [iterations]
+"""
+
+import sys
+import timeit
+
+from compose_x_render.list_management import handle_lists_merges
+
+
+def set_from_dict(input_dict: dict):
+    return frozenset(
+        (k, set_from_dict(v) if isinstance(v, dict) else v)
+        for k, v in input_dict.items()
+    )
+
+
+def uniqfy_list_of_dict(input_list: list) -> list:
+    seen = set()
+    result = []
+    for dict_in_list in input_list:
+        representation = set_from_dict(dict_in_list)
+        if representation in seen:
+            continue
+        result.append(dict_in_list)
+        seen.add(representation)
+    return result
+
+
+def legacy_handle_lists_merges(original_list, override_list, uniqfy=False) -> list:
+    final_list = []
+    final_list += [item for item in original_list if isinstance(item, dict)]
+    final_list += [item for item in override_list if isinstance(item, dict)]
+    if uniqfy:
+        final_list = uniqfy_list_of_dict(final_list)
+    original_str_items = [item for item in original_list if isinstance(item, str)]
+    final_list += list(
+        set(
+            original_str_items
+            + [item for item in override_list if isinstance(item, str)]
+        )
+    )
+    return final_list
+
+
+def volumes(count: int, offset: int = 0) -> list:
+    return [f"data{number + offset}:/data/{number + offset}" for number in range(count)]
+
+
+def long_volumes(count: int, offset: int = 0) -> list:
+    return [
+        {
+            "type": "volume",
+            "source": f"data{number + offset}",
+            "target": f"/data/{number + offset}",
+            "volume": {"nocopy": True},
+        }
+        for number in range(count)
+    ]
+
+
+def secrets(count: int, offset: int = 0) -> list:
+    return [
+        {"source": f"secret{number + offset}", "target": f"/run/secrets/{number}"}
+        for number in range(count)
+    ]
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for count in [100, 1000, 5000]:
+        cases = {
+            "short volumes": (volumes(count), volumes(count, count // 2)),
+            "long volumes": (long_volumes(count), long_volumes(count, count // 2)),
+            "secrets": (secrets(count), secrets(count, count // 2)),
+        }
+        for name, (original, override) in cases.items():
+            for label, function in [
+                ("legacy", legacy_handle_lists_merges),
+                ("single pass", handle_lists_merges),
+            ]:
+                duration = timeit.timeit(
+                    lambda: function(original, override, uniqfy=True),
+                    number=iterations,
+                )
+                print(
+                    f"{count:>5} {name:<14} {label:<12} {duration / iterations * 1000:9.3f}ms"
+                )
@@ -0,0 +1,66 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Compares loading a multi-megabyte compose file with the previous YAML -> JSON -> python round trip
+against the normalizing loader used by load_compose_file, in time and peak memory.
+
+Usage: python benchmarks/load_bench.py [services_count]
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+from os import path
+from tempfile import TemporaryDirectory
+
+import yaml
+
+from compose_x_render.compose_x_render import load_compose_file
+
+
+def round_trip_load(file_path):
+    with open(file_path) as composex_fd:
+        return json.loads(
+            json.dumps(yaml.load(composex_fd.read(), Loader=yaml.CLoader))
+        )
+
+
+def generate_compose_file(file_path: str, services_count: int) -> None:
+    services = {}
+    for count in range(services_count):
+        services[f"app{count:05d}"] = {
+            "image": f"registry.local/app{count:05d}:latest",
+            "environment": {f"VAR_{var}": f"value-{var}" for var in range(20)},
+            "ports": [f"{8000 + port}:{port}" for port in range(1, 6)],
+            "labels": {f"label.{label}": str(label) for label in range(10)},
+            "volumes": [f"vol{count}:/var/data/{count}"],
+        }
+    with open(file_path, "w") as file_fd:
+        yaml.safe_dump({"version": "3.8", "services": services}, file_fd)
+
+
+def measure(func, file_path):
+    start = time.perf_counter()
+    func(file_path)
+    duration = time.perf_counter() - start
+    tracemalloc.start()
+    func(file_path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duration, peak
+
+
+def main(services_count: int = 3000):
+    temp_dir = TemporaryDirectory()
+    file_path = path.join(temp_dir.name, "docker-compose.yaml")
+    generate_compose_file(file_path, services_count)
+    print(f"File size: {path.getsize(file_path) / 1024 / 1024:.1f} MB")
+    for name, func in [("round-trip", round_trip_load), ("loader", load_compose_file)]:
+        duration, peak = measure(func, file_path)
+        print(f"{name:>12}: {duration:.3f}s, peak {peak / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
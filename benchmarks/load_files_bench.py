@@ -0,0 +1,66 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Wall-clock time to load a synthetic 20 files project (4 large generated x-* resources files and 16 small
+override files) with load_compose_files, for a varying number of jobs.
+
+Usage: python benchmarks/load_files_bench.py
+"""
+
+import os
+import time
+from os import path
+from tempfile import TemporaryDirectory
+
+import yaml
+
+from compose_x_render.compose_x_render import load_compose_files
+
+
+def generate_project(directory: str) -> list[str]:
+    files_list = []
+    for number in range(20):
+        if number % 5 == 0:
+            content = {
+                f"x-resources{number}": {
+                    f"queue{count}": {
+                        "Properties": {"DelaySeconds": count, "Tags": [f"t{count}"]},
+                        "Settings": {"Subscriptions": [f"arn:aws:sns:{count}"]},
+                    }
+                    for count in range(15000)
+                }
+            }
+        else:
+            content = {
+                "services": {
+                    f"app{count}": {"image": f"app{count}:{number}", "ports": ["80"]}
+                    for count in range(20)
+                }
+            }
+        file_path = path.join(directory, f"docker-compose.{number:02d}.yaml")
+        with open(file_path, "w") as file_fd:
+            yaml.safe_dump(content, file_fd)
+        files_list.append(file_path)
+    return files_list
+
+
+def main():
+    temp_dir = TemporaryDirectory()
+    files_list = generate_project(temp_dir.name)
+    size = sum(path.getsize(file_path) for file_path in files_list)
+    print(
+        f"{len(files_list)} files, {size / 1024 / 1024:.1f} MB, {os.cpu_count()} CPUs"
+    )
+    reference = None
+    for jobs in [1, 2, 4, 8]:
+        start = time.perf_counter()
+        contents = load_compose_files(files_list, jobs=jobs)
+        print(f"jobs={jobs}: {time.perf_counter() - start:.3f}s")
+        if reference is None:
+            reference = contents
+        assert contents == reference
+
+
+if __name__ == "__main__":
+    main()
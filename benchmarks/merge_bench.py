@@ -0,0 +1,60 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Measures the time and memory allocated by merge_config_files when merging an override into a definition
+with a large x-* resources section, for varying base sizes and override sizes.
+
+With copy-on-write merging, allocations follow the override size, not the base size.
+
+Usage: python benchmarks/merge_bench.py
+"""
+
+import time
+import tracemalloc
+
+from compose_x_render.compose_x_render import merge_config_files
+
+
+def resources(count: int, offset: int = 0) -> dict:
+    return {
+        f"resource{number}": {
+            "Properties": {"Name": f"resource{number}", "Tags": [f"tag{number}"]},
+            "Settings": {"Subscriptions": [{"Endpoint": f"arn:{number}"}]},
+        }
+        for number in range(offset, offset + count)
+    }
+
+
+def measure(base_size: int, override_size: int):
+    base = {
+        "services": {"app": {"image": "nginx"}},
+        "x-sns": resources(base_size),
+    }
+    override = {"x-sns": resources(override_size, offset=base_size // 2)}
+    tracemalloc.start()
+    start = time.perf_counter()
+    merge_config_files(base, override)
+    duration = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duration, allocated
+
+
+def main():
+    print(f"{'base':>8} {'override':>8} {'time (ms)':>10} {'allocated (KB)':>15}")
+    for base_size, override_size in [
+        (1000, 10),
+        (10000, 10),
+        (100000, 10),
+        (10000, 100),
+        (10000, 1000),
+    ]:
+        duration, allocated = measure(base_size, override_size)
+        print(
+            f"{base_size:>8} {override_size:>8} {duration * 1000:>10.2f} {allocated / 1024:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
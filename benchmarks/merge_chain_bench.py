@@ -0,0 +1,79 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Compares folding compose files pairwise with merge_config_files against merging them all at once with
+merge_config_files_chain, for override chains of 2 to 50 files.
+
+Usage: python benchmarks/merge_chain_bench.py
+"""
+
+import time
+from copy import deepcopy
+
+from compose_x_render.compose_x_render import (
+    merge_config_files,
+    merge_config_files_chain,
+)
+
+
+def base_content(services_count: int, resources_count: int) -> dict:
+    return {
+        "version": "3.8",
+        "services": {
+            f"app{count}": {
+                "image": f"app{count}:latest",
+                "ports": [f"{8000 + count}:80", "443"],
+                "environment": {"LOG_LEVEL": "INFO"},
+                "volumes": [f"data{count}:/data"],
+            }
+            for count in range(services_count)
+        },
+        "x-sqs": {
+            f"queue{count}": {"Properties": {"DelaySeconds": count}}
+            for count in range(resources_count)
+        },
+    }
+
+
+def override_content(number: int, services_count: int) -> dict:
+    return {
+        "services": {
+            f"app{(number * 7 + count) % services_count}": {
+                "image": f"app:{number}",
+                "ports": [f"{9000 + count}:90"],
+                "environment": {f"OVERRIDE_{number}": "true"},
+            }
+            for count in range(10)
+        },
+        "x-sqs": {f"queue{number}": {"Properties": {"MessageRetentionPeriod": 60}}},
+    }
+
+
+def pairwise(contents):
+    merged = contents[0]
+    for content in contents[1:]:
+        merge_config_files(merged, content)
+    return merged
+
+
+def main(services_count: int = 200, resources_count: int = 5000):
+    print(f"{'files':>6} {'pairwise (ms)':>14} {'chain (ms)':>11}")
+    for chain_length in [2, 5, 10, 20, 50]:
+        contents = [base_content(services_count, resources_count)] + [
+            override_content(number, services_count)
+            for number in range(1, chain_length)
+        ]
+        durations = []
+        for func in [pairwise, merge_config_files_chain]:
+            copied = deepcopy(contents)
+            start = time.perf_counter()
+            func(copied)
+            durations.append(time.perf_counter() - start)
+        print(
+            f"{chain_length:>6} {durations[0] * 1000:>14.2f} {durations[1] * 1000:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
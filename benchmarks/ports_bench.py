@@ -0,0 +1,106 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Compares the previous ports normalization and merge, which scanned the ports list for every port added,
+against the indexed PortTable, for services with up to 10k ports.
+
+Usage: python benchmarks/ports_bench.py
+"""
+
+import time
+
+from compose_x_common.compose_x_common import keyisset
+
+from compose_x_render.compose_x_render import merge_ports
+from compose_x_render.networking import normalize_port, set_service_ports
+
+
+def legacy_replace_published_port(service_ports, published_port, new_definition):
+    for port in service_ports:
+        if keyisset("published", port) and port["published"] == published_port:
+            port["target"] = new_definition["target"]
+            break
+
+
+def legacy_add_port_to_service_ports(service_ports, new_port):
+    same_protocol_published_ports = [
+        s_port
+        for s_port in service_ports
+        if s_port["protocol"] == new_port["protocol"] and keyisset("published", s_port)
+    ]
+    same_protocol_target_not_published_ports = [
+        s_port
+        for s_port in service_ports
+        if s_port["protocol"] == new_port["protocol"]
+        and not keyisset("published", s_port)
+    ]
+    if not service_ports:
+        service_ports.append(new_port)
+    elif not keyisset("published", new_port):
+        if new_port["target"] not in [
+            _port["target"] for _port in same_protocol_target_not_published_ports
+        ]:
+            service_ports.append(new_port)
+    elif new_port["published"] not in [
+        _port["published"] for _port in same_protocol_published_ports
+    ]:
+        service_ports.append(new_port)
+    else:
+        legacy_replace_published_port(service_ports, new_port["published"], new_port)
+
+
+def legacy_set_service_ports(ports):
+    service_ports = []
+    for src_port in ports:
+        legacy_add_port_to_service_ports(service_ports, normalize_port(src_port))
+    return service_ports
+
+
+def legacy_merge_ports(source_ports, new_ports):
+    f_source_ports = legacy_set_service_ports(source_ports)
+    f_override_ports = legacy_set_service_ports(new_ports)
+    f_overide_ports_targets = [port["target"] for port in f_override_ports]
+    new_ports = []
+    for port in f_override_ports:
+        new_ports.append(port)
+        for s_port in f_source_ports:
+            if s_port["target"] not in f_overide_ports_targets:
+                new_ports.append(s_port)
+    return new_ports
+
+
+def relay_ports(count: int, offset: int = 0) -> list:
+    """Media relays like ports: mostly published UDP ports, some TCP, some duplicates"""
+    ports = []
+    for number in range(count):
+        published = 10000 + (number + offset) % (count - count // 10 or 1)
+        if number % 4 == 0:
+            ports.append(f"{published}:{published}")
+        elif number % 4 == 3:
+            ports.append(number % 1000)
+        else:
+            ports.append(f"{published}:{published + offset}/udp")
+    return ports
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    for count in [100, 1000, 3000, 10000]:
+        ports = relay_ports(count)
+        override = relay_ports(count // 10, offset=7)
+        print(f"{count} ports")
+        if count <= 3000:
+            print(
+                f"  legacy set_service_ports  {timed(legacy_set_service_ports, ports):.4f}s"
+            )
+            print(
+                f"  legacy merge_ports        {timed(legacy_merge_ports, ports, override):.4f}s"
+            )
+        print(f"  set_service_ports         {timed(set_service_ports, ports):.4f}s")
+        print(f"  merge_ports               {timed(merge_ports, ports, override):.4f}s")
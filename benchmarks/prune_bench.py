@@ -0,0 +1,38 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Compares rendering a whole synthetic project (previous behaviour) against rendering one of its services with
+services=, which prunes the files before merging them, and checks the service renders the same either way.
+
+Usage: PYTHONPATH=. python benchmarks/prune_bench.py [services]
+"""
+
+import sys
+import time
+from tempfile import TemporaryDirectory
+
+from benchmarks.generators import ProjectShape, project_environ, write_project
+from compose_x_render.compose_x_render import ComposeDefinition
+from compose_x_render.validation import get_validator
+
+
+def timed_render(files: list[str], environ: dict, services: list = None) -> tuple:
+    start = time.perf_counter()
+    compose_file = ComposeDefinition(files, environ=environ, services=services)
+    return time.perf_counter() - start, compose_file.definition
+
+
+if __name__ == "__main__":
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    get_validator()
+    shape = ProjectShape(services=services)
+    environ = project_environ(shape)
+    with TemporaryDirectory() as directory:
+        files = write_project(shape, directory)
+        full_duration, full = timed_render(files, environ)
+        name = sorted(full["services"])[0]
+        pruned_duration, pruned = timed_render(files, environ, [name])
+    print(f"full       {full_duration:8.3f}s")
+    print(f"pruned     {pruned_duration:8.3f}s  x{full_duration / pruned_duration:.1f}")
+    print(f"Same service: {pruned['services'] == {name: full['services'][name]}}")
@@ -0,0 +1,53 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Compares rendering the services images of synthetic projects with a full render (previous behaviour) against
+a render projected onto services.*.image, and checks both give the same images.
+Both renders load all the files, the time it takes is reported on its own.
+
+Usage: PYTHONPATH=. python benchmarks/select_bench.py [services]
+"""
+
+import sys
+import time
+from tempfile import TemporaryDirectory
+
+from benchmarks.generators import ProjectShape, project_environ, write_project
+from compose_x_render.compose_x_render import ComposeDefinition, load_compose_files
+from compose_x_render.selection import SERVICES_IMAGES_SELECTION
+from compose_x_render.validation import get_validator
+
+
+def images(definition: dict) -> dict:
+    return {
+        name: service.get("image") for name, service in definition["services"].items()
+    }
+
+
+def timed_render(files: list[str], environ: dict, select: list = None) -> tuple:
+    start = time.perf_counter()
+    compose_file = ComposeDefinition(files, environ=environ, select=select)
+    return time.perf_counter() - start, images(compose_file.definition)
+
+
+if __name__ == "__main__":
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    get_validator()
+    shape = ProjectShape(services=services, extensions=50)
+    environ = project_environ(shape)
+    with TemporaryDirectory() as directory:
+        files = write_project(shape, directory)
+        start = time.perf_counter()
+        load_compose_files(files)
+        load_duration = time.perf_counter() - start
+        full_duration, full_images = timed_render(files, environ)
+        selected_duration, selected_images = timed_render(
+            files, environ, [SERVICES_IMAGES_SELECTION]
+        )
+    print(f"load       {load_duration:8.3f}s")
+    print(f"full       {full_duration:8.3f}s")
+    print(
+        f"selected   {selected_duration:8.3f}s  x{full_duration / selected_duration:.1f}"
+    )
+    print(f"Same images: {full_images == selected_images}")
@@ -0,0 +1,57 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Measures rendering the services of a large merged definition over 1 (single process, previous behaviour) to N
+processes with service_jobs, for each validation engine, and checks all renders are identical.
+Files are loaded and merged once beforehand: only the ports, interpolation and validation are measured.
+The speedup is bound by the number of CPUs available, reported first.
+
+Usage: PYTHONPATH=. python benchmarks/shards_bench.py [services] [jobs,jobs...]
+"""
+
+import os
+import sys
+import time
+from copy import deepcopy
+
+from benchmarks.generators import ProjectShape, project_contents, project_environ
+from compose_x_render.compose_x_render import (
+    ComposeDefinition,
+    merge_config_files_chain,
+)
+from compose_x_render.validation import VALIDATION_ENGINES, get_validator
+
+if __name__ == "__main__":
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    jobs_list = [
+        int(jobs)
+        for jobs in (sys.argv[2] if len(sys.argv) > 2 else "1,2,4,8").split(",")
+    ]
+    print(
+        f"CPUs: {len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}"
+    )
+    shape = ProjectShape(services=services)
+    environ = project_environ(shape)
+    merged = merge_config_files_chain(project_contents(shape), environ)
+    for engine in VALIDATION_ENGINES:
+        get_validator(engine)
+        reference = None
+        single = None
+        for jobs in jobs_list:
+            content = deepcopy(merged)
+            start = time.perf_counter()
+            definition = ComposeDefinition(
+                None,
+                content=content,
+                environ=environ,
+                validator_engine=engine,
+                service_jobs=jobs,
+            ).definition
+            duration = time.perf_counter() - start
+            if reference is None:
+                reference, single = definition, duration
+            print(
+                f"{engine:<12} jobs {jobs:<3} {duration:8.3f}s  x{single / duration:5.2f}"
+                f"  identical: {definition == reference}"
+            )
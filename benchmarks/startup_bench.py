@@ -0,0 +1,90 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Measures the CLI startup with ``python -X importtime``: for each invocation, reports the total import time,
+the wall time of the whole run, and which of the heavy dependencies got imported.
+--help, argument errors and cached outputs should not import yaml nor jsonschema.
+
+Usage: PYTHONPATH=. python benchmarks/startup_bench.py [runs]
+"""
+
+from __future__ import annotations
+
+import re
+import subprocess
+import sys
+import time
+from os import path
+from tempfile import TemporaryDirectory
+
+HEAVY_MODULES = [
+    "jsonschema",
+    "yaml",
+    "importlib_resources",
+    "compose_x_common.compose_x_common",
+]
+IMPORT_TIME_RE = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)$")
+TESTS_DIR = path.join(path.dirname(path.dirname(path.abspath(__file__))), "tests")
+
+
+def imported_modules(arguments: list[str], env: dict = None) -> dict[str, tuple]:
+    """
+    Runs the CLI with the arguments under ``-X importtime``.
+
+    :return: The cumulative import time, in microseconds, and the nesting depth, of each module imported.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "compose_x_render.cli"] + arguments,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    modules = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            modules[match.group(3)] = int(match.group(1)), len(match.group(2)) // 2
+    return modules
+
+
+def scenarios(cache_dir: str) -> dict[str, list[str]]:
+    """The CLI invocations to measure. The cached render expects cache_dir to hold its output."""
+    compose_file = path.join(TESTS_DIR, "valid_input.yaml")
+    return {
+        "help": ["--help"],
+        "argument error": ["-f", compose_file, "--format", "toml"],
+        "diff help": ["diff", "--help"],
+        "diff argument error": ["diff", "--old", compose_file],
+        "cached render": ["-f", compose_file, "--cache-dir", cache_dir],
+        "render": ["-f", compose_file, "--no-cache"],
+    }
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with TemporaryDirectory() as cache_dir:
+        invocations = scenarios(cache_dir)
+        subprocess.run(
+            [sys.executable, "-m", "compose_x_render.cli"]
+            + invocations["cached render"],
+            capture_output=True,
+            check=True,
+        )
+        for name, arguments in invocations.items():
+            modules = imported_modules(arguments)
+            start = time.perf_counter()
+            for _ in range(runs):
+                subprocess.run(
+                    [sys.executable, "-m", "compose_x_render.cli"] + arguments,
+                    capture_output=True,
+                )
+            duration = (time.perf_counter() - start) / runs
+            import_time = sum(
+                cumulative for cumulative, depth in modules.values() if not depth
+            )
+            heavy = [module for module in HEAVY_MODULES if module in modules]
+            print(
+                f"{name:<16} imports {import_time / 1000:8.1f}ms"
+                f"  run {duration * 1000:8.1f}ms  heavy: {', '.join(heavy) or '-'}"
+            )
@@ -0,0 +1,263 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Benchmarks each stage of a render (load, merge, ports, interpolation, validation, dump) separately and end to end,
+on synthetic projects (see benchmarks/generators.py).
+
+Every parameter accepts a comma separated list of values, and all the combinations are benchmarked.
+Results are written as JSON, and can be compared against the results of a previous run.
+
+Usage:
+    python benchmarks/suite.py --services 10,100 --depth 1,5 --output results.json
+    python benchmarks/suite.py --output new.json --compare results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from copy import deepcopy
+from datetime import datetime, timezone
+from tempfile import TemporaryDirectory
+from typing import Callable
+
+import yaml
+
+from benchmarks.generators import ProjectShape, project_environ, write_project
+from compose_x_render import __version__
+from compose_x_render.compose_x_render import (
+    ComposeDefinition,
+    interpolate_env_vars,
+    load_compose_files,
+    merge_config_files_chain,
+    render_services_ports,
+)
+from compose_x_render.envsubst import environ_snapshot
+from compose_x_render.output import dump_output
+from compose_x_render.validation import (
+    JSONSCHEMA_ENGINE,
+    VALIDATION_ENGINES,
+    get_validator,
+    validate_definition,
+)
+
+STAGES = ["load", "merge", "ports", "interpolation", "validation", "dump", "render"]
+RESULTS_FORMAT_VERSION = 1
+
+
+def measure(setup: Callable, stage: Callable, repeat: int) -> dict:
+    """
+    Times the stage repeat times. setup is called before each run, untimed, and its result passed to the stage.
+    """
+    timings = []
+    for _ in range(repeat):
+        value = setup()
+        start = time.perf_counter()
+        stage(value)
+        timings.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "max": max(timings),
+    }
+
+
+def benchmark_shape(
+    shape: ProjectShape,
+    repeat: int,
+    stages: list[str] = None,
+    validator_engine: str = JSONSCHEMA_ENGINE,
+) -> dict:
+    """
+    Benchmarks the stages for one project shape.
+
+    :return: The timings of each stage, by stage name
+    """
+    if stages is None:
+        stages = STAGES
+    environ = environ_snapshot(project_environ(shape))
+    get_validator(validator_engine)
+    results = {}
+    with TemporaryDirectory() as directory:
+        files_list = write_project(shape, directory)
+        contents = load_compose_files(files_list)
+        merged = merge_config_files_chain(deepcopy(contents), environ)
+        with_ports = deepcopy(merged)
+        render_services_ports(with_ports["services"])
+        interpolated = deepcopy(with_ports)
+        interpolate_env_vars(interpolated, "", environ)
+
+        def render(_):
+            ComposeDefinition(
+                files_list, environ=environ, validator_engine=validator_engine
+            ).write_output(f"{directory}/rendered.yaml")
+
+        runs = {
+            "load": (lambda: files_list, load_compose_files),
+            "merge": (
+                lambda: deepcopy(contents),
+                lambda value: merge_config_files_chain(value, environ),
+            ),
+            "ports": (
+                lambda: deepcopy(merged),
+                lambda value: render_services_ports(value["services"]),
+            ),
+            "interpolation": (
+                lambda: deepcopy(with_ports),
+                lambda value: interpolate_env_vars(value, "", environ),
+            ),
+            "validation": (
+                lambda: interpolated,
+                lambda value: validate_definition(value, engine=validator_engine),
+            ),
+            "dump": (lambda: interpolated, dump_output),
+            "render": (lambda: None, render),
+        }
+        for stage in stages:
+            results[stage] = measure(*runs[stage], repeat)
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(
+    shapes: list[ProjectShape],
+    repeat: int,
+    stages: list[str] = None,
+    validator_engine: str = JSONSCHEMA_ENGINE,
+) -> dict:
+    """Benchmarks all the shapes, and returns the results with the details of the run."""
+    results = []
+    for shape in shapes:
+        timings = benchmark_shape(shape, repeat, stages, validator_engine)
+        for stage, timing in timings.items():
+            results.append({"shape": shape.as_dict(), "stage": stage, **timing})
+    return {
+        "format": RESULTS_FORMAT_VERSION,
+        "metadata": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "version": __version__,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "yaml_libyaml": yaml.__with_libyaml__,
+            "validator_engine": validator_engine,
+        },
+        "results": results,
+    }
+
+
+def result_key(result: dict) -> str:
+    return json.dumps([result["shape"], result["stage"]], sort_keys=True)
+
+
+def compare(results: dict, baseline: dict) -> list[dict]:
+    """
+    Compares the median timings of the results with the ones of the baseline, for the benchmarks both have.
+
+    :return: The comparisons, with the ratio of the new median over the baseline one.
+    """
+    baseline_results = {
+        result_key(result): result for result in baseline.get("results", [])
+    }
+    comparisons = []
+    for result in results["results"]:
+        previous = baseline_results.get(result_key(result))
+        if previous is None:
+            continue
+        comparisons.append(
+            {
+                "shape": result["shape"],
+                "stage": result["stage"],
+                "baseline": previous["median"],
+                "median": result["median"],
+                "ratio": result["median"] / previous["median"],
+            }
+        )
+    return comparisons
+
+
+def shape_label(shape: dict) -> str:
+    return (
+        f"s={shape['services']} p={shape['ports']} d={shape['depth']} "
+        f"x={shape['extensions']} i={shape['interpolation']}"
+    )
+
+
+def values_list(cast: Callable) -> Callable:
+    return lambda value: [cast(item) for item in value.split(",")]
+
+
+def main(args: list[str] = None) -> int:
+    parser = argparse.ArgumentParser("Benchmarks compose_x_render render stages")
+    parser.add_argument("--services", type=values_list(int), default=[10, 100])
+    parser.add_argument("--ports", type=values_list(int), default=[2])
+    parser.add_argument("--depth", type=values_list(int), default=[3])
+    parser.add_argument("--extensions", type=values_list(int), default=[20])
+    parser.add_argument("--interpolation", type=values_list(float), default=[0.2])
+    parser.add_argument("--stages", type=values_list(str), default=STAGES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--validator", choices=VALIDATION_ENGINES, default=JSONSCHEMA_ENGINE
+    )
+    parser.add_argument("--output", help="File to write the JSON results into.")
+    parser.add_argument("--compare", help="JSON results of a previous run.")
+    options = parser.parse_args(args)
+    for stage in options.stages:
+        if stage not in STAGES:
+            parser.error(f"Invalid stage {stage}. Must be one of {STAGES}")
+    shapes = [
+        ProjectShape(*values)
+        for values in itertools.product(
+            options.services,
+            options.ports,
+            options.depth,
+            options.extensions,
+            options.interpolation,
+        )
+    ]
+    results = run_suite(shapes, options.repeat, options.stages, options.validator)
+    for result in results["results"]:
+        print(
+            f"{shape_label(result['shape']):<40} {result['stage']:<14}"
+            f" median {result['median'] * 1000:10.3f}ms"
+            f" min {result['min'] * 1000:10.3f}ms"
+        )
+    if options.output:
+        with open(options.output, "w") as output_fd:
+            json.dump(results, output_fd, indent=2)
+    if options.compare:
+        with open(options.compare) as baseline_fd:
+            comparisons = compare(results, json.load(baseline_fd))
+        print()
+        for comparison in comparisons:
+            print(
+                f"{shape_label(comparison['shape']):<40} {comparison['stage']:<14}"
+                f" {comparison['baseline'] * 1000:10.3f}ms ->"
+                f" {comparison['median'] * 1000:10.3f}ms x{comparison['ratio']:.2f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
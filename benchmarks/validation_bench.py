@@ -0,0 +1,63 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Compares the per-render cost of validating a definition by reloading the schema every time (previous behaviour)
+against the process-wide cached validator, and the jsonschema engine against the fast (generated code) engine
+on a project with many services.
+
+Usage: python benchmarks/validation_bench.py [iterations]
+"""
+
+import json
+import sys
+import timeit
+from copy import deepcopy
+from os import path
+
+import jsonschema
+from importlib_resources import files as pkg_files
+
+from compose_x_render.compose_x_render import load_compose_file
+from compose_x_render.validation import (
+    VALIDATION_ENGINES,
+    get_validator,
+    validate_definition,
+)
+
+HERE = path.abspath(path.dirname(__file__))
+DEFINITION = load_compose_file(path.join(HERE, "..", "tests", "valid_input.yaml"))
+LARGE_DEFINITION = deepcopy(DEFINITION)
+LARGE_DEFINITION["services"] = {
+    f"app{count:03d}": deepcopy(DEFINITION["services"]["app01"]) for count in range(400)
+}
+
+
+def reload_and_validate():
+    source = pkg_files("compose_x_render").joinpath("compose-spec.json")
+    jsonschema.validate(DEFINITION, json.loads(source.read_text()))
+
+
+def cached_validate():
+    validate_definition(DEFINITION)
+
+
+def main(iterations: int = 200):
+    get_validator()
+    for name, func in [("reload", reload_and_validate), ("cached", cached_validate)]:
+        duration = timeit.timeit(func, number=iterations)
+        print(f"{name:>8}: {duration / iterations * 1000:.3f} ms/render")
+    print("400 services:")
+    for engine in VALIDATION_ENGINES:
+        validator = get_validator(engine)
+        duration = timeit.timeit(
+            lambda: validate_definition(LARGE_DEFINITION, validator),
+            number=max(iterations // 20, 1),
+        )
+        print(
+            f"{engine:>12}: {duration / max(iterations // 20, 1) * 1000:.3f} ms/render"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,149 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to render many projects in one process, from a manifest.
+
+The manifest is a YAML (or JSON) file listing the projects::
+
+    projects:
+      - name: frontend
+        files:
+          - frontend/docker-compose.yaml
+          - frontend/docker-compose.prod.yaml
+        output: rendered/frontend.yaml
+        env:
+          IMAGE_TAG: v1.2.3
+
+Relative paths are relative to the manifest file. Values of ``env`` which are not strings, such as numbers, are
+converted to strings. Optional project keys are ``compose_x``, ``no_interpolate``
+and ``keep_if_undefined``, with the same meaning as the CLI options.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from os import path
+
+import yaml
+from compose_x_common.compose_x_common import keyisset
+
+from compose_x_render.compose_x_render import ComposeDefinition
+from compose_x_render.validation import JSONSCHEMA_ENGINE, get_validator
+
+
+def load_manifest(manifest_path: str) -> list[dict]:
+    """
+    Loads the projects from the manifest file, with paths resolved from the manifest location.
+
+    :param str manifest_path: Path to the manifest file
+    :return: The projects definitions
+    """
+    with open(manifest_path) as manifest_fd:
+        manifest = yaml.safe_load(manifest_fd)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("projects"), list):
+        raise ValueError(manifest_path, "must define a list of projects")
+    base_dir = path.dirname(path.abspath(manifest_path))
+    projects = []
+    for count, project in enumerate(manifest["projects"]):
+        if not keyisset("files", project) or not keyisset("output", project):
+            raise ValueError("Project", count, "must define files and output")
+        project = dict(project)
+        project.setdefault("name", f"project{count}")
+        project["files"] = [
+            path.join(base_dir, file_path) for file_path in project["files"]
+        ]
+        project["output"] = path.join(base_dir, project["output"])
+        env = project.get("env") or {}
+        if not isinstance(env, dict):
+            raise ValueError("Project", project["name"], "env must be a mapping")
+        project["env"] = {
+            str(key): "" if value is None else str(value) for key, value in env.items()
+        }
+        projects.append(project)
+    return projects
+
+
+def warm_up(validator_engine: str = JSONSCHEMA_ENGINE) -> None:
+    """Builds the process-wide state shared by all the renders of a process"""
+    get_validator(validator_engine)
+
+
+def render_project(project: dict, validator_engine: str = JSONSCHEMA_ENGINE) -> dict:
+    """
+    Renders one project of the manifest. Errors are reported in the result, not raised.
+
+    :param dict project: The project definition, from load_manifest
+    :param str validator_engine: The validation engine to use.
+    :return: The project name, status, duration and error if any.
+    """
+    start = time.perf_counter()
+    result = {"name": project["name"], "output": project["output"]}
+    try:
+        environ = dict(os.environ)
+        environ.update(project.get("env", {}))
+        compose_file = ComposeDefinition(
+            project["files"],
+            no_interpolate=keyisset("no_interpolate", project),
+            keep_if_undefined=keyisset("keep_if_undefined", project),
+            validator_engine=validator_engine,
+            environ=environ,
+        )
+        output_dir = path.dirname(project["output"])
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        compose_file.write_output(project["output"], keyisset("compose_x", project))
+        result["status"] = "success"
+    except Exception as error:
+        result["status"] = "failure"
+        result["error"] = f"{error.__class__.__name__}: {error}"
+    result["duration"] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def render_batch(
+    projects: list[dict], jobs: int = 1, validator_engine: str = JSONSCHEMA_ENGINE
+) -> dict:
+    """
+    Renders all the projects, over a processes pool if jobs is more than 1.
+    The validator is built before the workers start, and by each worker otherwise, so every render reuses it.
+
+    :param list[dict] projects: The projects, from load_manifest
+    :param int jobs: Number of projects to render in parallel
+    :param str validator_engine: The validation engine to use.
+    :return: The summary of the batch, with each project result.
+    """
+    start = time.perf_counter()
+    warm_up(validator_engine)
+    if jobs <= 1:
+        results = [render_project(project, validator_engine) for project in projects]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=warm_up, initargs=(validator_engine,)
+        ) as executor:
+            futures = [
+                executor.submit(render_project, project, validator_engine)
+                for project in projects
+            ]
+            results = []
+            for project, future in zip(projects, futures):
+                try:
+                    results.append(future.result())
+                except Exception as error:
+                    results.append(
+                        {
+                            "name": project["name"],
+                            "output": project["output"],
+                            "status": "failure",
+                            "error": f"{error.__class__.__name__}: {error}",
+                        }
+                    )
+    failures = [result for result in results if result["status"] != "success"]
+    return {
+        "projects": results,
+        "total": len(results),
+        "failures": len(failures),
+        "duration": round(time.perf_counter() - start, 6),
+    }
@@ -0,0 +1,142 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to cache rendered outputs on disk, addressed by the content of everything that can change them:
+
+* the content of the input files, in order. Renders are done from the same content that is hashed, so files
+  changed in the meantime cannot be stored under the key of their previous content.
+* the render flags (interpolation, output type)
+* the validator: the validation engine, and the schema of a custom validator
+* the package version
+* the values of the environment variables referenced in the input files
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from os import path
+from tempfile import NamedTemporaryFile
+from typing import Mapping, Union
+
+from compose_x_render import __version__
+
+DEFAULT_CACHE_MAX_SIZE = 256 * 1024 * 1024
+CACHE_DIR_ENV_VAR = "COMPOSE_X_RENDER_CACHE_DIR"
+VARIABLE_NAME_RE = re.compile(r"\$\{?!?(\w+)")
+
+
+def referenced_variables(text: str) -> set[str]:
+    """
+    Returns the names of the environment variables a file content may use.
+    Errs on the side of listing too many: escaped and nested variables are all included.
+    """
+    return set(VARIABLE_NAME_RE.findall(text))
+
+
+def validator_identity(validator, engine: str) -> dict:
+    """
+    Returns what identifies the validation of a render: the engine, or the type and schema digest of the
+    custom validator if one is set.
+    """
+    if validator is None:
+        return {"engine": engine}
+    schema = json.dumps(validator.schema, sort_keys=True, default=str)
+    return {
+        "engine": type(validator).__name__,
+        "schema": hashlib.sha256(schema.encode()).hexdigest(),
+    }
+
+
+def read_sources(files_list: list[str]) -> list[bytes]:
+    """Returns the content of the input files, in order, to compute the cache key of and render from."""
+    sources = []
+    for file_path in files_list:
+        with open(file_path, "rb") as file_fd:
+            sources.append(file_fd.read())
+    return sources
+
+
+class RenderCache:
+    """
+    Content addressed cache of rendered outputs, stored in a local directory.
+    Entries are written atomically. The least recently used entries are removed once the cache exceeds max_size.
+
+    :param str cache_dir: Directory to store the cached outputs into.
+    :param int max_size: Maximum size, in bytes, of the cache directory.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = DEFAULT_CACHE_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, sources: list[bytes], flags: dict, environ: Mapping[str, str]) -> str:
+        """
+        Computes the cache key of a render.
+
+        :param list[bytes] sources: The content of the input files, in order. See read_sources
+        :param dict flags: The render options that change the output
+        :param environ: The environment variables used to render
+        """
+        digest = hashlib.sha256()
+        variables = set()
+        for content in sources:
+            digest.update(hashlib.sha256(content).digest())
+            variables |= referenced_variables(content.decode("utf-8", "replace"))
+        environment = {name: environ.get(name) for name in sorted(variables)}
+        digest.update(
+            json.dumps(
+                {"version": __version__, "flags": flags, "environ": environment},
+                sort_keys=True,
+            ).encode()
+        )
+        return digest.hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return path.join(self.cache_dir, f"{key}.render")
+
+    def get(self, key: str) -> Union[str, None]:
+        """Returns the cached output, None if not in cache."""
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path) as entry_fd:
+                content = entry_fd.read()
+        except OSError:
+            return None
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return content
+
+    def put(self, key: str, content: str) -> None:
+        """Stores the output atomically, then evicts the least recently used entries if needed."""
+        with NamedTemporaryFile(
+            "w", dir=self.cache_dir, suffix=".tmp", delete=False
+        ) as entry_fd:
+            entry_fd.write(content)
+        os.replace(entry_fd.name, self.entry_path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".render"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+            total_size -= size
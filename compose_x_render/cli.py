@@ -1,21 +1,269 @@
 # SPDX-License-Identifier: MPL-2.0
 # Copyright 2020-2021 John Mille <john@compose-x.io>
 
-"""Console script for compose_x_render."""
+"""
+Console script for compose_x_render.
+
+Only the modules needed to parse the arguments are imported at startup. The rendering modules, and their
+dependencies, are imported once the arguments select a path that uses them, so that --help, argument errors,
+renders forwarded to a render server and cached outputs do not import yaml or jsonschema.
+"""
 
 import argparse
+import json
+import os
+import signal
 import sys
+from typing import Union
+
+from compose_x_render.cache import CACHE_DIR_ENV_VAR
+from compose_x_render.client import SOCKET_ENV_VAR, send_request
+from compose_x_render.consts import COMPOSE_FILES_ARG, COMPOSE_X_ARG
+from compose_x_render.output import (
+    DIFF_FORMATS,
+    OUTPUT_FORMATS,
+    TEXT_FORMAT,
+    YAML_FORMAT,
+)
+from compose_x_render.selection import SERVICES_IMAGES_SELECTION
+from compose_x_render.validation import JSONSCHEMA_ENGINE, VALIDATION_ENGINES
+
+
+def batch(arguments: list[str]) -> int:
+    """Renders all the projects of a manifest"""
+    parser = argparse.ArgumentParser(prog="compose-x-render batch")
+    parser.add_argument("manifest", help="Path to the batch manifest file")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of projects to render in parallel.",
+    )
+    parser.add_argument(
+        "--validator",
+        dest="validator_engine",
+        choices=VALIDATION_ENGINES,
+        default=JSONSCHEMA_ENGINE,
+        help="Validation engine to use against the compose-spec. fast uses generated validation code.",
+    )
+    parser.add_argument(
+        "--summary",
+        required=False,
+        default=None,
+        help="Path to write the JSON summary of the batch to. Printed if not set.",
+    )
+    args = parser.parse_args(arguments)
+    from compose_x_render.batch import load_manifest, render_batch
+
+    summary = render_batch(
+        load_manifest(args.manifest), args.jobs, args.validator_engine
+    )
+    if args.summary:
+        with open(args.summary, "w") as summary_fd:
+            summary_fd.write(json.dumps(summary, indent=2))
+    else:
+        print(json.dumps(summary, indent=2))
+    for result in summary["projects"]:
+        if result["status"] != "success":
+            print(f"{result['name']} failed - {result['error']}", file=sys.stderr)
+    return 1 if summary["failures"] else 0
+
+
+def serve_renders(arguments: list[str]) -> int:
+    """Renders the requests of the clients until interrupted"""
+    parser = argparse.ArgumentParser(prog="compose-x-render serve")
+    parser.add_argument(
+        "--socket",
+        default=os.environ.get(SOCKET_ENV_VAR),
+        required=not os.environ.get(SOCKET_ENV_VAR),
+        help=f"Path of the Unix socket to listen on. Defaults to ${SOCKET_ENV_VAR}",
+    )
+    parser.add_argument(
+        "--validator",
+        dest="validator_engines",
+        choices=VALIDATION_ENGINES,
+        action="append",
+        default=None,
+        help="Validation engine to build the validator of before listening. Can be repeated.",
+    )
+    args = parser.parse_args(arguments)
+    from compose_x_render.server import serve
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    serve(args.socket, args.validator_engines)
+    return 0
+
+
+def diff_files(arguments: list[str]) -> int:
+    """Renders two sets of compose files and prints the changes between them"""
+    parser = argparse.ArgumentParser(prog="compose-x-render diff")
+    parser.add_argument(
+        "--old",
+        dest="old_files",
+        required=True,
+        action="append",
+        metavar="FILE",
+        help="Path to a compose file of the old render. Can be repeated.",
+    )
+    parser.add_argument(
+        "--new",
+        dest="new_files",
+        required=True,
+        action="append",
+        metavar="FILE",
+        help="Path to a compose file of the new render. Can be repeated.",
+    )
+    parser.add_argument(
+        "--format",
+        dest="diff_format",
+        choices=DIFF_FORMATS,
+        default=TEXT_FORMAT,
+        help="Output format of the changes. text prints one change per line.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-file",
+        required=False,
+        default=None,
+        help="Path to write the changes to. Printed if not set.",
+    )
+    parser.add_argument(
+        "--no-interpolate",
+        help="Compares the definitions without interpolating them.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--service",
+        dest="services",
+        action="append",
+        default=None,
+        metavar="NAME",
+        help="Only compares the service, the services it depends on and the resources they use. Can be repeated.",
+    )
+    parser.add_argument(
+        "--select",
+        action="append",
+        default=None,
+        metavar="PATH",
+        help="Only compares the keys at the path, such as services.*.image. Can be repeated.",
+    )
+    parser.add_argument(
+        "--validator",
+        dest="validator_engine",
+        choices=VALIDATION_ENGINES,
+        default=JSONSCHEMA_ENGINE,
+        help="Validation engine to use against the compose-spec. fast uses generated validation code.",
+    )
+    args = parser.parse_args(arguments)
+    from compose_x_render.diff import diff_renders, format_changes
+
+    changes = diff_renders(
+        args.old_files,
+        args.new_files,
+        no_interpolate=args.no_interpolate,
+        validator_engine=args.validator_engine,
+        select=args.select,
+        services=args.services,
+    )
+    output = format_changes(changes, args.diff_format)
+    if args.output_file:
+        with open(args.output_file, "w") as output_fd:
+            output_fd.write(output)
+    else:
+        sys.stdout.write(output)
+    return 1 if changes else 0
+
+
+def forward_render(args: argparse.Namespace, kwargs: dict) -> Union[int, None]:
+    """
+    Renders the files with the render server listening on --server.
+
+    :return: The return code, or None if no server is running.
+    """
+    request = {
+        "files": [
+            os.path.abspath(file_path) for file_path in kwargs[COMPOSE_FILES_ARG]
+        ],
+        "output_format": args.output_format,
+        "compose_x": kwargs[COMPOSE_X_ARG],
+        "no_interpolate": args.no_interpolate,
+        "validator_engine": args.validator_engine,
+        "env": dict(os.environ),
+    }
+    try:
+        response = send_request(args.server, request)
+    except OSError:
+        return None
+    if response.get("status") != "success":
+        print(response.get("error"), file=sys.stderr)
+        return 1
+    if not args.output_file:
+        sys.stdout.write(response["output"])
+        if args.output_format == YAML_FORMAT:
+            print()
+    else:
+        with open(args.output_file, "w") as file_fd:
+            file_fd.write(response["output"])
+    return 0
 
-from compose_x_render.compose_x_render import ComposeDefinition
+
+def watch_files(args: argparse.Namespace, kwargs: dict) -> int:
+    """Renders the files every time they change, until interrupted"""
+    if args.services_images_json or args.select or args.services:
+        print(
+            "--watch does not support --services-images-json, --select nor --service",
+            file=sys.stderr,
+        )
+        return 2
+    from compose_x_render.fingerprints import definition_fingerprints
+    from compose_x_render.output import dump_json, dump_output
+    from compose_x_render.watch import IncrementalRenderer, get_files_watcher, watch
+
+    files_list = kwargs[COMPOSE_FILES_ARG]
+    renderer = IncrementalRenderer(
+        files_list,
+        no_interpolate=args.no_interpolate,
+        validator_engine=args.validator_engine,
+    )
+
+    def write_output(definition: dict) -> None:
+        if args.fingerprints:
+            with open(args.fingerprints, "w") as fingerprints_fd:
+                fingerprints_fd.write(dump_json(definition_fingerprints(definition)))
+        if not args.output_file:
+            dump_output(
+                definition,
+                args.output_format,
+                kwargs[COMPOSE_X_ARG],
+                sys.stdout,
+            )
+            return
+        with open(args.output_file, "w") as file_fd:
+            dump_output(
+                definition,
+                args.output_format,
+                kwargs[COMPOSE_X_ARG],
+                file_fd,
+            )
+
+    watch(renderer, write_output, get_files_watcher(files_list, args.watch_polling))
+    return 0
 
 
 def main():
     """Console script for compose_x_render."""
+    if sys.argv[1:2] == ["batch"]:
+        return batch(sys.argv[2:])
+    if sys.argv[1:2] == ["serve"]:
+        return serve_renders(sys.argv[2:])
+    if sys.argv[1:2] == ["diff"]:
+        return diff_files(sys.argv[2:])
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-f",
         "--docker-compose-file",
-        dest=ComposeDefinition.input_file_arg,
+        dest=COMPOSE_FILES_ARG,
         required=True,
         help="Path to the Docker compose file",
         action="append",
@@ -33,9 +281,16 @@ def main():
         required=False,
         help="Auto-Format for ECS Compose-X CFN Macro",
         action="store_true",
-        dest=ComposeDefinition.compose_x_arg,
+        dest=COMPOSE_X_ARG,
         default=False,
     )
+    parser.add_argument(
+        "--format",
+        dest="output_format",
+        choices=OUTPUT_FORMATS,
+        default=YAML_FORMAT,
+        help="Output format. ndjson outputs one service (or other top-level key) per line.",
+    )
     parser.add_argument(
         "--no-interpolate",
         help="Preserves environment variables and leaves text as-is.",
@@ -48,18 +303,151 @@ def main():
         default=False,
         help="Outputs a key-value definition of the services and their images only",
     )
+    parser.add_argument(
+        "--service",
+        dest="services",
+        action="append",
+        default=None,
+        metavar="NAME",
+        help="Only renders the service, the services it depends on and the resources they use. Can be repeated.",
+    )
+    parser.add_argument(
+        "--select",
+        action="append",
+        default=None,
+        metavar="PATH",
+        help="Only renders the keys at the path, such as services.*.image. * matches any key. Can be repeated.",
+    )
+    parser.add_argument(
+        "--fingerprints",
+        default=None,
+        metavar="FILE",
+        help="Also writes the hash of each service and top-level section of the render, as JSON, to FILE.",
+    )
+    parser.add_argument(
+        "--validator",
+        dest="validator_engine",
+        choices=VALIDATION_ENGINES,
+        default=JSONSCHEMA_ENGINE,
+        help="Validation engine to use against the compose-spec. fast uses generated validation code.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of compose files to load and parse concurrently.",
+    )
+    parser.add_argument(
+        "--service-jobs",
+        type=int,
+        default=1,
+        help="Number of processes to render the services of large definitions with.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get(CACHE_DIR_ENV_VAR),
+        help=f"Directory to cache rendered outputs into. Defaults to ${CACHE_DIR_ENV_VAR}",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Do not use the rendered outputs cache.",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="FILE",
+        help="Prints the duration of each render stage to stderr, or writes it as JSON to FILE.",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        default=False,
+        help="With --profile, also records the peak memory of each stage. Slows the render down.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        default=False,
+        help="Renders the files again, and rewrites the output, every time one of them changes.",
+    )
+    parser.add_argument(
+        "--watch-polling",
+        action="store_true",
+        default=False,
+        help="With --watch, detects changes by polling the files instead of using inotify.",
+    )
+    parser.add_argument(
+        "--server",
+        default=os.environ.get(SOCKET_ENV_VAR),
+        metavar="SOCKET",
+        help="Unix socket of a compose-x-render serve process to render with. Renders locally if none listens "
+        f"on it. Defaults to ${SOCKET_ENV_VAR}",
+    )
+    parser.add_argument(
+        "--no-server",
+        action="store_true",
+        default=False,
+        help="Always render locally, even if a render server is running.",
+    )
     parser.add_argument("_", nargs="*")
     args = parser.parse_args()
     kwargs = vars(args)
+    if args.watch:
+        return watch_files(args, kwargs)
+    if (
+        args.server
+        and not args.no_server
+        and not args.services_images_json
+        and not args.profile
+        and not args.select
+        and not args.services
+        and not args.fingerprints
+    ):
+        return_code = forward_render(args, kwargs)
+        if return_code is not None:
+            return return_code
+    from compose_x_render.cache import RenderCache
+    from compose_x_render.compose_x_render import ComposeDefinition
+    from compose_x_render.instrumentation import RenderProfile
+
+    profile = RenderProfile(track_memory=args.profile_memory) if args.profile else None
+    select = args.select
+    if args.services_images_json and not select:
+        select = [SERVICES_IMAGES_SELECTION]
     compose_file = ComposeDefinition(
-        kwargs[ComposeDefinition.input_file_arg], no_interpolate=args.no_interpolate
+        kwargs[COMPOSE_FILES_ARG],
+        no_interpolate=args.no_interpolate,
+        validator_engine=args.validator_engine,
+        jobs=args.jobs,
+        cache=(
+            RenderCache(args.cache_dir)
+            if args.cache_dir and not args.no_cache
+            else None
+        ),
+        profile=profile,
+        select=select,
+        services=args.services,
+        service_jobs=args.service_jobs,
     )
     if args.services_images_json:
         compose_file.output_services_images(args.output_file)
     else:
         compose_file.write_output(
-            args.output_file, kwargs[ComposeDefinition.compose_x_arg]
+            args.output_file,
+            kwargs[COMPOSE_X_ARG],
+            args.output_format,
         )
+    if args.fingerprints:
+        compose_file.write_fingerprints(args.fingerprints)
+    if profile and args.profile == "-":
+        print(profile.report(), file=sys.stderr)
+    elif profile:
+        with open(args.profile, "w") as profile_fd:
+            profile_fd.write(json.dumps(profile.as_dict(), indent=2))
     return 0
 
 
@@ -0,0 +1,45 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to forward renders to a running ``compose-x-render serve`` process.
+
+Requests and responses are JSON documents, one per line, over the server Unix socket. A request holds the render
+options and the client environment variables::
+
+    {"files": ["/abs/docker-compose.yaml"], "output_format": "yaml", "compose_x": false,
+     "no_interpolate": false, "keep_if_undefined": false, "validator_engine": "jsonschema", "env": {...}}
+
+The response is either ``{"status": "success", "output": "..."}`` or ``{"status": "failure", "error": "..."}``.
+
+Only the standard library is used, so that forwarding a render does not import the rendering modules.
+"""
+
+from __future__ import annotations
+
+import json
+import socket
+
+SOCKET_ENV_VAR = "COMPOSE_X_RENDER_SOCKET"
+CONNECT_TIMEOUT = 1.0
+
+
+def send_request(socket_path: str, request: dict, timeout: float = None) -> dict:
+    """
+    Sends the request to the render server and returns its response.
+
+    :param str socket_path: Path to the server Unix socket
+    :param dict request: The render request
+    :param float timeout: Seconds to wait for the response. Waits until the render is done if None.
+    :raises: OSError if no server is listening on the socket, or it closed the connection without responding.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(CONNECT_TIMEOUT)
+        client.connect(socket_path)
+        client.settimeout(timeout)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as response_fd:
+            line = response_fd.readline()
+    if not line:
+        raise ConnectionError("Render server closed the connection", socket_path)
+    return json.loads(line)
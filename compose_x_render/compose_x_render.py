@@ -6,26 +6,45 @@
 from __future__ import annotations
 
 import json
-from copy import deepcopy
-from typing import Union
+import sys
+import time
+from os import path
+from typing import IO, TYPE_CHECKING, Callable, Mapping, Union
 
-import jsonschema
-import yaml
-from importlib_resources import files as pkg_files
+from compose_x_common.compose_x_common import keyisset
 
+from compose_x_render.cache import RenderCache, read_sources, validator_identity
+from compose_x_render.consts import (
+    COMPOSE_FILES_ARG,
+    COMPOSE_X_ARG,
+    DEFINITIONS_UNIQUE_LISTS,
+    PORTS,
+    SECRETS,
+    SERVICE_UNIQUE_LISTS,
+    SERVICES,
+    VOLUMES,
+)
+from compose_x_render.dependencies import prune_services
+from compose_x_render.envsubst import NO_INTERPOLATION, environ_snapshot, expandvars
+from compose_x_render.fingerprints import definition_fingerprints
+from compose_x_render.instrumentation import RenderProfile, profile_stage
 from compose_x_render.list_management import handle_lists_merges
+from compose_x_render.networking import PortTable, set_service_ports
+from compose_x_render.output import YAML_FORMAT, dump_json, dump_output
+from compose_x_render.selection import parse_selectors, select_paths
+from compose_x_render.validation import (
+    JSONSCHEMA_ENGINE,
+    validate_definition,
+    validate_selection,
+)
+from compose_x_render.variables_index import VariablesIndex, replace_paths
 
-try:
-    from yaml import CDumper as Dumper
-    from yaml import CLoader as Loader
-except ImportError:
-    from yaml import Loader, Dumper
+if TYPE_CHECKING:
+    from jsonschema.protocols import Validator
 
-from compose_x_common.compose_x_common import keyisset
+PROCESS_LOAD_THRESHOLD = 1024 * 1024
 
-from compose_x_render.consts import PORTS, SECRETS, SERVICES, VOLUMES
-from compose_x_render.envsubst import expandvars
-from compose_x_render.networking import set_service_ports
+_UNSET = object()
 
 
 def render_services_ports(services):
@@ -43,43 +62,51 @@ def render_services_ports(services):
 
 def merge_ports(source_ports, new_ports):
     """
-    Function to merge two sections of ports
+    Function to merge two sections of ports: the source ports which target is not overridden, then the
+    override ports. On published ports conflicts, the override ports set the target.
 
     :param list source_ports:
     :param list new_ports:
     :return:
     """
-    f_source_ports = set_service_ports(source_ports)
     f_override_ports = set_service_ports(new_ports)
-    f_overide_ports_targets = [port["target"] for port in f_override_ports]
-    new_ports = []
-    for port in f_override_ports:
-        new_ports.append(port)
-        for s_port in f_source_ports:
-            if s_port["target"] not in f_overide_ports_targets:
-                new_ports.append(s_port)
-    return new_ports
-
-
-def merge_service_definition(original_def, override_def, nested=False):
+    if not f_override_ports:
+        return []
+    f_overide_ports_targets = {port["target"] for port in f_override_ports}
+    table = PortTable(
+        [
+            port
+            for port in set_service_ports(source_ports)
+            if port["target"] not in f_overide_ports_targets
+        ]
+    )
+    table.extend(f_override_ports)
+    return table.to_list()
+
+
+def merge_service_definition(original_def, override_def, nested=False, environ=None):
     """
     Merges two services definitions if service exists in both compose files.
+    Neither definition is modified: only the keys changed by the override are copied, the merged definition
+    shares everything else with the original and override definitions.
 
     :param bool nested:
     :param dict original_def:
     :param dict override_def:
-    :return:
+    :param environ: The environment variables to interpolate with.
+    :return: The merged definition
     """
 
-    if not nested:
-        original_def = deepcopy(original_def)
+    original_def = dict(original_def)
     for key in override_def.keys():
         if (
             isinstance(override_def[key], dict)
             and keyisset(key, original_def)
             and isinstance(original_def[key], dict)
         ):
-            merge_service_definition(original_def[key], override_def[key], nested=True)
+            original_def[key] = merge_service_definition(
+                original_def[key], override_def[key], nested=True, environ=environ
+            )
         elif key not in original_def:
             original_def[key] = override_def[key]
         elif (
@@ -100,13 +127,7 @@ def merge_service_definition(original_def, override_def, nested=False):
                 original_def,
                 override_def,
                 key,
-                keys_to_uniqfy=[
-                    VOLUMES,
-                    SECRETS,
-                    "ManagedPolicyArns",
-                    "AwsSources",
-                    "ExtSources",
-                ],
+                keys_to_uniqfy=SERVICE_UNIQUE_LISTS,
             )
         elif (
             isinstance(override_def[key], list)
@@ -115,13 +136,15 @@ def merge_service_definition(original_def, override_def, nested=False):
         ):
             original_def[key] = merge_ports(original_def[key], override_def[key])
         elif isinstance(override_def[key], str):
-            original_def[key] = expandvars(override_def[key])
+            original_def[key] = expandvars(override_def[key], environ=environ)
         else:
             original_def[key] = override_def[key]
     return original_def
 
 
-def interpolate_env_vars(content: dict, default_empty: Union[None, str]):
+def interpolate_env_vars(
+    content: dict, default_empty: Union[None, str], environ: Mapping[str, str] = None
+):
     """
     Function to interpolate env vars from content for string values.
     """
@@ -129,20 +152,26 @@ def interpolate_env_vars(content: dict, default_empty: Union[None, str]):
         return
     for key in content.keys():
         if isinstance(content[key], dict):
-            interpolate_env_vars(content[key], default_empty)
+            interpolate_env_vars(content[key], default_empty, environ)
         elif isinstance(content[key], list):
             for count, item in enumerate(content[key]):
                 if isinstance(item, dict):
-                    interpolate_env_vars(item, default_empty)
+                    interpolate_env_vars(item, default_empty, environ)
                 elif isinstance(item, str):
-                    content[key][count] = expandvars(item, default=default_empty)
+                    content[key][count] = expandvars(
+                        item, default=default_empty, environ=environ
+                    )
         elif isinstance(content[key], str):
             content[key] = expandvars(
-                content[key], default=default_empty, skip_escaped=True
+                content[key], default=default_empty, skip_escaped=True, environ=environ
             )
 
 
-def merge_services_from_files(original_services: dict, override_services: dict) -> None:
+def merge_services_from_files(
+    original_services: dict,
+    override_services: dict,
+    environ: Mapping[str, str] = None,
+) -> None:
     """
     Function to merge two docker compose files content.
 
@@ -154,6 +183,7 @@ def merge_services_from_files(original_services: dict, override_services: dict)
                     service_name: merge_service_definition(
                         original_services[service_name],
                         override_services[service_name],
+                        environ=environ,
                     )
                 }
             )
@@ -195,27 +225,121 @@ def load_compose_file(file_path) -> Union[dict, list]:
     """
     Read docker compose file content and load with YAML
     """
+    import yaml
+
+    from compose_x_render.yaml_loader import ComposeLoader
+
     with open(file_path) as composex_fd:
-        return json.loads(json.dumps(yaml.load(composex_fd.read(), Loader=Loader)))
+        return yaml.load(composex_fd, Loader=ComposeLoader)
+
+
+def load_compose_source(source: bytes) -> Union[dict, list]:
+    """
+    Load the content of a docker compose file with YAML
+    """
+    import yaml
+
+    from compose_x_render.yaml_loader import ComposeLoader
+
+    return yaml.load(source, Loader=ComposeLoader)
+
+
+def timed_load_compose_file(file_path) -> tuple[Union[dict, list], float]:
+    """
+    Same as load_compose_file, also returning how long it took to load the file.
+    """
+    start = time.perf_counter()
+    content = load_compose_file(file_path)
+    return content, time.perf_counter() - start
+
+
+def load_compose_files(
+    files_list: list[str],
+    jobs: int = 1,
+    process_threshold: int = PROCESS_LOAD_THRESHOLD,
+    profile: RenderProfile = None,
+) -> list[Union[dict, list]]:
+    """
+    Loads the compose files content, concurrently if jobs is more than 1.
+    Files of at least process_threshold bytes are parsed in a processes pool, smaller ones in threads.
+
+    :param list[str] files_list: The files to load
+    :param int jobs: Maximum number of files to load at the same time
+    :param int process_threshold: Size (bytes) from which a file is parsed in another process
+    :param RenderProfile profile: Profile to record the load time of each file into.
+    :return: The files content, in the same order as files_list
+    """
+    if profile is None:
+        return load_compose_files_with(
+            load_compose_file, files_list, jobs, process_threshold
+        )
+    contents = []
+    for file_path, (content, duration) in zip(
+        files_list,
+        load_compose_files_with(
+            timed_load_compose_file, files_list, jobs, process_threshold
+        ),
+    ):
+        profile.file_loaded(file_path, duration)
+        contents.append(content)
+    return contents
+
+
+def load_compose_files_with(
+    load_function: Callable, files_list: list[str], jobs: int, process_threshold: int
+) -> list:
+    """
+    Calls load_function for each file, concurrently if jobs is more than 1. See load_compose_files.
+    """
+    if jobs <= 1 or len(files_list) < 2:
+        return [load_function(file_path) for file_path in files_list]
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    large_files = [
+        file_path
+        for file_path in files_list
+        if path.getsize(file_path) >= process_threshold
+    ]
+    processes = (
+        ProcessPoolExecutor(max_workers=min(jobs, len(large_files)))
+        if large_files
+        else None
+    )
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as threads:
+            futures = [
+                (processes if file_path in large_files else threads).submit(
+                    load_function, file_path
+                )
+                for file_path in files_list
+            ]
+            return [future.result() for future in futures]
+    finally:
+        if processes:
+            processes.shutdown()
 
 
 def merge_definitions(
-    original_def: dict, override_def: dict, nested: bool = False
+    original_def: dict,
+    override_def: dict,
+    nested: bool = False,
+    environ: Mapping[str, str] = None,
 ) -> dict:
     """
     Merges resources and non services definitions together.
     """
-    if not nested:
-        original_def = deepcopy(original_def)
-    elif not isinstance(override_def, dict):
+    if nested and not isinstance(override_def, dict):
         raise TypeError("Expected", dict, "got", type(override_def))
+    original_def = dict(original_def)
     for key in override_def.keys():
         if (
             isinstance(override_def[key], dict)
             and keyisset(key, original_def)
             and isinstance(original_def[key], dict)
         ):
-            merge_definitions(original_def[key], override_def[key], nested=True)
+            original_def[key] = merge_definitions(
+                original_def[key], override_def[key], nested=True, environ=environ
+            )
         elif key not in original_def:
             original_def[key] = override_def[key]
         elif isinstance(override_def[key], list) and key in original_def.keys():
@@ -223,11 +347,7 @@ def merge_definitions(
                 original_def,
                 override_def,
                 key,
-                keys_to_uniqfy=[
-                    "ManagedPolicyArns",
-                    "AwsSources",
-                    "ExtSources",
-                ],
+                keys_to_uniqfy=DEFINITIONS_UNIQUE_LISTS,
             )
         elif isinstance(override_def[key], list) and key not in original_def.keys():
             original_def[key]: list = []
@@ -235,15 +355,11 @@ def merge_definitions(
                 original_def,
                 override_def,
                 key,
-                keys_to_uniqfy=[
-                    "ManagedPolicyArns",
-                    "AwsSources",
-                    "ExtSources",
-                ],
+                keys_to_uniqfy=DEFINITIONS_UNIQUE_LISTS,
             )
 
         elif isinstance(override_def[key], str):
-            original_def[key] = expandvars(override_def[key])
+            original_def[key] = expandvars(override_def[key], environ=environ)
         else:
             original_def[key] = override_def[key]
     for key, value in original_def.items():
@@ -252,7 +368,11 @@ def merge_definitions(
     return original_def
 
 
-def merge_config_files(original_content: dict, override_content: dict) -> None:
+def merge_config_files(
+    original_content: dict,
+    override_content: dict,
+    environ: Mapping[str, str] = None,
+) -> None:
     """
     Function to merge everything that is not services.
     For services, we use function merge_services_from_files
@@ -267,20 +387,19 @@ def merge_config_files(original_content: dict, override_content: dict) -> None:
         ):
             original_services = original_content[SERVICES]
             override_services = override_content[SERVICES]
-            merge_services_from_files(original_services, override_services)
+            merge_services_from_files(original_services, override_services, environ)
 
         elif (
             keyisset(compose_key, original_content)
             and isinstance(original_content[compose_key], dict)
             and not compose_key == SERVICES
         ):
-            original_definition = deepcopy(original_content[compose_key])
-            override_definition = override_content[compose_key]
             original_content.update(
                 {
                     compose_key: merge_definitions(
-                        original_definition,
-                        override_definition,
+                        original_content[compose_key],
+                        override_content[compose_key],
+                        environ=environ,
                     )
                 }
             )
@@ -288,9 +407,161 @@ def merge_config_files(original_content: dict, override_content: dict) -> None:
             original_content[compose_key] = override_content[compose_key]
 
 
+def group_overrides(definitions: list[dict]) -> dict:
+    """
+    Groups the values of the definitions by key, in order.
+
+    :return: mapping of the keys to the list of their values in the definitions.
+    """
+    overrides: dict = {}
+    for definition in definitions:
+        for key, value in definition.items():
+            overrides.setdefault(key, []).append(value)
+    return overrides
+
+
+def merge_values_chain(
+    current,
+    values: list,
+    key: str,
+    for_services: bool,
+    environ=None,
+    projected: bool = False,
+):
+    """
+    Merges the values of a key of several definitions, in order, into the current value (or _UNSET).
+    Consecutive mappings are merged all at once.
+
+    :param current: The current value for the key, _UNSET if not defined
+    :param list values: The values to merge, in order
+    :param str key: The key the values are for
+    :param bool for_services: Whether to merge using services rules (merge_service_definition) or
+      resources rules (merge_definitions)
+    :param environ: The environment variables to interpolate with.
+    :param bool projected: Whether the definitions are projected, see merge_config_files_chain
+    """
+    count = 0
+    while count < len(values):
+        value = values[count]
+        if (
+            isinstance(value, dict)
+            and isinstance(current, dict)
+            and (current or projected)
+        ):
+            mappings = [current]
+            while count < len(values) and isinstance(values[count], dict):
+                mappings.append(values[count])
+                count += 1
+            current = merge_mappings_chain(mappings, for_services, environ, projected)
+            continue
+        count += 1
+        if current is _UNSET:
+            current = value
+        elif isinstance(value, list) and for_services and key == PORTS:
+            current = merge_ports(current, value)
+        elif isinstance(value, list):
+            if not isinstance(current, list):
+                raise TypeError(
+                    "Cannot merge", key, "from", type(current), "with", type(value)
+                )
+            unique_lists = (
+                SERVICE_UNIQUE_LISTS if for_services else DEFINITIONS_UNIQUE_LISTS
+            )
+            current = handle_lists_merges(current, value, uniqfy=key in unique_lists)
+        elif isinstance(value, str):
+            current = expandvars(value, environ=environ)
+        else:
+            current = value
+    return current
+
+
+def merge_mappings_chain(
+    definitions: list[dict], for_services: bool, environ=None, projected: bool = False
+) -> dict:
+    """
+    Merges several definitions at once, walking each key path once.
+    Same result as merging them pairwise, in order, with merge_service_definition (for_services)
+    or merge_definitions.
+    """
+    merged = dict(definitions[0])
+    for key, values in group_overrides(definitions[1:]).items():
+        merged[key] = merge_values_chain(
+            merged.get(key, _UNSET), values, key, for_services, environ, projected
+        )
+    if not for_services and len(definitions) > 1:
+        for key, value in merged.items():
+            if isinstance(value, list) and key in [VOLUMES, SECRETS]:
+                merged[key] = handle_lists_merges(value, [], uniqfy=True)
+    return merged
+
+
+def merge_services_chain(services_list: list[dict], environ=None) -> dict:
+    """
+    Merges the services of several compose files at once.
+    Same result as merging them pairwise, in order, with merge_services_from_files.
+    """
+    merged = dict(services_list[0])
+    for service_name, definitions in group_overrides(services_list[1:]).items():
+        if keyisset(service_name, merged):
+            merged[service_name] = merge_mappings_chain(
+                [merged[service_name]] + definitions, True, environ
+            )
+            continue
+        for count, definition in enumerate(definitions):
+            if definition:
+                merged[service_name] = merge_mappings_chain(
+                    definitions[count:], True, environ
+                )
+                break
+        else:
+            merged[service_name] = definitions[-1]
+    return merged
+
+
+def merge_config_files_chain(
+    contents: list[dict], environ=None, projected: bool = False
+) -> dict:
+    """
+    Merges all the compose files content at once, walking each key path once, instead of merging
+    every file into the accumulated definition.
+    Same result as merging them pairwise, in order, with merge_config_files.
+
+    :param list[dict] contents: The compose files content, in order.
+    :param environ: The environment variables to interpolate with.
+    :param bool projected: Whether the contents are projected onto a selection. Empty mappings are then merged
+      with the mappings overriding them, as they may only be empty because none of their keys is selected,
+      instead of being replaced by them.
+    :return: The merged content
+    """
+    merged = dict(contents[0])
+    for compose_key, values in group_overrides(contents[1:]).items():
+        current = merged.get(compose_key, _UNSET)
+        for count, value in enumerate(values):
+            merge_empty = (
+                projected
+                and current == {}
+                and all(isinstance(override, dict) for override in values[count:])
+            )
+            if current is _UNSET or not (current or merge_empty):
+                current = value
+            elif compose_key == SERVICES:
+                current = merge_services_chain(
+                    [current] + [services for services in values[count:] if services],
+                    environ,
+                )
+                break
+            elif isinstance(current, dict):
+                current = merge_mappings_chain(
+                    [current] + values[count:], False, environ, projected
+                )
+                break
+        merged[compose_key] = current
+    return merged
+
+
 class ComposeDefinition:
-    input_file_arg = "ComposeFiles"
-    compose_x_arg = "ForCompose-X"
+    input_file_arg = COMPOSE_FILES_ARG
+    compose_x_arg = COMPOSE_X_ARG
 
     def __init__(
         self,
@@ -298,68 +569,311 @@ class ComposeDefinition:
         content: dict = None,
         no_interpolate: bool = False,
         keep_if_undefined: bool = False,
+        validator: Validator = None,
+        validator_engine: str = JSONSCHEMA_ENGINE,
+        environ: Mapping[str, str] = None,
+        jobs: int = 1,
+        cache: RenderCache = None,
+        profile: RenderProfile = None,
+        index_variables: bool = False,
+        select: list[str] = None,
+        services: list[str] = None,
+        service_jobs: int = 1,
     ):
         """
         Main function to define and merge the content of the docker files
 
         :param list files_list: list of files (path) to merge
         :param dict content:
+        :param validator: JSON schema validator to use. Defaults to the process-wide compose-spec validator.
+        :param str validator_engine: The validation engine to use when no validator is given. jsonschema or fast
+        :param environ: Environment variables to interpolate with. A frozen copy of os.environ if not set.
+        :param int jobs: Number of files to load concurrently.
+        :param RenderCache cache: Cache of the rendered outputs. When set, the definition is only rendered if the
+          output is not in the cache.
+        :param RenderProfile profile: Records the duration of each stage of the render and output.
+        :param bool index_variables: Whether to keep the uninterpolated definition and the index of its variables,
+          to reinterpolate it with other environments. Values set by override files are then interpolated once,
+          after the merge, instead of also during the merge.
+        :param list[str] select: Path expressions of the keys to render, such as ``services.*.image``. Only the
+          selected keys are merged, interpolated and validated, and the definition only holds them.
+          See compose_x_render.selection
+        :param list[str] services: Names of the services to render. The files are pruned down to them, the
+          services they depend on and the top-level resources they use before being merged.
+          See compose_x_render.dependencies
+        :param int service_jobs: Number of processes to normalize, interpolate and validate the services with,
+          for definitions of at least 100 services. See compose_x_render.sharding
+        """
+        self.environ = environ_snapshot(environ)
+        self.files_list = list(files_list) if files_list else []
+        self.content = content
+        self.no_interpolate = no_interpolate
+        self.keep_if_undefined = keep_if_undefined
+        self.validator = validator
+        self.validator_engine = validator_engine
+        self.jobs = jobs
+        self.profile = profile
+        self.index_variables = index_variables
+        self.select = list(select) if select else []
+        self.selection = parse_selectors(self.select) if self.select else None
+        self.services = list(services) if services else []
+        self.service_jobs = service_jobs
+        self.template = None
+        self.variables_index = None
+        self.rendered_values: dict = {}
+        self.cache = cache if content is None else None
+        self.sources = None
+        self._definition = None
+        if self.cache is None:
+            self.render()
+
+    @property
+    def definition(self) -> dict:
+        """The rendered definition. Rendered on first access when using a cache."""
+        if self._definition is None:
+            self.render()
+        return self._definition
+
+    @definition.setter
+    def definition(self, definition: dict) -> None:
+        self._definition = definition
+
+    def render(self) -> None:
+        """
+        Loads, merges, interpolates and validates the definition.
+        """
+        profile = self.profile
+        if self.content is None and self.files_list:
+            with profile_stage(profile, "load"):
+                if self.sources is not None:
+                    contents = [load_compose_source(source) for source in self.sources]
+                else:
+                    contents = load_compose_files(
+                        self.files_list, self.jobs, profile=profile
+                    )
+                contents = self.prune(contents)
+                if self.selection:
+                    contents = [
+                        select_paths(content, self.selection) for content in contents
+                    ]
+            with profile_stage(profile, "merge"):
+                definition = merge_config_files_chain(
+                    contents,
+                    NO_INTERPOLATION if self.index_variables else self.environ,
+                    projected=self.selection is not None,
+                )
+        elif self.content and isinstance(self.content, dict):
+            definition = self.prune([self.content])[0]
+            if self.selection:
+                definition = select_paths(definition, self.selection)
+        else:
+            raise ValueError("No compose files or content to render")
+        default_empty = None if self.keep_if_undefined else ""
+        if self.service_jobs > 1 and not self.index_variables and not self.selection:
+            from compose_x_render.sharding import render_sharded, shards_count
+
+            shards = shards_count(definition, self.service_jobs)
+            if shards > 1:
+                self._definition = render_sharded(
+                    definition,
+                    shards,
+                    None if self.no_interpolate else self.environ,
+                    default_empty,
+                    self.validator,
+                    self.validator_engine,
+                    profile,
+                )
+                return
+        if keyisset(SERVICES, definition):
+            with profile_stage(profile, "ports"):
+                render_services_ports(definition[SERVICES])
+        if not self.no_interpolate:
+            with profile_stage(profile, "interpolation"):
+                if self.index_variables:
+                    definition = self.index_definition(definition, default_empty)
+                else:
+                    interpolate_env_vars(definition, default_empty, self.environ)
+        with profile_stage(profile, "validation"):
+            self.validate(definition)
+        self._definition = definition
+
+    def prune(self, contents: list[dict]) -> list[dict]:
+        """Prunes the files content down to the services to render, if set."""
+        if not self.services:
+            return contents
+        return prune_services(
+            contents,
+            self.services,
+            NO_INTERPOLATION if self.no_interpolate else self.environ,
+            None if self.keep_if_undefined else "",
+        )
+
+    def validate(self, definition: dict) -> None:
+        """Validates the definition, or only its selected keys if it is projected."""
+        if self.selection:
+            validate_selection(
+                definition, self.selection, self.validator, self.validator_engine
+            )
+        else:
+            validate_definition(definition, self.validator, self.validator_engine)
+
+    def index_definition(self, template: dict, default_empty: Union[None, str]) -> dict:
+        """
+        Indexes the variables of the uninterpolated definition, and returns it interpolated.
+        The template is not modified, the interpolated definition shares with it everything but the
+        containers of the interpolated strings.
+        """
+        self.template = template
+        self.variables_index = VariablesIndex(template)
+        self.rendered_values = self.variables_index.render(
+            self.variables_index.templates, default_empty, self.environ
+        )
+        if not self.rendered_values:
+            return template
+        return replace_paths(template, list(self.rendered_values.items()))
+
+    def reinterpolate(self, environ: Mapping[str, str] = None) -> bool:
+        """
+        Interpolates the definition with new environment variables. Only the strings using a variable which
+        value changed are rendered again, and the definition is only validated again if one of them changed.
+
+        :param environ: The new environment variables. A frozen copy of os.environ if not set.
+        :return: Whether the definition changed.
+        """
+        definition = self.definition
+        if self.variables_index is None:
+            raise ValueError(
+                "reinterpolate requires the definition to be interpolated with index_variables"
+            )
+        environ = environ_snapshot(environ)
+        default_empty = None if self.keep_if_undefined else ""
+        with profile_stage(self.profile, "interpolation"):
+            values = self.variables_index.render(
+                self.variables_index.affected_paths(environ, self.environ),
+                default_empty,
+                environ,
+            )
+            changes = [
+                (path, value)
+                for path, value in values.items()
+                if self.rendered_values[path] != value
+            ]
+            if changes:
+                definition = replace_paths(definition, changes)
+        if changes:
+            with profile_stage(self.profile, "validation"):
+                self.validate(definition)
+        self.environ = environ
+        self.rendered_values.update(changes)
+        self._definition = definition
+        return bool(changes)
+
+    def from_cache(self, output: str, render_output: Callable[[], str]) -> str:
         """
-        if content is None and len(files_list) == 1:
-            self.definition = load_compose_file(files_list[0])
-        elif content is None and len(files_list) > 1:
-            self.definition = load_compose_file(files_list[0])
-            files_list.pop(0)
-            for file in files_list:
-                merge_config_files(self.definition, load_compose_file(file))
-
-        elif content and isinstance(content, dict):
-            self.definition = content
-        if keyisset(SERVICES, self.definition):
-            render_services_ports(self.definition[SERVICES])
-        default_empty = None if keep_if_undefined else ""
-        if not no_interpolate:
-            interpolate_env_vars(self.definition, default_empty)
-        source = pkg_files("compose_x_render").joinpath("compose-spec.json")
-        jsonschema.validate(
-            self.definition,
-            json.loads(source.read_text()),
+        Returns the output from the cache if there is one, otherwise renders and stores it.
+        The files are read once, and the definition is rendered from the content the key is computed from.
+
+        :param str output: The type of output
+        :param render_output: Function returning the output content.
+        """
+        if self.cache is None:
+            return render_output()
+        if self.sources is None:
+            self.sources = read_sources(self.files_list)
+        key = self.cache.key(
+            self.sources,
+            {
+                "output": output,
+                "no_interpolate": self.no_interpolate,
+                "keep_if_undefined": self.keep_if_undefined,
+                "select": self.select,
+                "services": self.services,
+                "validator": validator_identity(self.validator, self.validator_engine),
+            },
+            self.environ,
         )
+        content = self.cache.get(key)
+        if content is None:
+            content = render_output()
+            self.cache.put(key, content)
+        return content
 
     def write_output(
-        self, output_file: str = None, for_compose_x: bool = False
+        self,
+        output_file: str = None,
+        for_compose_x: bool = False,
+        output_format: str = YAML_FORMAT,
     ) -> None:
         """
-        Method to write the content down into a file
+        Method to write the content down into a file, or stdout. Without a cache, the output is streamed to it as
+        it is serialized.
 
         :param output_file:
         :param for_compose_x:
+        :param str output_format: The output format, one of yaml, json, json-compact or ndjson.
         :return:
         """
-        if for_compose_x:
-            output = {
-                "Fn::Transform": {
-                    "Name": "compose-x",
-                    "Parameters": {"Raw": self.definition},
-                }
-            }
-        else:
-            output = self.definition
-        if not output_file:
-            print(yaml.safe_dump(output))
+
+        def render_output(stream: IO[str] = None) -> Union[str, None]:
+            definition = self.definition
+            with profile_stage(self.profile, "dump"):
+                return dump_output(definition, output_format, for_compose_x, stream)
+
+        if self.cache is None:
+            if not output_file:
+                render_output(sys.stdout)
+            else:
+                with open(output_file, "w") as file_fd:
+                    render_output(file_fd)
         else:
-            with open(output_file, "w") as file_fd:
-                file_fd.write(yaml.safe_dump(output))
+            content = self.from_cache(
+                f"{output_format}-compose-x" if for_compose_x else output_format,
+                render_output,
+            )
+            if not output_file:
+                sys.stdout.write(content)
+            else:
+                with open(output_file, "w") as file_fd:
+                    file_fd.write(content)
+        if not output_file and output_format == YAML_FORMAT:
+            print()
+
+    def fingerprints(self) -> dict:
+        """
+        Returns the fingerprints manifest of the rendered definition: a hash of each service and of each
+        top-level section, which does not depend on the order of the keys nor on the process.
+        See compose_x_render.fingerprints
+        """
+        return definition_fingerprints(self.definition)
+
+    def write_fingerprints(self, output_file: str) -> None:
+        """
+        Writes the fingerprints manifest as JSON into the file.
+
+        :param str output_file: Path of the file to write the manifest to.
+        """
+        content = self.from_cache(
+            "fingerprints", lambda: dump_json(self.fingerprints())
+        )
+        with open(output_file, "w") as file_fd:
+            file_fd.write(content)
 
     def output_services_images(self, output_file: str = None):
-        output_map = {}
-        for name, service in self.definition[SERVICES].items():
-            if keyisset("image", service):
-                output_map[name] = service["image"]
-            else:
-                print(f"Service {name} has no image defined. Skipping")
+        def render_output() -> str:
+            output_map = {}
+            skipped = []
+            for name, service in self.definition[SERVICES].items():
+                if keyisset("image", service):
+                    output_map[name] = service["image"]
+                else:
+                    skipped.append(name)
+            return json.dumps({"images": output_map, "skipped": skipped})
+
+        images = json.loads(self.from_cache("services-images", render_output))
+        for name in images["skipped"]:
+            print(f"Service {name} has no image defined. Skipping")
         if output_file:
             with open(output_file, "w") as file_fd:
-                file_fd.write(json.dumps(output_map))
+                file_fd.write(json.dumps(images["images"]))
         else:
-            print(json.dumps(output_map, indent=2))
+            print(json.dumps(images["images"], indent=2))
@@ -9,3 +9,9 @@ SERVICES = "services"
 VOLUMES = "volumes"
 SECRETS = "secrets"
 PORTS = "ports"
+
+DEFINITIONS_UNIQUE_LISTS = ["ManagedPolicyArns", "AwsSources", "ExtSources"]
+SERVICE_UNIQUE_LISTS = [VOLUMES, SECRETS] + DEFINITIONS_UNIQUE_LISTS
+
+COMPOSE_FILES_ARG = "ComposeFiles"
+COMPOSE_X_ARG = "ForCompose-X"
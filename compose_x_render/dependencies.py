@@ -0,0 +1,212 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to prune compose files down to some services, their dependencies, and the top-level resources they use.
+
+A service depends on the services it references in ``depends_on``, ``links``, ``volumes_from`` and
+``network_mode``, ``ipc`` or ``pid`` set to ``service:<name>``. It uses the top-level ``networks``, ``volumes``,
+``secrets`` and ``configs`` it references, and the ``default`` network if it sets neither ``networks`` nor
+``network_mode``.
+
+The files are pruned before they are merged, from the references of the services in any of the files. So a
+service or resource is kept if any file references it, even if a later file overrides that reference.
+Pruned definitions may then hold more than needed, never less.
+"""
+
+from __future__ import annotations
+
+from typing import Mapping, Union
+
+from compose_x_render.consts import SECRETS, SERVICES, VOLUMES
+from compose_x_render.envsubst import NO_INTERPOLATION, expandvars
+
+NETWORKS = "networks"
+CONFIGS = "configs"
+RESOURCES_SECTIONS = [NETWORKS, VOLUMES, SECRETS, CONFIGS]
+SERVICE_MODE_KEYS = ["network_mode", "ipc", "pid"]
+SERVICE_PREFIX = "service:"
+DEFAULT_NETWORK = "default"
+
+
+def names_of(value) -> list:
+    """Returns the names of a list of names, or the keys of a mapping"""
+    if isinstance(value, dict):
+        return list(value)
+    if isinstance(value, list):
+        return [name for name in value if isinstance(name, str)]
+    return []
+
+
+def sources_of(value) -> list[str]:
+    """Returns the source names of a list of secrets or configs, in short or long syntax"""
+    if not isinstance(value, list):
+        return []
+    sources = []
+    for item in value:
+        if isinstance(item, str):
+            sources.append(item)
+        elif isinstance(item, dict) and isinstance(item.get("source"), str):
+            sources.append(item["source"])
+    return sources
+
+
+def no_expand(name: str) -> str:
+    """Returns the name as-is, for references that are not interpolated"""
+    return name
+
+
+def volume_names(value, expand=no_expand) -> list[str]:
+    """
+    Returns the names of the named volumes a service mounts, in short or long syntax.
+    Short syntax volumes are interpolated before their source is split off, as variables may hold a ``:``.
+    """
+    if not isinstance(value, list):
+        return []
+    names = []
+    for item in value:
+        if isinstance(item, str):
+            item = expand(item)
+            if ":" not in item:
+                continue
+            source = item.split(":", 1)[0]
+        elif isinstance(item, dict) and item.get("type", "volume") == "volume":
+            source = item.get("source")
+            if isinstance(source, str):
+                source = expand(source)
+        else:
+            continue
+        if isinstance(source, str) and source and source[0] not in "/.~":
+            names.append(source)
+    return names
+
+
+def service_dependencies(service: dict, expand=no_expand) -> set[str]:
+    """
+    Returns the names of the services the service depends on.
+    The references are interpolated before the service names are split off them.
+    """
+    if not isinstance(service, dict):
+        return set()
+    dependencies = set(map(expand, names_of(service.get("depends_on"))))
+    for link in names_of(service.get("links")):
+        dependencies.add(expand(link).split(":", 1)[0])
+    for volumes_from in names_of(service.get("volumes_from")):
+        volumes_from = expand(volumes_from)
+        if volumes_from.startswith("container:"):
+            continue
+        if volumes_from.startswith(SERVICE_PREFIX):
+            volumes_from = volumes_from[len(SERVICE_PREFIX) :]
+        dependencies.add(volumes_from.split(":", 1)[0])
+    for key in SERVICE_MODE_KEYS:
+        mode = service.get(key)
+        if isinstance(mode, str):
+            mode = expand(mode)
+            if mode.startswith(SERVICE_PREFIX):
+                dependencies.add(mode[len(SERVICE_PREFIX) :])
+    return dependencies
+
+
+def service_resources(service: dict, expand=no_expand) -> dict[str, set[str]]:
+    """
+    Returns the names of the top-level resources the service uses, per section, interpolated.
+    Services with neither networks nor network_mode use the default network.
+    """
+    if not isinstance(service, dict):
+        return {section: set() for section in RESOURCES_SECTIONS}
+    networks = set(map(expand, names_of(service.get(NETWORKS))))
+    if NETWORKS not in service and "network_mode" not in service:
+        networks.add(DEFAULT_NETWORK)
+    return {
+        NETWORKS: networks,
+        VOLUMES: set(volume_names(service.get(VOLUMES), expand)),
+        SECRETS: set(map(expand, sources_of(service.get(SECRETS)))),
+        CONFIGS: set(map(expand, sources_of(service.get(CONFIGS)))),
+    }
+
+
+def services_closure(
+    contents: list[dict], services: list[str], expand=no_expand
+) -> set[str]:
+    """
+    Returns the services and all the services they depend on, transitively.
+
+    :param list[dict] contents: The compose files content
+    :param list[str] services: The names of the services to keep
+    :param expand: Function interpolating the names referenced
+    :raises: ValueError if one of the services is not defined in any of the files
+    """
+    graph: dict[str, set] = {}
+    for content in contents:
+        if not isinstance(content, dict) or not isinstance(content.get(SERVICES), dict):
+            continue
+        for name, service in content[SERVICES].items():
+            graph.setdefault(name, set()).update(service_dependencies(service, expand))
+    missing = [name for name in services if name not in graph]
+    if missing:
+        raise ValueError("Services", missing, "are not defined in the compose files")
+    closure = set()
+    pending = list(services)
+    while pending:
+        name = pending.pop()
+        if name in closure or name not in graph:
+            continue
+        closure.add(name)
+        pending.extend(graph[name] - closure)
+    return closure
+
+
+def prune_services(
+    contents: list[dict],
+    services: list[str],
+    environ: Mapping[str, str] = NO_INTERPOLATION,
+    default: Union[None, str] = None,
+) -> list[dict]:
+    """
+    Prunes the compose files down to the services, the services they depend on, and the top-level resources
+    all these use. The other top-level keys are kept as-is, resources sections left empty are removed.
+    The contents are not modified.
+
+    :param list[dict] contents: The compose files content, in order
+    :param list[str] services: The names of the services to keep
+    :param environ: The environment variables to interpolate the referenced names with.
+    :param default: Value of undefined variables in the referenced names. If None, they are left unchanged.
+    :return: The pruned contents
+    :raises: ValueError if one of the services is not defined in any of the files
+    """
+
+    def expand(name: str) -> str:
+        return expandvars(name, default=default, environ=environ)
+
+    kept = services_closure(contents, services, expand)
+    resources: dict[str, set] = {section: set() for section in RESOURCES_SECTIONS}
+    for content in contents:
+        if not isinstance(content, dict) or not isinstance(content.get(SERVICES), dict):
+            continue
+        for name in kept.intersection(content[SERVICES]):
+            service = content[SERVICES][name]
+            for section, names in service_resources(service, expand).items():
+                resources[section].update(names)
+    pruned = []
+    for content in contents:
+        if not isinstance(content, dict):
+            pruned.append(content)
+            continue
+        content = dict(content)
+        if isinstance(content.get(SERVICES), dict):
+            content[SERVICES] = {
+                name: service
+                for name, service in content[SERVICES].items()
+                if name in kept
+            }
+        for section in RESOURCES_SECTIONS:
+            if isinstance(content.get(section), dict):
+                content[section] = {
+                    name: resource
+                    for name, resource in content[section].items()
+                    if name in resources[section]
+                }
+                if not content[section]:
+                    del content[section]
+        pruned.append(content)
+    return pruned
@@ -0,0 +1,231 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to compare two rendered definitions structurally.
+
+Every mapping and list is hashed from the hashes of its items, Merkle-style, once (see
+compose_x_render.fingerprints). Identical subtrees, such as unchanged services or sections, then compare in O(1),
+and only the paths which hashes differ are descended.
+
+Lists are compared in order, item by item: items inserted or deleted are reported as added or removed, and
+items replaced are compared. The lists the merge handles as sets of unique items (UNORDERED_LISTS), such as the
+volumes, secrets and ports of the services, are compared as multisets: items present in only one of the lists
+are reported as removed or added, at their index in that list, and items that only moved are not reported.
+"""
+
+from __future__ import annotations
+
+import json
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Iterator, Mapping
+
+from compose_x_render.compose_x_render import ComposeDefinition
+from compose_x_render.fingerprints import UNORDERED_LISTS, SubtreeHasher
+from compose_x_render.output import DIFF_FORMATS, JSON_FORMAT, TEXT_FORMAT
+from compose_x_render.validation import JSONSCHEMA_ENGINE
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+MAX_TEXT_VALUE_LENGTH = 80
+
+
+def iter_changes(
+    old, new, hasher: SubtreeHasher = None, path: tuple = ()
+) -> Iterator[dict]:
+    """
+    Yields the changes from the old value to the new one.
+
+    :param old: The old definition, or value
+    :param new: The new definition, or value
+    :param SubtreeHasher hasher: The hasher of both definitions.
+    :param tuple path: Path of the values within the definitions
+    :return: The changes, each with the path, the type of change, and the old and/or new value.
+    """
+    if hasher is None:
+        hasher = SubtreeHasher()
+    unordered = bool(path) and path[-1] in UNORDERED_LISTS
+    if old is new or hasher.digest(old, unordered) == hasher.digest(new, unordered):
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in old.items():
+            if key not in new:
+                yield {"path": list(path + (key,)), "change": REMOVED, "old": value}
+            else:
+                yield from iter_changes(value, new[key], hasher, path + (key,))
+        for key, value in new.items():
+            if key not in old:
+                yield {"path": list(path + (key,)), "change": ADDED, "new": value}
+    elif isinstance(old, list) and isinstance(new, list):
+        old_digests = [hasher.digest(item) for item in old]
+        new_digests = [hasher.digest(item) for item in new]
+        if unordered:
+            yield from iter_multiset_changes(old, new, old_digests, new_digests, path)
+            return
+        for tag, old_start, old_end, new_start, new_end in list_edits(
+            old_digests, new_digests
+        ):
+            if tag == "replace" and old_end - old_start == new_end - new_start:
+                for offset in range(old_end - old_start):
+                    yield from iter_changes(
+                        old[old_start + offset],
+                        new[new_start + offset],
+                        hasher,
+                        path + (new_start + offset,),
+                    )
+                continue
+            for count in range(old_start, old_end):
+                yield {
+                    "path": list(path + (count,)),
+                    "change": REMOVED,
+                    "old": old[count],
+                }
+            for count in range(new_start, new_end):
+                yield {
+                    "path": list(path + (count,)),
+                    "change": ADDED,
+                    "new": new[count],
+                }
+    else:
+        yield {"path": list(path), "change": CHANGED, "old": old, "new": new}
+
+
+def list_edits(old_digests: list, new_digests: list) -> list[tuple]:
+    """
+    Returns the edits from the old list to the new one, as difflib opcodes, without the equal ones.
+    Lists of the same length are compared index by index instead, when that gives as few changes, so that
+    swapped items, such as the arguments of a command, are reported as changed at their index.
+    """
+    edits = [
+        opcode
+        for opcode in SequenceMatcher(
+            None, old_digests, new_digests, autojunk=False
+        ).get_opcodes()
+        if opcode[0] != "equal"
+    ]
+    if len(old_digests) != len(new_digests):
+        return edits
+    positional = [
+        ("replace", count, count + 1, count, count + 1)
+        for count, (old_digest, new_digest) in enumerate(zip(old_digests, new_digests))
+        if old_digest != new_digest
+    ]
+    changes = sum(
+        (
+            old_end - old_start
+            if tag == "replace" and old_end - old_start == new_end - new_start
+            else old_end - old_start + new_end - new_start
+        )
+        for tag, old_start, old_end, new_start, new_end in edits
+    )
+    return positional if len(positional) <= changes else edits
+
+
+def iter_multiset_changes(
+    old: list, new: list, old_digests: list, new_digests: list, path: tuple
+) -> Iterator[dict]:
+    """Yields the items of the old list missing from the new one, then the items of the new list that are added"""
+    removed = Counter(old_digests) - Counter(new_digests)
+    added = Counter(new_digests) - Counter(old_digests)
+    for count, digest in enumerate(old_digests):
+        if removed[digest]:
+            removed[digest] -= 1
+            yield {"path": list(path + (count,)), "change": REMOVED, "old": old[count]}
+    for count, digest in enumerate(new_digests):
+        if added[digest]:
+            added[digest] -= 1
+            yield {"path": list(path + (count,)), "change": ADDED, "new": new[count]}
+
+
+def diff_definitions(old: dict, new: dict) -> list[dict]:
+    """
+    Compares two rendered definitions.
+
+    :param dict old: The old definition
+    :param dict new: The new definition
+    :return: The changes, in the order of the old definition then of the new one.
+    """
+    return list(iter_changes(old, new))
+
+
+def diff_renders(
+    old_files: list[str],
+    new_files: list[str],
+    no_interpolate: bool = False,
+    validator_engine: str = JSONSCHEMA_ENGINE,
+    environ: Mapping[str, str] = None,
+    select: list[str] = None,
+    services: list[str] = None,
+) -> list[dict]:
+    """
+    Renders both sets of compose files, with the same options, and compares the definitions.
+
+    :param list[str] old_files: The compose files of the old render, in order
+    :param list[str] new_files: The compose files of the new render, in order
+    :param bool no_interpolate: Compares the definitions without interpolating them
+    :param str validator_engine: The validation engine to validate both renders with
+    :param environ: Environment variables to interpolate with. A frozen copy of os.environ if not set.
+    :param list[str] select: Path expressions of the keys to render and compare
+    :param list[str] services: Names of the services to render and compare
+    :return: The changes, from diff_definitions
+    """
+    old, new = (
+        ComposeDefinition(
+            files,
+            no_interpolate=no_interpolate,
+            validator_engine=validator_engine,
+            environ=environ,
+            select=select,
+            services=services,
+        ).definition
+        for files in (old_files, new_files)
+    )
+    return diff_definitions(old, new)
+
+
+def format_path(path: list) -> str:
+    """Formats the path as keys separated by dots, and list indexes within brackets"""
+    formatted = ""
+    for key in path:
+        if isinstance(key, int) and not isinstance(key, bool):
+            formatted += f"[{key}]"
+        else:
+            key = str(key).replace(".", "\\.")
+            formatted += f".{key}" if formatted else key
+    return formatted
+
+
+def format_value(value) -> str:
+    text = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    if len(text) > MAX_TEXT_VALUE_LENGTH:
+        return text[: MAX_TEXT_VALUE_LENGTH - 3] + "..."
+    return text
+
+
+def format_changes(changes: list[dict], diff_format: str = TEXT_FORMAT) -> str:
+    """
+    Formats the changes as text, one line per change, or as a JSON list.
+
+    :param list[dict] changes: The changes, from diff_definitions
+    :param str diff_format: One of DIFF_FORMATS
+    """
+    if diff_format not in DIFF_FORMATS:
+        raise ValueError(
+            "Diff format", diff_format, "is not valid. Must be one of", DIFF_FORMATS
+        )
+    if diff_format == JSON_FORMAT:
+        return json.dumps(changes, indent=2, default=str) + "\n"
+    lines = []
+    for change in changes:
+        path = format_path(change["path"])
+        if change["change"] == ADDED:
+            lines.append(f"+ {path}: {format_value(change['new'])}")
+        elif change["change"] == REMOVED:
+            lines.append(f"- {path}: {format_value(change['old'])}")
+        else:
+            lines.append(
+                f"~ {path}: {format_value(change['old'])} -> {format_value(change['new'])}"
+            )
+    return "".join(f"{line}\n" for line in lines)
@@ -5,8 +5,13 @@
 Module to do a better env variables handling.
 """
 
+from __future__ import annotations
+
 import os
 import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping
 
 ENV_VAR_REGEXP = r"(?<!\\)\$(\w+|\{(?!AWS::)([^}]*)\})"
 SPECIAL_INTERPOLATION = r"(?<!\\)(\$(\{(((?!AWS::)[^}]+)(\:[+-=]{1}))([^}]+)\}))"
@@ -15,31 +20,135 @@ IF_UNDEFINED = r":-"
 IF_DEFINED = r":+"
 IF_LITTERAL = re.compile(r"(\$(\{\![^}]+\}))")
 
+VARIABLE_RE = re.compile(r"\$(\w+|\{(?!AWS::)([^}]*)\})")
+ESCAPED_VARIABLE_RE = re.compile(IF_ESCAPED + VARIABLE_RE.pattern)
+SPECIAL_INTERPOLATION_RE = re.compile(SPECIAL_INTERPOLATION)
+TEMPLATES_CACHE_SIZE = 8192
+
+VARIABLE = 0
+VARIABLE_IF_UNDEFINED = 1
+VARIABLE_IF_DEFINED = 2
+
+NO_INTERPOLATION = MappingProxyType({})
+
 
-def expandvars(path, default=None, skip_escaped=True, enable_litteral=True):
+def environ_snapshot(environ: Mapping[str, str] = None) -> Mapping[str, str]:
+    """
+    Returns an immutable copy of the environment variables to interpolate with.
+
+    :param environ: The variables to use. Defaults to os.environ
+    """
+    return MappingProxyType(dict(os.environ if environ is None else environ))
+
+
+@lru_cache(maxsize=TEMPLATES_CACHE_SIZE)
+def compile_template(
+    template: str, skip_escaped: bool = True, enable_litteral: bool = True
+) -> tuple:
+    """
+    Tokenizes the template string once into literal segments (str) and variable segments.
+    Variable segments are tuples of (kind, variable name, original text, compiled template of the alternative value)
+
+    :param str template: The string to interpolate.
+    :param bool skip_escaped: Whether variables preceded by a backslash are left as-is.
+    :param bool enable_litteral: Whether ${!VAR} is rendered as the literal ${VAR}
+    :return: The compiled template
+    """
+    segments: list = []
+    position = 0
+    variable_re = ESCAPED_VARIABLE_RE if skip_escaped else VARIABLE_RE
+    for match in variable_re.finditer(template):
+        segments.append(template[position : match.start()])
+        position = match.end()
+        text = match.group(0)
+        if enable_litteral and IF_LITTERAL.match(text):
+            segments.append(text.replace("!", ""))
+            continue
+        special = SPECIAL_INTERPOLATION_RE.match(text)
+        if special and special.group(5) == IF_UNDEFINED:
+            segments.append(
+                (
+                    VARIABLE_IF_UNDEFINED,
+                    special.group(4),
+                    text,
+                    compile_template(special.group(6), skip_escaped),
+                )
+            )
+        elif special and special.group(5) == IF_DEFINED:
+            segments.append(
+                (
+                    VARIABLE_IF_DEFINED,
+                    special.group(4),
+                    text,
+                    compile_template(special.group(6)),
+                )
+            )
+        else:
+            segments.append((VARIABLE, match.group(2) or match.group(1), text, None))
+    segments.append(template[position:])
+    compiled: list = []
+    for segment in segments:
+        if isinstance(segment, str) and compiled and isinstance(compiled[-1], str):
+            compiled[-1] += segment
+        elif segment != "":
+            compiled.append(segment)
+    return tuple(compiled)
+
+
+def template_variables(compiled: tuple) -> set[str]:
+    """Returns the names of the variables the compiled template uses, including in alternative values"""
+    names = set()
+    for segment in compiled:
+        if isinstance(segment, tuple):
+            names.add(segment[1])
+            if segment[3]:
+                names |= template_variables(segment[3])
+    return names
+
+
+def render_template(
+    compiled: tuple, default=None, environ: Mapping[str, str] = None
+) -> str:
+    """
+    Renders the compiled template with the environment variables values.
+
+    :param tuple compiled: The template, from compile_template
+    :param default: Value for undefined variables. If None, they are left unchanged.
+    :param environ: The environment variables. Defaults to os.environ
+    """
+    if environ is None:
+        environ = os.environ
+    parts: list = []
+    for segment in compiled:
+        if isinstance(segment, str):
+            parts.append(segment)
+            continue
+        kind, name, text, alternative = segment
+        if kind == VARIABLE_IF_UNDEFINED:
+            parts.append(
+                environ.get(name) or render_template(alternative, default, environ)
+            )
+        elif kind == VARIABLE_IF_DEFINED:
+            parts.append(render_template(alternative, environ=environ))
+        else:
+            parts.append(environ.get(name, text if default is None else default))
+    return "".join(parts)
+
+
+def expandvars(
+    path, default=None, skip_escaped=True, enable_litteral=True, environ=None
+):
     """
     Expand environment variables of form $var and ${var}.
        If parameter 'skip_escaped' is True, all escaped variable references
        (i.e. preceded by backslashes) are skipped.
        Unknown variables are set to 'default'. If 'default' is None,
        they are left unchanged.
+       Variables values are read from 'environ', os.environ if not set.
+       If 'environ' is NO_INTERPOLATION, the path is returned unchanged.
     """
-
-    def replace_var(match):
-        if IF_LITTERAL.match(match.group(0)) and enable_litteral:
-            return re.sub(r"\!", "", IF_LITTERAL.match(match.group(0)).group(0))
-        if re.match(SPECIAL_INTERPOLATION, match.group(0)):
-            groups = re.findall(SPECIAL_INTERPOLATION, match.group(0))
-            if groups[0][-2] == IF_UNDEFINED:
-                return os.environ.get(groups[0][-3]) or expandvars(
-                    groups[0][-1], default, skip_escaped
-                )
-            elif groups[0][-2] == IF_DEFINED:
-                return expandvars(groups[0][-1])
-        return os.environ.get(
-            match.group(2) or match.group(1),
-            match.group(0) if default is None else default,
-        )
-
-    re_string = (IF_ESCAPED if skip_escaped else "") + r"\$(\w+|\{(?!AWS::)([^}]*)\})"
-    return re.sub(re_string, replace_var, path)
+    if "$" not in path or environ is NO_INTERPOLATION:
+        return path
+    return render_template(
+        compile_template(path, skip_escaped, enable_litteral), default, environ
+    )
@@ -0,0 +1,107 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to fingerprint rendered definitions.
+
+Every mapping and list is hashed with blake2b from the hashes of its items, Merkle-style. The hash of a value only
+depends on its content: not on the order of the mapping keys, the python hash seed nor the process.
+Lists are ordered, but for the lists the merge handles as sets of unique items (UNORDERED_LISTS), such as the
+volumes, secrets and ports of the services, which items are hashed in any order. Fingerprints
+of renders made on different machines can then be compared, to tell which services changed without comparing
+the definitions.
+"""
+
+from __future__ import annotations
+
+import hashlib
+
+from compose_x_render.consts import PORTS, SERVICE_UNIQUE_LISTS, SERVICES
+
+FINGERPRINTS_VERSION = 1
+FINGERPRINT_ALGORITHM = "blake2b-128"
+UNORDERED_LISTS = SERVICE_UNIQUE_LISTS + [PORTS]
+
+
+class SubtreeHasher:
+    """
+    Computes, and memoizes, the Merkle hash of the values of a definition.
+    Values are memoized by identity, so subtrees shared between definitions are hashed only once.
+    """
+
+    def __init__(self):
+        self.digests: dict[int, tuple] = {}
+        self.unordered_digests: dict[int, tuple] = {}
+
+    def digest(self, value, unordered: bool = False) -> bytes:
+        """
+        Returns the hash of the value, which only depends on its content, whatever the order of mapping keys.
+        Scalars are not hashed but encoded, with their type, which is enough to compare them.
+
+        :param value: The value to hash
+        :param bool unordered: Whether the value is a list which items order does not matter.
+          Set for the values of the keys of UNORDERED_LISTS within mappings.
+        """
+        if isinstance(value, str):
+            return b"s" + value.encode("utf-8", "surrogatepass")
+        if not isinstance(value, (dict, list)):
+            return f"{type(value).__name__}:{value!r}".encode()
+        unordered = unordered and isinstance(value, list)
+        digests = self.unordered_digests if unordered else self.digests
+        memoized = digests.get(id(value))
+        if memoized is not None and memoized[0] is value:
+            return memoized[1]
+        if isinstance(value, dict):
+            pieces = [b"d"]
+            items = sorted(
+                (self.digest(key), self.digest(item, key in UNORDERED_LISTS))
+                for key, item in value.items()
+            )
+            for key_digest, item_digest in items:
+                pieces += [len(key_digest).to_bytes(4, "little"), key_digest]
+                pieces += [len(item_digest).to_bytes(4, "little"), item_digest]
+        else:
+            pieces = [b"u" if unordered else b"l"]
+            items_digests = [self.digest(item) for item in value]
+            for item_digest in sorted(items_digests) if unordered else items_digests:
+                pieces += [len(item_digest).to_bytes(4, "little"), item_digest]
+        digest = hashlib.blake2b(b"".join(pieces), digest_size=16).digest()
+        digests[id(value)] = (value, digest)
+        return digest
+
+
+def value_fingerprint(value, hasher: SubtreeHasher = None) -> str:
+    """
+    Returns the fingerprint of the value, as an hexadecimal string.
+
+    :param value: The value to fingerprint
+    :param SubtreeHasher hasher: Hasher to reuse the hashes of, when fingerprinting several values.
+    """
+    if hasher is None:
+        hasher = SubtreeHasher()
+    return hashlib.blake2b(hasher.digest(value), digest_size=16).hexdigest()
+
+
+def definition_fingerprints(definition: dict) -> dict:
+    """
+    Fingerprints every service and every top-level section of the rendered definition.
+
+    :param dict definition: The rendered definition
+    :return: The fingerprints manifest, with the fingerprints version and algorithm, and the fingerprints of
+      the services and of the sections, per name.
+    """
+    hasher = SubtreeHasher()
+    services = definition.get(SERVICES)
+    return {
+        "version": FINGERPRINTS_VERSION,
+        "algorithm": FINGERPRINT_ALGORITHM,
+        "services": {
+            name: value_fingerprint(service, hasher)
+            for name, service in (
+                services if isinstance(services, dict) else {}
+            ).items()
+        },
+        "sections": {
+            key: value_fingerprint(value, hasher) for key, value in definition.items()
+        },
+    }
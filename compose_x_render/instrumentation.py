@@ -0,0 +1,97 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to measure where the time (and optionally memory) of a render goes.
+
+A RenderProfile given to ComposeDefinition records the wall time of each stage of the render
+(load, merge, ports, interpolation, validation, dump) and the load time of each file.
+"""
+
+from __future__ import annotations
+
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterator, Union
+
+STAGES = ["load", "merge", "ports", "interpolation", "validation", "dump"]
+
+_NO_STAGE = nullcontext()
+
+
+class RenderProfile:
+    """
+    Collects the timings of the renders it is given to.
+
+    :param callback: Function called with each record (stage or file) as soon as it is measured.
+    :param bool track_memory: Whether to record the peak memory allocated during each stage, with tracemalloc.
+      This slows the render down significantly.
+    """
+
+    def __init__(
+        self, callback: Callable[[dict], None] = None, track_memory: bool = False
+    ):
+        self.callback = callback
+        self.track_memory = track_memory
+        self.stages: list[dict] = []
+        self.files: list[dict] = []
+
+    def record(self, records: list[dict], record: dict) -> None:
+        records.append(record)
+        if self.callback:
+            self.callback(record)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measures the code run within the context as the stage"""
+        started_tracing = False
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {"stage": name, "duration": time.perf_counter() - start}
+            if self.track_memory:
+                record["peak_memory"] = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            self.record(self.stages, record)
+
+    def file_loaded(self, file_path: str, duration: float) -> None:
+        self.record(self.files, {"file": file_path, "duration": duration})
+
+    def as_dict(self) -> dict:
+        return {
+            "stages": self.stages,
+            "files": self.files,
+            "total": sum(stage["duration"] for stage in self.stages),
+        }
+
+    def report(self) -> str:
+        """Human readable breakdown of the stages and files timings"""
+        total = sum(stage["duration"] for stage in self.stages) or 1.0
+        lines = []
+        for stage in self.stages:
+            line = (
+                f"{stage['stage']:<16}{stage['duration'] * 1000:10.3f}ms"
+                f"{stage['duration'] / total * 100:7.1f}%"
+            )
+            if "peak_memory" in stage:
+                line += f"{stage['peak_memory'] / 1024:12.1f}KiB"
+            lines.append(line)
+        lines.append(f"{'total':<16}{total * 1000:10.3f}ms")
+        for loaded in self.files:
+            lines.append(f"  {loaded['duration'] * 1000:10.3f}ms  {loaded['file']}")
+        return "\n".join(lines)
+
+
+def profile_stage(profile: Union[RenderProfile, None], name: str):
+    """Returns the context measuring the stage, or a no-op one when there is no profile"""
+    if profile is None:
+        return _NO_STAGE
+    return profile.stage(name)
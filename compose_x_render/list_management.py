@@ -3,23 +3,52 @@
 
 from __future__ import annotations
 
-# Below 2 functions for uniq nested dict sorting out inspired/used from
-# https://stackoverflow.com/questions/27374273/how-make-unique-a-list-of-nested-dictionaries-in-python
-# Thanks for the help :)
+import warnings
+from itertools import chain
+from typing import Union
 
 
 def set_from_dict(input_dict: dict):
+    """
+    Deprecated: hashable form of a dict which values are not lists. Use fingerprint, which handles any item.
+    """
+    warnings.warn(
+        "set_from_dict is deprecated, use fingerprint instead",
+        DeprecationWarning,
+        stacklevel=2,
+    )
     return frozenset(
         (k, set_from_dict(v) if isinstance(v, dict) else v)
         for k, v in input_dict.items()
     )
 
 
+def fingerprint(item) -> Union[str, tuple]:
+    """
+    Hashable canonical form of the item: structurally equal items, whatever the order of their keys and
+    however deeply nested, have equal fingerprints. Values of different types (1, 1.0, True, "1") never are.
+    It does not depend on the python hash seed.
+    """
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        items = [(key, fingerprint(value)) for key, value in item.items()]
+        try:
+            items.sort()
+        except TypeError:
+            items.sort(key=lambda key_value: (repr(key_value[0]), repr(key_value[1])))
+        return dict, tuple(items)
+    if isinstance(item, (list, tuple)):
+        return list, tuple(fingerprint(value) for value in item)
+    return type(item), item
+
+
 def uniqfy_list_of_dict(input_list: list[dict]) -> list:
+    """Removes the duplicate items of the list, keeping the first occurrence of each."""
     seen = set()
     result = []
     for dict_in_list in input_list:
-        representation = set_from_dict(dict_in_list)
+        representation = fingerprint(dict_in_list)
         if representation in seen:
             continue
         result.append(dict_in_list)
@@ -33,42 +62,27 @@ def handle_lists_merges(
     uniqfy=False,
 ) -> list:
     """
-    Function to merge list items.
-    Dict/Mappings may be duplicate
-    Str may not be duplicate
-    Lists trigger recursion, although in compose there is no list of lists in the definition.
+    Function to merge list items, in a single pass. Items keep their order: the original ones, then the override ones.
+    Dict/Mappings and lists may be duplicate
+    Str and other scalar values (numbers, booleans, null) may not be duplicate. They used to be dropped.
+    Lists are items like dicts are: they are not merged together, which used to recurse endlessly.
 
     :param list original_list: The original list to add the override ones to
     :param list override_list: The lost of items to add up
     :param bool uniqfy: Whether you are expecting identical dicts which should be filtered to be unique based on key/values.
     """
     final_list: list = []
-    # Adding up dict/mappins items
-    final_list += [item for item in original_list if isinstance(item, dict)]
-    final_list += [item for item in override_list if isinstance(item, dict)]
-    if uniqfy:
-        final_list = uniqfy_list_of_dict(final_list)
-
-    # Adding up str items
-    original_str_items = [item for item in original_list if isinstance(item, str)]
-    final_list += list(
-        set(
-            original_str_items
-            + [item for item in override_list if isinstance(item, str)]
-        )
-    )
-
-    # Adding up lists together.
-    origin_list_items = [item for item in original_list if isinstance(item, list)]
-    override_list_items = [item for item in override_list if isinstance(item, list)]
-
-    if origin_list_items and override_list_items:
-        merged_lists = handle_lists_merges(
-            origin_list_items, override_list_items, uniqfy=uniqfy
-        )
-        final_list += merged_lists
-    elif origin_list_items and not override_list_items:
-        final_list += origin_list_items
-    elif not origin_list_items and override_list_items:
-        final_list += override_list_items
+    seen_strings: set = set()
+    seen_fingerprints: set = set()
+    for item in chain(original_list, override_list):
+        if isinstance(item, str):
+            if item in seen_strings:
+                continue
+            seen_strings.add(item)
+        elif uniqfy or not isinstance(item, (dict, list)):
+            item_fingerprint = fingerprint(item)
+            if item_fingerprint in seen_fingerprints:
+                continue
+            seen_fingerprints.add(item_fingerprint)
+        final_list.append(item)
     return final_list
@@ -26,6 +26,85 @@ def handle_str_definition(src_port: str) -> dict:
     return the_port
 
 
+def normalize_port(src_port) -> dict:
+    """
+    Returns the long syntax definition of a port, with its protocol and name set.
+
+    :param src_port: The port definition, short (str or int) or long (dict) syntax
+    """
+    if isinstance(src_port, str):
+        return handle_str_definition(src_port)
+    elif isinstance(src_port, dict):
+        the_port = dict(src_port)
+        the_port["protocol"] = set_else_none("protocol", src_port, "tcp")
+        the_port["name"] = set_else_none(
+            "name", src_port, f"{the_port['protocol']}_{the_port['target']}"
+        )
+        return the_port
+    elif isinstance(src_port, int):
+        return {
+            "protocol": "tcp",
+            "target": src_port,
+        }
+    return {}
+
+
+class PortEntry:
+    """A port of the table, and the keys it is indexed by"""
+
+    __slots__ = ("protocol", "target", "published", "definition")
+
+    def __init__(self, definition: dict):
+        self.protocol = definition["protocol"]
+        self.target = definition["target"]
+        self.published = definition.get("published")
+        self.definition = definition
+
+
+class PortTable:
+    """
+    The ports of a service, in order, indexed by (protocol, published) for the published ports and by
+    (protocol, target) for the others, so that adding a port is done in constant time.
+
+    Same as docker-compose does, when two ports publish the same port for a protocol, the first one is kept with
+    the target of the last one. Ports that are not published are only added once per target and protocol.
+    """
+
+    __slots__ = ("entries", "published", "targets")
+
+    def __init__(self, ports: list = None):
+        self.entries: list[PortEntry] = []
+        self.published: dict = {}
+        self.targets: set = set()
+        if ports:
+            self.extend(ports)
+
+    def add(self, the_port: dict) -> None:
+        """Adds the normalized port definition to the table. The table owns the definition from then on."""
+        entry = PortEntry(the_port)
+        if entry.published:
+            existing = self.published.get((entry.protocol, entry.published))
+            if existing is None:
+                self.published[(entry.protocol, entry.published)] = entry
+                self.entries.append(entry)
+            else:
+                existing.target = entry.target
+                existing.definition["target"] = entry.target
+        elif (entry.protocol, entry.target) not in self.targets:
+            self.targets.add((entry.protocol, entry.target))
+            self.entries.append(entry)
+
+    def extend(self, ports: list) -> None:
+        for the_port in ports:
+            self.add(the_port)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def to_list(self) -> list[dict]:
+        return [entry.definition for entry in self.entries]
+
+
 def replace_published_port(
     service_ports: list, published_port: int, new_definition: dict
 ) -> None:
@@ -33,14 +112,18 @@ def replace_published_port(
     Docker compose behaviour when two published ports have the same value, the final value for the target
     is the one of the last port defined in the list.
 
-    This function swaps the
+    This function swaps the target of the port already published for the protocol.
 
     :param list service_ports:
     :param int published_port:
     :param dict new_definition:
     """
     for port in service_ports:
-        if keyisset("published", port) and port["published"] == published_port:
+        if (
+            keyisset("published", port)
+            and port["published"] == published_port
+            and port["protocol"] == new_definition["protocol"]
+        ):
             port["target"] = new_definition["target"]
             break
 
@@ -50,53 +133,32 @@ def add_port_to_service_ports(service_ports: list, new_port: dict) -> None:
     Adds the new port to the service ``ports`` definition.
     If the port has ``published`` defined, checks whether it can be added or needs updating the target
     if already defined.
+
+    Scans the whole list for every port added: use PortTable to add many ports.
     """
-    same_protocol_published_ports = [
-        s_port
-        for s_port in service_ports
-        if s_port["protocol"] == new_port["protocol"] and keyisset("published", s_port)
-    ]
-    same_protocol_target_not_published_ports = [
-        s_port
-        for s_port in service_ports
-        if s_port["protocol"] == new_port["protocol"]
-        and not keyisset("published", s_port)
-    ]
-    if not service_ports:
-        service_ports.append(new_port)
-    elif service_ports and not keyisset("published", new_port):
-        if new_port["target"] not in [
-            _port["target"] for _port in same_protocol_target_not_published_ports
-        ]:
-            service_ports.append(new_port)
-    elif service_ports and keyisset("published", new_port):
-        if new_port["published"] not in [
-            _port["published"] for _port in same_protocol_published_ports
-        ]:
-            service_ports.append(new_port)
-        elif new_port["published"] in [
-            _port["published"] for _port in same_protocol_published_ports
-        ]:
-            replace_published_port(service_ports, new_port["published"], new_port)
+    if keyisset("published", new_port):
+        for port in service_ports:
+            if (
+                port["protocol"] == new_port["protocol"]
+                and keyisset("published", port)
+                and port["published"] == new_port["published"]
+            ):
+                port["target"] = new_port["target"]
+                return
+    else:
+        for port in service_ports:
+            if (
+                port["protocol"] == new_port["protocol"]
+                and not keyisset("published", port)
+                and port["target"] == new_port["target"]
+            ):
+                return
+    service_ports.append(new_port)
 
 
 def set_service_ports(ports: list):
     """Function to define common structure to ports"""
-    service_ports = []
+    table = PortTable()
     for src_port in ports:
-        the_port = {}
-        if isinstance(src_port, str):
-            the_port = handle_str_definition(src_port)
-        elif isinstance(src_port, dict):
-            the_port = src_port
-            the_port["protocol"] = set_else_none("protocol", src_port, "tcp")
-            the_port["name"] = set_else_none(
-                "name", src_port, f"{the_port['protocol']}_{the_port['target']}"
-            )
-        elif isinstance(src_port, int):
-            the_port = {
-                "protocol": "tcp",
-                "target": src_port,
-            }
-        add_port_to_service_ports(service_ports, the_port)
-    return service_ports
+        table.add(normalize_port(src_port))
+    return table.to_list()
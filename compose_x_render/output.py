@@ -0,0 +1,115 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to serialize the rendered definitions into the output formats:
+
+* yaml: the YAML document, same as ``yaml.safe_dump``
+* json: the JSON document, indented
+* json-compact: the JSON document, on a single line
+* ndjson: one JSON document per line, each holding one service, or one of the other top-level keys.
+  Deep merging all the lines gives back the full document.
+
+The changes between two renders (see compose_x_render.diff) are output as text, one per line, or as json.
+
+JSON outputs are serialized with the C encoder of the json module, with sorted keys, same as the YAML output.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import IO, Iterator, Union
+
+from compose_x_render.consts import SERVICES
+
+YAML_FORMAT = "yaml"
+JSON_FORMAT = "json"
+JSON_COMPACT_FORMAT = "json-compact"
+NDJSON_FORMAT = "ndjson"
+OUTPUT_FORMATS = [YAML_FORMAT, JSON_FORMAT, JSON_COMPACT_FORMAT, NDJSON_FORMAT]
+TEXT_FORMAT = "text"
+DIFF_FORMATS = [TEXT_FORMAT, JSON_FORMAT]
+
+
+def for_compose_x_macro(definition: dict) -> dict:
+    """Wraps the definition into the ECS Compose-X CFN Macro transform"""
+    return {
+        "Fn::Transform": {
+            "Name": "compose-x",
+            "Parameters": {"Raw": definition},
+        }
+    }
+
+
+def dump_json(data, compact: bool = False) -> str:
+    """
+    Serializes the data to JSON, with a trailing new line.
+
+    :param data: The data to serialize
+    :param bool compact: Whether to output on a single line, without spaces, or indented.
+    """
+    if compact:
+        return json.dumps(data, sort_keys=True, separators=(",", ":")) + "\n"
+    return json.dumps(data, sort_keys=True, indent=2) + "\n"
+
+
+def iter_ndjson(definition: dict, for_compose_x: bool = False) -> Iterator[str]:
+    """
+    Yields the lines of the NDJSON output: one per service, then one per other top-level key.
+
+    :param dict definition: The rendered definition
+    :param bool for_compose_x: Whether to wrap each line into the ECS Compose-X CFN Macro transform
+    """
+    for key in sorted(definition):
+        if key == SERVICES and isinstance(definition[key], dict):
+            fragments = [
+                {SERVICES: {name: definition[key][name]}}
+                for name in sorted(definition[key])
+            ]
+        else:
+            fragments = [{key: definition[key]}]
+        for fragment in fragments:
+            if for_compose_x:
+                fragment = for_compose_x_macro(fragment)
+            yield dump_json(fragment, compact=True)
+
+
+def dump_output(
+    definition: dict,
+    output_format: str = YAML_FORMAT,
+    for_compose_x: bool = False,
+    stream: IO[str] = None,
+) -> Union[str, None]:
+    """
+    Serializes the definition into the output format. Writes it into the stream as it is serialized,
+    or returns it if there is no stream.
+
+    :param dict definition: The rendered definition
+    :param str output_format: One of OUTPUT_FORMATS
+    :param bool for_compose_x: Whether to wrap the definition into the ECS Compose-X CFN Macro transform
+    :param stream: The file object to write to.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            "Output format",
+            output_format,
+            "is not valid. Must be one of",
+            OUTPUT_FORMATS,
+        )
+    if output_format == NDJSON_FORMAT:
+        if stream is None:
+            return "".join(iter_ndjson(definition, for_compose_x))
+        for line in iter_ndjson(definition, for_compose_x):
+            stream.write(line)
+        return None
+    if for_compose_x:
+        definition = for_compose_x_macro(definition)
+    if output_format == YAML_FORMAT:
+        from compose_x_render.yaml_dumper import dump_yaml
+
+        return dump_yaml(definition, stream)
+    content = dump_json(definition, compact=output_format == JSON_COMPACT_FORMAT)
+    if stream is None:
+        return content
+    stream.write(content)
+    return None
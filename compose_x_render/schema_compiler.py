@@ -0,0 +1,405 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to turn a JSON schema (compose-spec.json) into specialized Python validation code.
+
+Each subschema becomes a plain function that returns whether the data is valid for it, which is much faster than
+the generic jsonschema validation. When the data is invalid, the jsonschema validator is used to report the error,
+so the errors and their paths are the same whichever engine is used.
+
+Schemas using keywords, or references, the compiler does not support are validated with jsonschema only.
+
+The generated code is cached in the user cache directory, keyed by a hash of the schema. It is only compiled
+in memory when the cache directory cannot be written to.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from os import path
+from tempfile import NamedTemporaryFile
+from typing import Iterator, Union
+
+from jsonschema.exceptions import ValidationError
+from jsonschema.protocols import Validator
+
+COMPILER_VERSION = "1"
+CACHE_DIR_NAME = path.join("compose-x-render", "validators")
+
+TYPES_CHECKS = {
+    "object": "isinstance(d, dict)",
+    "array": "isinstance(d, list)",
+    "string": "isinstance(d, str)",
+    "null": "d is None",
+    "boolean": "isinstance(d, bool)",
+    "integer": "_is_integer(d)",
+    "number": "_is_number(d)",
+}
+ANNOTATIONS = [
+    "$schema",
+    "$id",
+    "id",
+    "$comment",
+    "title",
+    "description",
+    "default",
+    "deprecated",
+    "examples",
+    "definitions",
+    "$defs",
+    "format",
+]
+OBJECT_KEYWORDS = [
+    "properties",
+    "patternProperties",
+    "additionalProperties",
+    "required",
+]
+ARRAY_KEYWORDS = ["items", "uniqueItems"]
+KEYWORDS = (
+    ["$ref", "type", "enum", "pattern", "minimum", "maximum"]
+    + ["anyOf", "oneOf", "allOf", "not"]
+    + OBJECT_KEYWORDS
+    + ARRAY_KEYWORDS
+)
+
+
+def _is_integer(data) -> bool:
+    if isinstance(data, bool):
+        return False
+    return isinstance(data, int) or (isinstance(data, float) and data.is_integer())
+
+
+def _is_number(data) -> bool:
+    return isinstance(data, (int, float)) and not isinstance(data, bool)
+
+
+def _equal(one, two) -> bool:
+    """Same equality as jsonschema uses for enum and uniqueItems: booleans are never equal to numbers."""
+    if one is two:
+        return True
+    if isinstance(one, str) or isinstance(two, str):
+        return one == two
+    if isinstance(one, list) and isinstance(two, list):
+        return len(one) == len(two) and all(_equal(a, b) for a, b in zip(one, two))
+    if isinstance(one, dict) and isinstance(two, dict):
+        return one.keys() == two.keys() and all(_equal(one[k], two[k]) for k in one)
+    if isinstance(one, bool) or isinstance(two, bool):
+        return type(one) is type(two) and one == two
+    return one == two
+
+
+def _in_enum(data, values) -> bool:
+    return any(_equal(data, value) for value in values)
+
+
+def _unique(items: list) -> bool:
+    if all(isinstance(item, str) for item in items):
+        return len(set(items)) == len(items)
+    for count, item in enumerate(items):
+        for other in items[count + 1 :]:
+            if _equal(item, other):
+                return False
+    return True
+
+
+def _true(data) -> bool:
+    return True
+
+
+def _false(data) -> bool:
+    return False
+
+
+RUNTIME_HELPERS = {
+    "re": re,
+    "_is_integer": _is_integer,
+    "_is_number": _is_number,
+    "_in_enum": _in_enum,
+    "_unique": _unique,
+    "_true": _true,
+    "_false": _false,
+}
+
+
+def schema_hash(schema: dict) -> str:
+    """Stable hash of the schema content and of the compiler version"""
+    content = json.dumps(schema, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{COMPILER_VERSION}:{content}".encode()).hexdigest()
+
+
+def code_header(schema_digest: str, body: str) -> str:
+    """The header of the generated code: the hashes of the schema, and of the code body that follows it"""
+    return (
+        f"# Generated by compose_x_render.schema_compiler {COMPILER_VERSION}\n"
+        f"# Schema hash: {schema_digest}\n"
+        f"# Code hash: {hashlib.sha256(body.encode()).hexdigest()}\n"
+    )
+
+
+def verified_code(code: str, schema_digest: str) -> Union[str, None]:
+    """Returns the cached code if its header matches the schema and its whole body, None otherwise."""
+    parts = code.split("\n", 3)
+    if len(parts) < 4:
+        return None
+    if code_header(schema_digest, parts[3]) + parts[3] != code:
+        return None
+    return code
+
+
+class SchemaCompiler:
+    """
+    Generates the Python source code of a validation module for a JSON schema.
+    The module exposes ``validate(data) -> bool``.
+    """
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+        self.functions: dict = {}
+        self.blocks: list[list[str]] = []
+        self.constants: list[str] = []
+
+    def compile(self) -> str:
+        entrypoint = self.function_for(self.schema)
+        lines = [""]
+        for block in self.blocks:
+            lines += block
+            lines.append("")
+        lines += self.constants
+        lines.append("")
+        lines.append(f"validate = {entrypoint}")
+        lines.append("")
+        body = "\n".join(lines)
+        return code_header(schema_hash(self.schema), body) + body
+
+    def resolve(self, reference: str) -> Union[dict, bool]:
+        if not reference.startswith("#"):
+            raise NotImplementedError(
+                f"Only local references are supported. Got {reference}"
+            )
+        target = self.schema
+        for part in reference[1:].split("/")[1:]:
+            part = part.replace("~1", "/").replace("~0", "~")
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        return target
+
+    def constant(self, value_repr: str) -> str:
+        name = f"_C{len(self.constants)}"
+        self.constants.append(f"{name} = {value_repr}")
+        return name
+
+    def function_for(self, schema: Union[dict, bool]) -> str:
+        """Returns the name of the function validating the subschema, generating it if necessary."""
+        if schema is True or schema == {}:
+            return "_true"
+        if schema is False:
+            return "_false"
+        if id(schema) in self.functions:
+            return self.functions[id(schema)]
+        name = f"_v{len(self.functions)}"
+        self.functions[id(schema)] = name
+        block = [f"def {name}(d):"]
+        block += [f"    {line}" for line in self.body_for(schema)]
+        block.append("    return True")
+        self.blocks.append(block)
+        return name
+
+    def body_for(self, schema: dict) -> list[str]:
+        for keyword in schema:
+            if keyword not in KEYWORDS and keyword not in ANNOTATIONS:
+                raise NotImplementedError(
+                    f"JSON Schema keyword {keyword} is not supported"
+                )
+        lines = []
+        if "$ref" in schema:
+            lines.append(
+                f"if not {self.function_for(self.resolve(schema['$ref']))}(d): return False"
+            )
+        if "type" in schema:
+            types = (
+                schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+            )
+            lines.append(
+                f"if not ({' or '.join(TYPES_CHECKS[_type] for _type in types)}): return False"
+            )
+        if "enum" in schema:
+            values = schema["enum"]
+            if all(isinstance(value, str) for value in values):
+                enum = self.constant(repr(frozenset(values)))
+                lines.append(
+                    f"if not (isinstance(d, str) and d in {enum}): return False"
+                )
+            else:
+                enum = self.constant(repr(values))
+                lines.append(f"if not _in_enum(d, {enum}): return False")
+        if "pattern" in schema:
+            regex = self.constant(f"re.compile({schema['pattern']!r})")
+            lines.append(
+                f"if isinstance(d, str) and not {regex}.search(d): return False"
+            )
+        if "minimum" in schema:
+            lines.append(
+                f"if _is_number(d) and d < {schema['minimum']!r}: return False"
+            )
+        if "maximum" in schema:
+            lines.append(
+                f"if _is_number(d) and d > {schema['maximum']!r}: return False"
+            )
+        if any(keyword in schema for keyword in OBJECT_KEYWORDS):
+            lines.append("if isinstance(d, dict):")
+            lines += [f"    {line}" for line in self.object_body(schema)]
+        if any(keyword in schema for keyword in ARRAY_KEYWORDS):
+            lines.append("if isinstance(d, list):")
+            lines += [f"    {line}" for line in self.array_body(schema)]
+        if "allOf" in schema:
+            checks = [f"{self.function_for(sub)}(d)" for sub in schema["allOf"]]
+            lines.append(f"if not ({' and '.join(checks)}): return False")
+        if "anyOf" in schema:
+            checks = [f"{self.function_for(sub)}(d)" for sub in schema["anyOf"]]
+            lines.append(f"if not ({' or '.join(checks)}): return False")
+        if "oneOf" in schema:
+            checks = [f"{self.function_for(sub)}(d)" for sub in schema["oneOf"]]
+            lines.append(f"if ({' + '.join(checks)}) != 1: return False")
+        if "not" in schema:
+            lines.append(f"if {self.function_for(schema['not'])}(d): return False")
+        return lines
+
+    def object_body(self, schema: dict) -> list[str]:
+        lines = []
+        for required in schema.get("required", []):
+            lines.append(f"if {required!r} not in d: return False")
+        properties = schema.get("properties", {})
+        patterns = schema.get("patternProperties", {})
+        additional = schema.get("additionalProperties", True)
+        if not properties and not patterns and additional is True:
+            return lines or ["pass"]
+        props = self.constant(
+            "{"
+            + ", ".join(
+                f"{key!r}: {self.function_for(sub)}" for key, sub in properties.items()
+            )
+            + "}"
+        )
+        lines.append("for k, v in d.items():")
+        lines.append(f"    f = {props}.get(k)")
+        lines.append("    if f is not None and not f(v): return False")
+        if patterns:
+            pats = self.constant(
+                "("
+                + "".join(
+                    f"(re.compile({pattern!r}), {self.function_for(sub)}), "
+                    for pattern, sub in patterns.items()
+                )
+                + ")"
+            )
+            lines.append("    matched = f is not None")
+            lines.append(f"    for rx, pf in {pats}:")
+            lines.append("        if rx.search(k):")
+            lines.append("            matched = True")
+            lines.append("            if not pf(v): return False")
+        else:
+            lines.append("    matched = f is not None")
+        if additional is not True:
+            lines.append(
+                f"    if not matched and not {self.function_for(additional)}(v): return False"
+            )
+        return lines
+
+    def array_body(self, schema: dict) -> list[str]:
+        lines = []
+        if schema.get("uniqueItems"):
+            lines.append("if not _unique(d): return False")
+        items = schema.get("items", True)
+        if isinstance(items, list):
+            funcs = self.constant(
+                "(" + "".join(f"{self.function_for(sub)}, " for sub in items) + ")"
+            )
+            lines.append(f"for f, x in zip({funcs}, d):")
+            lines.append("    if not f(x): return False")
+        elif items is not True and items != {}:
+            lines.append("for x in d:")
+            lines.append(f"    if not {self.function_for(items)}(x): return False")
+        return lines or ["pass"]
+
+
+def default_cache_dir() -> str:
+    """Returns the user cache directory of the generated code: $XDG_CACHE_HOME, or ~/.cache"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or path.join(
+        path.expanduser("~"), ".cache"
+    )
+    return path.join(cache_home, CACHE_DIR_NAME)
+
+
+def load_generated_code(schema: dict, cache_dir: str = None) -> str:
+    """
+    Returns the generated validation code for the schema, from the cache directory if present and intact:
+    cached files which body does not match the hash of their header are generated again.
+    The code is written to the cache directory when possible. Failing to write it is not an error.
+
+    :param dict schema: The JSON schema
+    :param str cache_dir: Directory to store the generated code into. Defaults to default_cache_dir()
+    :raises: NotImplementedError if the schema uses keywords the compiler does not support.
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    digest = schema_hash(schema)
+    file_path = path.join(cache_dir, f"validator_{digest[:32]}.py")
+    try:
+        with open(file_path) as code_fd:
+            code = verified_code(code_fd.read(), digest)
+        if code is not None:
+            return code
+    except (OSError, UnicodeDecodeError):
+        pass
+    code = SchemaCompiler(schema).compile()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with NamedTemporaryFile(
+            "w", dir=cache_dir, suffix=".tmp", delete=False
+        ) as code_fd:
+            code_fd.write(code)
+        os.replace(code_fd.name, file_path)
+    except OSError:
+        pass
+    return code
+
+
+class FastValidator:
+    """
+    Validator using the generated code to validate the data.
+    Errors are reported by the jsonschema validator it wraps, so they are identical for both engines.
+    If the schema cannot be compiled, the data is validated with the jsonschema validator only.
+
+    :param validator: The jsonschema validator for the schema.
+    :param str cache_dir: Directory of the generated code cache.
+    """
+
+    def __init__(self, validator: Validator, cache_dir: str = None):
+        self.fallback = validator
+        self.schema = validator.schema
+        try:
+            code = load_generated_code(self.schema, cache_dir)
+        except NotImplementedError:
+            self.compiled = False
+            self.check = validator.is_valid
+            return
+        namespace = dict(RUNTIME_HELPERS)
+        exec(compile(code, "<compose-spec>", "exec"), namespace)
+        self.compiled = True
+        self.check = namespace["validate"]
+
+    def is_valid(self, instance) -> bool:
+        return self.check(instance)
+
+    def iter_errors(self, instance) -> Iterator[ValidationError]:
+        if self.check(instance):
+            return iter(())
+        return self.fallback.iter_errors(instance)
+
+    def validate(self, instance) -> None:
+        if not self.check(instance):
+            self.fallback.validate(instance)
@@ -0,0 +1,92 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to project compose definitions onto the key paths selected by path expressions.
+
+A path expression is a list of keys separated by dots, where ``*`` matches any key, and ``\\.`` is a dot within
+a key: ``services.*.image``, ``services.app.labels.com\\.example\\.team``, ``x-cluster``.
+Lists and scalar values are selected whole: paths stop at them.
+
+Projecting every compose file before merging them gives the same result as projecting the merged definition,
+as merges are done key by key. So only the selected subtrees are merged, interpolated and validated.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Union
+
+WILDCARD = "*"
+SERVICES_IMAGES_SELECTION = "services.*.image"
+SEPARATOR_RE = re.compile(r"(?<!\\)\.")
+
+
+def parse_selectors(selectors: list[str]) -> dict:
+    """
+    Parses the path expressions into a selection: a tree of the selected keys, where an empty dict selects the
+    whole value.
+
+    :param list[str] selectors: The path expressions
+    :raises: ValueError if an expression is empty or has an empty key.
+    """
+    paths = []
+    for selector in selectors:
+        keys = [key.replace("\\.", ".") for key in SEPARATOR_RE.split(selector)]
+        if not all(keys):
+            raise ValueError("Selection path", selector, "has an empty key")
+        paths.append(keys)
+    selection: dict = {}
+    for keys in sorted(paths, key=len):
+        node = selection
+        for key in keys[:-1]:
+            if node.get(key) == {}:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[keys[-1]] = {}
+    return selection
+
+
+def merge_selections(first: dict, second: dict) -> dict:
+    """Returns the selection of the keys selected by either selection"""
+    if not first or not second:
+        return {}
+    merged = dict(first)
+    for key, sub_selection in second.items():
+        merged[key] = (
+            merge_selections(merged[key], sub_selection)
+            if key in merged
+            else sub_selection
+        )
+    return merged
+
+
+def key_selection(selection: dict, key) -> Union[dict, None]:
+    """Returns the selection applied to the value of the key, None if the key is not selected."""
+    key = str(key)
+    named = selection.get(key)
+    wildcard = selection.get(WILDCARD) if key != WILDCARD else None
+    if named is None:
+        return wildcard
+    if wildcard is None:
+        return named
+    return merge_selections(named, wildcard)
+
+
+def select_paths(content, selection: dict):
+    """
+    Returns the projection of the content onto the selection. Only the selected keys are kept, with their
+    containers. The content is not modified, and the selected values are shared with it.
+
+    :param content: The definition to project
+    :param dict selection: The selection, from parse_selectors
+    """
+    if not selection or not isinstance(content, dict):
+        return content
+    projection = {}
+    for key, value in content.items():
+        sub_selection = key_selection(selection, key)
+        if sub_selection is not None:
+            projection[key] = select_paths(value, sub_selection)
+    return projection
@@ -0,0 +1,164 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to render compose files from a long-running process, listening on a Unix socket.
+
+The validators are built once, when the server starts, and the parsed compose files are kept in memory until
+they change, so a render only merges, interpolates, validates and serializes. Renders run concurrently, one
+thread per connection. See compose_x_render.client for the protocol.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socketserver
+import threading
+from collections import OrderedDict
+from typing import Union
+
+from compose_x_render.client import send_request
+from compose_x_render.compose_x_render import load_compose_file
+from compose_x_render.output import YAML_FORMAT, dump_output
+from compose_x_render.validation import JSONSCHEMA_ENGINE, get_validator
+from compose_x_render.watch import IncrementalRenderer
+
+DEFAULT_MAX_FILES = 1024
+
+
+class ParsedFilesCache:
+    """
+    In-memory cache of the parsed compose files, keyed by path. A file is parsed again when its modification
+    time, size or inode changed. The cached contents are shared between renders, which must not modify them.
+
+    :param int max_files: Number of files to keep, the least recently used ones are evicted first.
+    """
+
+    def __init__(self, max_files: int = DEFAULT_MAX_FILES):
+        self.max_files = max_files
+        self.files: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+    def load(self, file_path: str) -> Union[dict, list]:
+        """Returns the content of the file, parsing it only if it changed since it was cached."""
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        state = stat.st_mtime_ns, stat.st_size, stat.st_ino
+        with self.lock:
+            cached = self.files.get(file_path)
+            if cached is not None and cached[0] == state:
+                self.files.move_to_end(file_path)
+                return cached[1]
+        content = load_compose_file(file_path)
+        with self.lock:
+            self.files[file_path] = (state, content)
+            self.files.move_to_end(file_path)
+            while len(self.files) > self.max_files:
+                self.files.popitem(last=False)
+        return content
+
+
+def render_request(request: dict, files_cache: ParsedFilesCache) -> dict:
+    """
+    Renders the files of the request. Errors are reported in the response, not raised.
+
+    :param dict request: The render request
+    :param ParsedFilesCache files_cache: The parsed files cache to load the files from
+    :return: The response, with the output or the error.
+    """
+    try:
+        files_list = request.get("files")
+        if (
+            not isinstance(files_list, list)
+            or not files_list
+            or not all(isinstance(file_path, str) for file_path in files_list)
+        ):
+            raise ValueError("Request files must be a non-empty list of paths")
+        renderer = IncrementalRenderer(
+            files_list,
+            no_interpolate=bool(request.get("no_interpolate")),
+            keep_if_undefined=bool(request.get("keep_if_undefined")),
+            validator_engine=request.get("validator_engine", JSONSCHEMA_ENGINE),
+            environ=request.get("env"),
+            load_function=files_cache.load,
+        )
+        output = dump_output(
+            renderer.render(),
+            request.get("output_format", YAML_FORMAT),
+            bool(request.get("compose_x")),
+        )
+        return {"status": "success", "output": output}
+    except Exception as error:
+        return {"status": "failure", "error": f"{error.__class__.__name__}: {error}"}
+
+
+class RenderRequestHandler(socketserver.StreamRequestHandler):
+    """Renders each request line of the connection, and writes back the response line."""
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request must be a JSON object")
+            except ValueError as error:
+                response = {
+                    "status": "failure",
+                    "error": f"{error.__class__.__name__}: {error}",
+                }
+            else:
+                response = render_request(request, self.server.files_cache)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class RenderServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Server rendering compose files on a Unix socket, only accessible to the current user.
+    The validators of the engines are built before it starts listening.
+
+    :param str socket_path: Path of the Unix socket to listen on
+    :param list[str] validator_engines: The validation engines to build the validators of.
+    :raises: OSError if another server already listens on the socket.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, validator_engines: list[str] = None):
+        for engine in validator_engines or [JSONSCHEMA_ENGINE]:
+            get_validator(engine)
+        self.files_cache = ParsedFilesCache()
+        if os.path.exists(socket_path):
+            try:
+                send_request(socket_path, {}, timeout=1.0)
+            except OSError:
+                os.unlink(socket_path)
+            else:
+                raise OSError("A render server already listens on", socket_path)
+        previous_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, RenderRequestHandler)
+        finally:
+            os.umask(previous_umask)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def serve(socket_path: str, validator_engines: list[str] = None) -> None:
+    """
+    Renders requests on the socket until interrupted.
+
+    :param str socket_path: Path of the Unix socket to listen on
+    :param list[str] validator_engines: The validation engines to build the validators of before listening.
+    """
+    with RenderServer(socket_path, validator_engines) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
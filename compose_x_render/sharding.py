@@ -0,0 +1,163 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to render the services of large definitions over a processes pool.
+
+The services are split into contiguous shards. Each worker normalizes the ports of its shard, interpolates it and
+validates each of its services against the service definition subschema. The parent interpolates and validates the other top-level sections meanwhile, then reassembles the
+services in their original order.
+
+Validation errors cannot be sent back from the workers, so they only return the names of the invalid services,
+which the parent validates again to raise the same error as a single process render would.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Mapping, Union
+
+from compose_x_render.compose_x_render import (
+    interpolate_env_vars,
+    render_services_ports,
+)
+from compose_x_render.consts import SERVICES
+from compose_x_render.instrumentation import RenderProfile, profile_stage
+from compose_x_render.validation import (
+    JSONSCHEMA_ENGINE,
+    get_service_validator,
+    get_validator,
+    validate_definition,
+)
+
+if TYPE_CHECKING:
+    from jsonschema.protocols import Validator
+
+    from compose_x_render.schema_compiler import FastValidator
+
+SHARD_MIN_SERVICES = 50
+SERVICES_STAGE = "services"
+
+
+def shards_count(definition: dict, jobs: int) -> int:
+    """Number of shards to split the services of the definition into, at most one per job."""
+    services = definition.get(SERVICES)
+    if jobs <= 1 or not isinstance(services, dict):
+        return 0
+    return min(jobs, len(services) // SHARD_MIN_SERVICES)
+
+
+def split_services(services: dict, shards: int) -> list[dict]:
+    """Splits the services into contiguous shards of (almost) the same size, in order"""
+    names = list(services)
+    size, remainder = divmod(len(names), shards)
+    shards_services = []
+    start = 0
+    for count in range(shards):
+        end = start + size + (1 if count < remainder else 0)
+        shards_services.append({name: services[name] for name in names[start:end]})
+        start = end
+    return shards_services
+
+
+def warm_up(engine: str, services: dict) -> None:
+    """Builds the validators of the engine for the services, before the workers validate them."""
+    get_validator(engine)
+    for name in services:
+        get_service_validator(name, engine)
+
+
+def render_services_shard(
+    services: dict,
+    environ: Union[dict, None],
+    default_empty: Union[None, str],
+    engine: Union[str, None],
+) -> tuple[dict, Union[list, None]]:
+    """
+    Normalizes the ports, interpolates and validates the services, in a worker.
+
+    :param dict services: The shard services
+    :param environ: The environment variables to interpolate with. Not interpolated if None.
+    :param default_empty: Value for undefined variables. If None, they are left unchanged.
+    :param engine: The validation engine to validate the services with. Not validated if None.
+    :return: The rendered services, and the names of the invalid ones (None if not validated).
+    """
+    render_services_ports(services)
+    if environ is not None:
+        interpolate_env_vars(services, default_empty, environ)
+    if engine is None:
+        return services, None
+    return services, [
+        name
+        for name, service in services.items()
+        if not get_service_validator(name, engine).is_valid(service)
+    ]
+
+
+def render_sharded(
+    definition: dict,
+    shards: int,
+    environ: Union[Mapping[str, str], None],
+    default_empty: Union[None, str],
+    validator: Union[Validator, FastValidator] = None,
+    engine: str = JSONSCHEMA_ENGINE,
+    profile: RenderProfile = None,
+) -> dict:
+    """
+    Renders the merged definition, with its services split across a processes pool.
+    Same result, and same validation error, as rendering it in a single process.
+
+    :param dict definition: The merged definition
+    :param int shards: Number of shards, and of processes, to split the services into
+    :param environ: The environment variables to interpolate with. Not interpolated if None.
+    :param default_empty: Value for undefined variables. If None, they are left unchanged.
+    :param validator: Validator to use. It cannot be sent to the workers, so the parent validates the whole
+      definition with it once the services are rendered. Defaults to the process-wide one of the engine.
+    :param str engine: The validation engine to use if no validator is given.
+    :param RenderProfile profile: Records the services stage, which covers the workers and the parent
+      interpolation, then the parent validation stage.
+    :return: The rendered definition
+    """
+    workers_engine = None if validator is not None else engine
+    shards_environ = dict(environ) if environ is not None else None
+    if workers_engine:
+        warm_up(workers_engine, definition[SERVICES])
+    with profile_stage(profile, SERVICES_STAGE), ProcessPoolExecutor(
+        max_workers=shards,
+        initializer=warm_up if workers_engine else None,
+        initargs=(workers_engine, {}) if workers_engine else (),
+    ) as executor:
+        futures = [
+            executor.submit(
+                render_services_shard,
+                shard,
+                shards_environ,
+                default_empty,
+                workers_engine,
+            )
+            for shard in split_services(definition[SERVICES], shards)
+        ]
+        sections = {key: value for key, value in definition.items() if key != SERVICES}
+        if environ is not None:
+            interpolate_env_vars(sections, default_empty, environ)
+        services = {}
+        invalid = []
+        for future in futures:
+            shard_services, shard_invalid = future.result()
+            services.update(shard_services)
+            invalid += shard_invalid or []
+    rendered = {
+        key: services if key == SERVICES else sections[key] for key in definition
+    }
+    with profile_stage(profile, "validation"):
+        if workers_engine is None:
+            validate_definition(rendered, validator)
+        else:
+            validate_definition(
+                dict(
+                    rendered,
+                    **{SERVICES: {name: services[name] for name in invalid}},
+                ),
+                get_validator(workers_engine),
+            )
+    return rendered
@@ -0,0 +1,331 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to manage the compose-spec JSON schema validator.
+
+The schema is read, checked and compiled into a validator only once per process, the first time it is needed.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import TYPE_CHECKING, Union
+
+from compose_x_render.consts import SERVICES
+
+if TYPE_CHECKING:
+    from jsonschema.protocols import Validator
+
+    from compose_x_render.schema_compiler import FastValidator
+
+COMPOSE_SPEC_FILE = "compose-spec.json"
+JSONSCHEMA_ENGINE = "jsonschema"
+FAST_ENGINE = "fast"
+VALIDATION_ENGINES = [JSONSCHEMA_ENGINE, FAST_ENGINE]
+COMBINATION_KEYWORDS = {"allOf", "anyOf", "oneOf", "not", "if", "$ref"}
+
+_COMPOSE_SPEC: Union[dict, None] = None
+_VALIDATORS: dict = {}
+_SERVICE_VALIDATORS: dict = {}
+
+
+def get_compose_spec() -> dict:
+    """
+    Returns the compose-spec JSON schema shipped with the package. Loaded once and kept in memory.
+    """
+    global _COMPOSE_SPEC
+    if _COMPOSE_SPEC is None:
+        from importlib_resources import files as pkg_files
+
+        source = pkg_files("compose_x_render").joinpath(COMPOSE_SPEC_FILE)
+        _COMPOSE_SPEC = json.loads(source.read_text())
+    return _COMPOSE_SPEC
+
+
+def build_validator(
+    schema: dict = None, engine: str = JSONSCHEMA_ENGINE
+) -> Union[Validator, FastValidator]:
+    """
+    Checks the schema and creates the matching Draft*Validator for it.
+    The validator is used once against an empty document so that its references resolver is warm.
+
+    :param dict schema: The JSON schema to build the validator for. Defaults to the compose-spec.
+    :param str engine: The validation engine to use, one of VALIDATION_ENGINES.
+    """
+    if engine not in VALIDATION_ENGINES:
+        raise ValueError(
+            "Validation engine",
+            engine,
+            "is not valid. Must be one of",
+            VALIDATION_ENGINES,
+        )
+    from jsonschema.validators import validator_for
+
+    from compose_x_render.schema_compiler import FastValidator
+
+    if schema is None:
+        schema = get_compose_spec()
+    validator_cls = validator_for(schema)
+    validator_cls.check_schema(schema)
+    validator = validator_cls(schema)
+    for _ in validator.iter_errors({}):
+        pass
+    if engine == FAST_ENGINE:
+        return FastValidator(validator)
+    return validator
+
+
+def get_validator(engine: str = JSONSCHEMA_ENGINE) -> Union[Validator, FastValidator]:
+    """
+    Returns the process-wide compose-spec validator for the engine, building it the first time.
+
+    :param str engine: The validation engine to use, one of VALIDATION_ENGINES.
+    """
+    if _VALIDATORS.get(engine) is None:
+        _VALIDATORS[engine] = build_validator(engine=engine)
+    return _VALIDATORS[engine]
+
+
+def set_validator(
+    validator: Union[Validator, FastValidator, None], engine: str = JSONSCHEMA_ENGINE
+) -> Union[Validator, FastValidator, None]:
+    """
+    Swaps the process-wide validator of an engine. Setting it to None resets it, and the next call to
+    get_validator() builds a new one from the compose-spec.
+
+    :param validator: The validator to use for all subsequent validations.
+    :param str engine: The validation engine the validator is used for.
+    :return: The previously cached validator, if any.
+    """
+    previous = _VALIDATORS.get(engine)
+    _VALIDATORS[engine] = validator
+    return previous
+
+
+def validate_definition(
+    definition: dict,
+    validator: Union[Validator, FastValidator] = None,
+    engine: str = JSONSCHEMA_ENGINE,
+) -> None:
+    """
+    Validates the definition and raises the most relevant error, same as ``jsonschema.validate`` does.
+
+    :param dict definition: The compose definition to validate
+    :param validator: Validator to use. Defaults to the process-wide one of the engine.
+    :param str engine: The validation engine to use if no validator is given.
+    :raises: jsonschema.exceptions.ValidationError
+    """
+    from jsonschema.exceptions import best_match
+
+    if validator is None:
+        validator = get_validator(engine)
+    error = best_match(validator.iter_errors(definition))
+    if error is not None:
+        raise error
+
+
+def section_schema(schema: Union[dict, bool], key: str) -> Union[dict, bool]:
+    """Returns the subschema an object schema applies to the value of the key"""
+    if not isinstance(schema, dict):
+        return schema
+    if key in schema.get("properties", {}):
+        return schema["properties"][key]
+    for pattern, subschema in schema.get("patternProperties", {}).items():
+        if re.search(pattern, key):
+            return subschema
+    return schema.get("additionalProperties", True)
+
+
+def resolve_reference(root: dict, schema: Union[dict, bool]) -> Union[dict, bool]:
+    """Follows the local references ($ref to "#/...") of the schema, within the root schema"""
+    while isinstance(schema, dict) and str(schema.get("$ref", "")).startswith("#/"):
+        reference = schema["$ref"]
+        schema = root
+        for token in reference[2:].split("/"):
+            schema = schema[token.replace("~1", "/").replace("~0", "~")]
+    return schema
+
+
+def standalone_schema(root: dict, schema: Union[dict, bool]) -> dict:
+    """Returns the subschema of the root schema as a schema of its own, with the definitions it may reference"""
+    if not isinstance(schema, dict):
+        schema = {} if schema else {"not": {}}
+    standalone = {
+        key: root[key] for key in ["$schema", "definitions", "$defs"] if key in root
+    }
+    standalone.update(schema)
+    return standalone
+
+
+def get_service_validator(
+    name: str, engine: str = JSONSCHEMA_ENGINE
+) -> Union[Validator, FastValidator]:
+    """
+    Returns the validator of the service definition subschema a service name maps to, in the schema of the
+    process-wide validator of the engine. Built the first time it is needed.
+
+    :param str name: The service name
+    :param str engine: The validation engine to use, one of VALIDATION_ENGINES.
+    """
+    root = get_validator(engine).schema
+    schema = resolve_reference(
+        root, section_schema(section_schema(root, SERVICES), name)
+    )
+    cached = _SERVICE_VALIDATORS.get((engine, id(schema)))
+    if cached is None or cached[0] is not schema:
+        cached = (schema, build_validator(standalone_schema(root, schema), engine))
+        _SERVICE_VALIDATORS[(engine, id(schema))] = cached
+    return cached[1]
+
+
+def validate_changes(
+    definition: dict,
+    previous: Union[dict, None],
+    validator: Union[Validator, FastValidator] = None,
+    engine: str = JSONSCHEMA_ENGINE,
+) -> None:
+    """
+    Validates only the top-level sections, and the services, that differ from the previous, valid, definition.
+    The whole definition is validated if there is no previous definition, or if top-level keys were added or removed.
+    The changed sections are always validated with jsonschema, even with the fast engine: the generated code
+    only validates whole definitions, which takes longer than validating the few sections that changed.
+
+    :param dict definition: The compose definition to validate
+    :param dict previous: The previous version of the definition, already validated.
+    :param validator: Validator to use. Defaults to the process-wide one of the engine.
+    :param str engine: The validation engine to use if no validator is given.
+    :raises: jsonschema.exceptions.ValidationError
+    """
+    from jsonschema.exceptions import best_match
+
+    if validator is None:
+        validator = get_validator(engine)
+    if previous is None or definition.keys() != previous.keys():
+        return validate_definition(definition, validator)
+    root_validator = getattr(validator, "fallback", validator)
+    changes = []
+    for key, value in definition.items():
+        previous_value = previous[key]
+        if value is previous_value or value == previous_value:
+            continue
+        key_schema = section_schema(root_validator.schema, key)
+        if (
+            key == "services"
+            and isinstance(value, dict)
+            and isinstance(previous_value, dict)
+            and value.keys() == previous_value.keys()
+        ):
+            for name, service in value.items():
+                if service != previous_value[name]:
+                    changes.append(
+                        ((key, name), section_schema(key_schema, name), service)
+                    )
+        else:
+            changes.append(((key,), key_schema, value))
+    errors = []
+    for path, schema, value in changes:
+        for error in root_validator.evolve(schema=schema).iter_errors(value):
+            error.path.extendleft(reversed(path))
+            errors.append(error)
+    error = best_match(errors)
+    if error is not None:
+        raise error
+
+
+def validate_selection(
+    definition: dict,
+    selection: dict,
+    validator: Union[Validator, FastValidator] = None,
+    engine: str = JSONSCHEMA_ENGINE,
+) -> None:
+    """
+    Validates a definition projected onto the selection. Each selected value is validated against its subschema.
+    The objects containing them only against the type of their schema, as the keys that are not selected are
+    missing. Selections reaching into values which schema combines subschemas (oneOf, anyOf...) are validated
+    at that value, where only the selected keys are required, and oneOf is checked as anyOf, as trimmed objects
+    may match several of the subschemas.
+    With the fast engine, a projection the generated code finds valid against the whole schema is accepted as is.
+    The others, such as projections missing required keys, are validated with jsonschema as above.
+
+    :param dict definition: The projected compose definition, see compose_x_render.selection
+    :param dict selection: The selection the definition was projected onto
+    :param validator: Validator to use. Defaults to the process-wide one of the engine.
+    :param str engine: The validation engine to use if no validator is given.
+    :raises: jsonschema.exceptions.ValidationError
+    """
+    from jsonschema.exceptions import best_match
+    from jsonschema.validators import extend
+
+    from compose_x_render.selection import WILDCARD, key_selection
+
+    if validator is None:
+        validator = get_validator(engine)
+    if not selection:
+        return validate_definition(definition, validator)
+    root_validator = getattr(validator, "fallback", validator)
+    if root_validator is not validator and validator.is_valid(definition):
+        return
+    root = root_validator.schema
+    errors = []
+    projected: dict[int, dict] = {}
+    keywords = type(root_validator).VALIDATORS
+
+    def selected_required(partial, required, instance, schema):
+        value_selection = projected.get(id(instance))
+        if value_selection and WILDCARD not in value_selection:
+            required = [key for key in required if key in value_selection]
+        yield from keywords["required"](partial, required, instance, schema)
+
+    def selected_one_of(partial, one_of, instance, schema):
+        keyword = "anyOf" if projected.get(id(instance)) else "oneOf"
+        yield from keywords[keyword](partial, one_of, instance, schema)
+
+    partial_validator = extend(
+        type(root_validator),
+        {"required": selected_required, "oneOf": selected_one_of},
+    )(root)
+
+    def index_projected(value, value_selection: dict) -> None:
+        if not value_selection or not isinstance(value, dict):
+            return
+        projected[id(value)] = value_selection
+        for key, item in value.items():
+            index_projected(item, key_selection(value_selection, key))
+
+    def validate_at(
+        value, schema: Union[dict, bool], path: tuple, value_selection: dict = None
+    ) -> None:
+        checker = root_validator
+        if value_selection and isinstance(value, dict):
+            index_projected(value, value_selection)
+            checker = partial_validator
+        for error in checker.evolve(schema=schema).iter_errors(value):
+            error.path.extendleft(reversed(path))
+            errors.append(error)
+
+    def walk(value, schema: Union[dict, bool], value_selection: dict, path: tuple):
+        schema = resolve_reference(root, schema)
+        if (
+            not value_selection
+            or not isinstance(value, dict)
+            or not isinstance(schema, dict)
+        ):
+            return validate_at(value, schema, path)
+        if COMBINATION_KEYWORDS.intersection(schema):
+            return validate_at(value, schema, path, value_selection)
+        if "type" in schema:
+            validate_at(value, {"type": schema["type"]}, path)
+        for key, item in value.items():
+            walk(
+                item,
+                section_schema(schema, key),
+                key_selection(value_selection, key),
+                path + (key,),
+            )
+
+    walk(definition, root, selection, ())
+    error = best_match(errors)
+    if error is not None:
+        raise error
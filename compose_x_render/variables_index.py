@@ -0,0 +1,105 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to index where environment variables are referenced in a definition, so that it can be interpolated
+again for another environment by only rendering the strings that use a variable which value changed.
+
+Paths are tuples of the keys (and list indexes) leading to the string, from the top of the definition.
+The strings indexed are the ones interpolate_env_vars interpolates.
+"""
+
+from __future__ import annotations
+
+from typing import Mapping, Union
+
+from compose_x_render.envsubst import (
+    compile_template,
+    render_template,
+    template_variables,
+)
+
+
+def replace_paths(content: Union[dict, list], updates: list[tuple], depth: int = 0):
+    """
+    Returns a copy of the content with the values at the paths replaced.
+    Only the containers along the paths are copied, the rest is shared with the content.
+
+    :param content: The dict or list to update
+    :param list[tuple] updates: The (path, value) to set
+    :param int depth: Depth of the content in the paths
+    """
+    content = dict(content) if isinstance(content, dict) else list(content)
+    children: dict = {}
+    for path, value in updates:
+        if len(path) == depth + 1:
+            content[path[depth]] = value
+        else:
+            children.setdefault(path[depth], []).append((path, value))
+    for key, child_updates in children.items():
+        content[key] = replace_paths(content[key], child_updates, depth + 1)
+    return content
+
+
+class VariablesIndex:
+    """
+    Index of the strings of an uninterpolated definition that reference environment variables.
+
+    :param dict content: The merged, uninterpolated, definition
+    """
+
+    def __init__(self, content: dict):
+        self.templates: dict[tuple, tuple] = {}
+        self.paths_by_variable: dict[str, list[tuple]] = {}
+        self.index(content, ())
+
+    def index(self, content: dict, path: tuple) -> None:
+        for key, value in content.items():
+            if isinstance(value, dict):
+                self.index(value, path + (key,))
+            elif isinstance(value, list):
+                for count, item in enumerate(value):
+                    if isinstance(item, dict):
+                        self.index(item, path + (key, count))
+                    elif isinstance(item, str):
+                        self.add(path + (key, count), item)
+            elif isinstance(value, str):
+                self.add(path + (key,), value)
+
+    def add(self, path: tuple, value: str) -> None:
+        if "$" not in value:
+            return
+        compiled = compile_template(value)
+        self.templates[path] = compiled
+        for name in template_variables(compiled):
+            self.paths_by_variable.setdefault(name, []).append(path)
+
+    @property
+    def variables(self) -> set[str]:
+        return set(self.paths_by_variable)
+
+    def affected_paths(
+        self, environ: Mapping[str, str], previous_environ: Mapping[str, str]
+    ) -> set[tuple]:
+        """Returns the paths of the strings using a variable which value differs between the environments"""
+        paths = set()
+        for name, name_paths in self.paths_by_variable.items():
+            if environ.get(name) != previous_environ.get(name):
+                paths.update(name_paths)
+        return paths
+
+    def render(
+        self, paths, default: Union[None, str], environ: Mapping[str, str]
+    ) -> dict[tuple, str]:
+        """
+        Renders the strings at the paths.
+
+        :param paths: The paths to render
+        :param default: Value for undefined variables. If None, they are left unchanged.
+        :param environ: The environment variables.
+        :return: The rendered value of each path
+        """
+        return {
+            path: render_template(self.templates[path], default, environ)
+            for path in paths
+        }
@@ -0,0 +1,304 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to render the compose files again every time one of them changes.
+
+The parsed files, and the merge of each prefix of the files chain, are kept in memory. When a file changes, only
+that file is parsed again, the chain is merged again from its position, and only the top-level sections and
+services that changed are validated.
+
+Files changes are detected with inotify on Linux, by polling the files status otherwise.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from os import path
+from typing import TYPE_CHECKING, Callable, Mapping, Union
+
+from compose_x_common.compose_x_common import keyisset
+
+from compose_x_render.compose_x_render import (
+    load_compose_file,
+    merge_config_files_chain,
+    render_services_ports,
+)
+from compose_x_render.consts import SERVICES
+from compose_x_render.envsubst import environ_snapshot
+from compose_x_render.validation import JSONSCHEMA_ENGINE, validate_changes
+from compose_x_render.variables_index import VariablesIndex, replace_paths
+
+if TYPE_CHECKING:
+    from jsonschema.protocols import Validator
+
+POLL_INTERVAL = 0.5
+DEBOUNCE_DELAY = 0.05
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_TO
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """
+    Detects files changes by comparing their modification time, size and inode every interval.
+
+    :param list[str] files_list: The files to watch
+    :param float interval: Seconds between two checks
+    """
+
+    def __init__(self, files_list: list[str], interval: float = POLL_INTERVAL):
+        self.interval = interval
+        self.states = {file_path: self.state(file_path) for file_path in files_list}
+
+    @staticmethod
+    def state(file_path: str) -> Union[tuple, None]:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def wait(self, timeout: float = None) -> set[str]:
+        """Returns the files that changed, waiting up to timeout seconds (forever if None) for one to change."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = set()
+            for file_path, state in self.states.items():
+                new_state = self.state(file_path)
+                if new_state != state:
+                    self.states[file_path] = new_state
+                    changed.add(file_path)
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return changed
+            time.sleep(self.interval)
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Detects files changes with inotify. The directories of the files are watched, so that files replaced by
+    editors (written to a temporary file, then moved) are detected too.
+
+    :param list[str] files_list: The files to watch
+    :raises: OSError if inotify is not available
+    """
+
+    def __init__(self, files_list: list[str]):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.files = {path.abspath(file_path): file_path for file_path in files_list}
+        self.directories: dict = {}
+        for directory in {path.dirname(file_path) for file_path in self.files}:
+            descriptor = libc.inotify_add_watch(
+                self.fd, os.fsencode(directory), INOTIFY_MASK
+            )
+            if descriptor < 0:
+                self.close()
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed", directory)
+            self.directories[descriptor] = directory
+
+    def wait(self, timeout: float = None) -> set[str]:
+        """Returns the files that changed, waiting up to timeout seconds (forever if None) for one to change."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed: set = set()
+        while not changed:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                break
+            time.sleep(DEBOUNCE_DELAY)
+            changed |= self.read_events()
+        return changed
+
+    def read_events(self) -> set[str]:
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                descriptor, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                file_path = path.join(self.directories.get(descriptor, ""), name)
+                if file_path in self.files:
+                    changed.add(self.files[file_path])
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def get_files_watcher(
+    files_list: list[str], polling: bool = False
+) -> Union[InotifyWatcher, PollingWatcher]:
+    """Returns an inotify watcher for the files when possible, a polling one otherwise"""
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(files_list)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(files_list)
+
+
+class IncrementalRenderer:
+    """
+    Renders the compose files, keeping everything needed to render them again cheaply when some change.
+    Renders the same definition as ComposeDefinition does.
+
+    :param list[str] files_list: The compose files, in order
+    :param bool no_interpolate: Whether to leave the environment variables as-is.
+    :param bool keep_if_undefined: Whether to leave undefined environment variables as-is.
+    :param validator: JSON schema validator to use. Defaults to the process-wide compose-spec validator.
+    :param str validator_engine: The validation engine to use when no validator is given.
+    :param environ: Environment variables to interpolate with. A frozen copy of os.environ if not set.
+    :param load_function: Function returning the content of a compose file. The content is not modified.
+    """
+
+    def __init__(
+        self,
+        files_list: list[str],
+        no_interpolate: bool = False,
+        keep_if_undefined: bool = False,
+        validator: Validator = None,
+        validator_engine: str = JSONSCHEMA_ENGINE,
+        environ: Mapping[str, str] = None,
+        load_function: Callable[[str], Union[dict, list]] = load_compose_file,
+    ):
+        if not files_list:
+            raise ValueError("No compose files to render")
+        self.files_list = list(files_list)
+        self.no_interpolate = no_interpolate
+        self.keep_if_undefined = keep_if_undefined
+        self.validator = validator
+        self.validator_engine = validator_engine
+        self.environ = environ_snapshot(environ)
+        self.load_function = load_function
+        self.contents: list = [None] * len(self.files_list)
+        self.merged: list = [None] * len(self.files_list)
+        self.merged_until = 0
+        self.definition: Union[dict, None] = None
+
+    def render(self, changed_files: set[str] = None) -> dict:
+        """
+        Renders the definition, parsing only the files that changed since the last render.
+
+        :param set[str] changed_files: The files that changed. All the files on the first render.
+        :return: The rendered definition
+        :raises: The loading, merging or validation errors. The last valid definition is kept.
+        """
+        positions = [
+            count
+            for count, file_path in enumerate(self.files_list)
+            if self.contents[count] is None
+            or (changed_files and file_path in changed_files)
+        ]
+        if not positions and self.merged_until == len(self.files_list):
+            return self.definition
+        contents = {
+            count: self.load_function(self.files_list[count]) for count in positions
+        }
+        for count, content in contents.items():
+            self.contents[count] = content
+        self.merged_until = min(positions + [self.merged_until])
+        while self.merged_until < len(self.files_list):
+            count = self.merged_until
+            if count == 0:
+                self.merged[count] = self.contents[count]
+            else:
+                self.merged[count] = merge_config_files_chain(
+                    [self.merged[count - 1], self.contents[count]], self.environ
+                )
+            self.merged_until += 1
+        definition = self.finalize(self.merged[-1])
+        validate_changes(
+            definition, self.definition, self.validator, self.validator_engine
+        )
+        self.definition = definition
+        return definition
+
+    def finalize(self, merged: dict) -> dict:
+        """
+        Normalizes the ports and interpolates the merged definition, without modifying it.
+        Only the services and the containers of interpolated values are copied.
+        """
+        definition = dict(merged)
+        if keyisset(SERVICES, definition):
+            definition[SERVICES] = {
+                name: dict(service) if isinstance(service, dict) else service
+                for name, service in definition[SERVICES].items()
+            }
+            render_services_ports(definition[SERVICES])
+        if self.no_interpolate:
+            return definition
+        variables_index = VariablesIndex(definition)
+        values = variables_index.render(
+            variables_index.templates,
+            None if self.keep_if_undefined else "",
+            self.environ,
+        )
+        if not values:
+            return definition
+        return replace_paths(definition, list(values.items()))
+
+
+def watch(
+    renderer: IncrementalRenderer,
+    write_output: Callable[[dict], None],
+    watcher: Union[InotifyWatcher, PollingWatcher] = None,
+    renders: int = None,
+) -> None:
+    """
+    Renders the files, then renders them again and writes the output every time one changes.
+    Errors are printed to stderr, and the last valid output is left as-is until the files are fixed.
+
+    :param IncrementalRenderer renderer: The renderer of the files.
+    :param write_output: Function writing the rendered definition
+    :param watcher: The files watcher. Defaults to get_files_watcher()
+    :param int renders: Number of renders after which to stop. Watches until interrupted if None.
+    """
+    if watcher is None:
+        watcher = get_files_watcher(renderer.files_list)
+    changed_files: set = set()
+    count = 0
+    try:
+        while renders is None or count < renders:
+            count += 1
+            start = time.perf_counter()
+            try:
+                write_output(renderer.render(changed_files))
+                print(
+                    f"Rendered in {time.perf_counter() - start:.3f}s",
+                    file=sys.stderr,
+                )
+            except Exception as error:
+                print(f"{error.__class__.__name__}: {error}", file=sys.stderr)
+            if renders is not None and count >= renders:
+                break
+            changed_files = watcher.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -0,0 +1,111 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to write rendered definitions as YAML, with the libyaml emitter when it gives the same output as
+``yaml.safe_dump``.
+
+Both emitters agree on everything but the folding of double-quoted strings and when to use complex keys.
+Values where every string is printable ASCII, and every key short and not empty, are emitted with libyaml,
+the others with the pure python emitter, so the output is the same byte for byte either way.
+
+The document is emitted in chunks: each top-level key, and each entry of the top-level mappings, such as each
+service. So a non-ASCII string only sends the chunk holding it to the pure python emitter, not the whole document.
+"""
+
+from __future__ import annotations
+
+from io import StringIO
+from typing import IO, Union
+
+import yaml
+
+try:
+    from yaml import CSafeDumper
+except ImportError:
+    CSafeDumper = None
+
+MAX_C_KEY_LENGTH = 60
+
+
+def c_emittable(data) -> bool:
+    """Whether the libyaml emitter outputs the data the same way as the pure python one does."""
+    if isinstance(data, str):
+        return data.isascii() and data.isprintable()
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if isinstance(key, str) and (
+                not key
+                or len(key) >= MAX_C_KEY_LENGTH
+                or not (key.isascii() and key.isprintable())
+            ):
+                return False
+            if not c_emittable(value):
+                return False
+        return True
+    if isinstance(data, list):
+        for item in data:
+            if not c_emittable(item):
+                return False
+    return True
+
+
+def dump_chunk(data, stream: IO[str] = None) -> Union[str, None]:
+    """Same as ``yaml.safe_dump``, with libyaml if it outputs the data the same way."""
+    if CSafeDumper is not None and c_emittable(data):
+        return yaml.dump(data, stream, Dumper=CSafeDumper)
+    return yaml.dump(data, stream, Dumper=yaml.SafeDumper)
+
+
+def sorted_items(data) -> Union[list, None]:
+    """The items of a non-empty mapping, in the order safe_dump emits them. None if the data is not one."""
+    if not isinstance(data, dict) or not data:
+        return None
+    try:
+        return sorted(data.items())
+    except TypeError:
+        return None
+
+
+def dump_section(key, value) -> str:
+    """
+    Returns the YAML of the ``{key: value}`` mapping. The entries of a mapping value are emitted one by one, and
+    joined under the key line, which is the same for all of them.
+    """
+    items = sorted_items(value)
+    if not items or not (
+        isinstance(key, str)
+        and key
+        and c_emittable(key)
+        and len(key) < MAX_C_KEY_LENGTH
+    ):
+        return dump_chunk({key: value})
+    key_line = None
+    entries = []
+    for entry_key, entry_value in items:
+        entry_line, _, entry = dump_chunk({key: {entry_key: entry_value}}).partition(
+            "\n"
+        )
+        if key_line is None:
+            key_line = entry_line
+        if entry_line != key_line or not entry_line.endswith(":"):
+            return dump_chunk({key: value})
+        entries.append(entry)
+    return f"{key_line}\n" + "".join(entries)
+
+
+def dump_yaml(data, stream: IO[str] = None) -> Union[str, None]:
+    """
+    Same as ``yaml.safe_dump``: writes the YAML document into the stream as it is emitted, section by section,
+    or returns it if there is no stream.
+
+    :param data: The document to dump
+    :param stream: The file object to write to.
+    """
+    items = sorted_items(data) if CSafeDumper is not None else None
+    if not items:
+        return dump_chunk(data, stream)
+    output = stream if stream is not None else StringIO()
+    for key, value in items:
+        output.write(dump_section(key, value))
+    return output.getvalue() if stream is None else None
@@ -0,0 +1,181 @@
+#  SPDX-License-Identifier: MPL-2.0
+#  Copyright 2020-2022 John Mille <john@compose-x.io>
+
+"""
+Module to load compose files YAML content directly into JSON compatible python objects.
+
+Gives the same result as serializing the YAML content to JSON and loading it back, without doing so:
+
+* mapping keys are converted to strings the way ``json.dumps`` does
+* timestamps, which JSON cannot represent, are kept as the string they are written as
+* ordered maps and pairs are lists of lists
+* anchors/aliases are not shared between the places they are used in
+"""
+
+from __future__ import annotations
+
+from yaml.constructor import ConstructorError
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+JSON_KEYS = {True: "true", False: "false", None: "null"}
+STR_TAG = "tag:yaml.org,2002:str"
+MAP_TAG = "tag:yaml.org,2002:map"
+SEQ_TAG = "tag:yaml.org,2002:seq"
+MERGE_TAG = "tag:yaml.org,2002:merge"
+SCALAR_TAGS = [
+    "tag:yaml.org,2002:null",
+    "tag:yaml.org,2002:bool",
+    "tag:yaml.org,2002:int",
+    "tag:yaml.org,2002:float",
+]
+
+
+def json_key(key) -> str:
+    """
+    Converts a mapping key to string, the same way ``json.dumps`` does.
+
+    :raises: TypeError if the key cannot be a JSON key
+    """
+    if isinstance(key, str):
+        return key
+    if key is None or isinstance(key, bool):
+        return JSON_KEYS[key]
+    if isinstance(key, int):
+        return int.__repr__(key)
+    if isinstance(key, float):
+        if key != key:
+            return "NaN"
+        if key in (float("inf"), float("-inf")):
+            return "Infinity" if key > 0 else "-Infinity"
+        return float.__repr__(key)
+    raise TypeError(
+        f"keys must be str, int, float, bool or None, not {key.__class__.__name__}"
+    )
+
+
+def to_json_tree(data, ancestors: set = None):
+    """
+    Rebuilds the containers of the tree as JSON types: new dicts with string keys and lists, so that no
+    container is used twice.
+
+    :raises: ValueError if the tree contains a circular reference
+    """
+    if not isinstance(data, (dict, list, tuple)):
+        return data
+    if ancestors is None:
+        ancestors = set()
+    if id(data) in ancestors:
+        raise ValueError("Circular reference detected")
+    ancestors.add(id(data))
+    if isinstance(data, dict):
+        new_data = {
+            json_key(key): to_json_tree(value, ancestors) for key, value in data.items()
+        }
+    else:
+        new_data = [to_json_tree(item, ancestors) for item in data]
+    ancestors.remove(id(data))
+    return new_data
+
+
+class ComposeLoader(SafeLoader):
+    """
+    libyaml based safe loader (pure python when libyaml is not available) that emits JSON compatible types.
+
+    Documents are built directly from the YAML nodes, which is faster than the generic construction
+    and creates new objects for every alias.
+    """
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.resolved_scalars: dict = {}
+
+    def resolve(self, kind, value, implicit):
+        if kind is not ScalarNode:
+            return super().resolve(kind, value, implicit)
+        try:
+            return self.resolved_scalars[(value, implicit)]
+        except KeyError:
+            tag = super().resolve(kind, value, implicit)
+            self.resolved_scalars[(value, implicit)] = tag
+            return tag
+
+    def construct_document(self, node):
+        return self.build(node, set())
+
+    def build(self, node, ancestors: set):
+        """Recursively builds the python object for the node."""
+        tag = node.tag
+        if tag == STR_TAG and type(node) is ScalarNode:
+            return node.value
+        if id(node) in ancestors:
+            raise ValueError("Circular reference detected")
+        if tag == MAP_TAG:
+            ancestors.add(id(node))
+            mapping = self.build_mapping(node, ancestors)
+            ancestors.remove(id(node))
+            return mapping
+        if tag == SEQ_TAG and type(node) is SequenceNode:
+            ancestors.add(id(node))
+            sequence = [self.build(item, ancestors) for item in node.value]
+            ancestors.remove(id(node))
+            return sequence
+        if tag in SCALAR_TAGS and type(node) is ScalarNode:
+            return self.yaml_constructors[tag](self, node)
+        return to_json_tree(super().construct_document(node))
+
+    def build_mapping(self, node, ancestors: set) -> dict:
+        if not isinstance(node, MappingNode):
+            raise ConstructorError(
+                None,
+                None,
+                f"expected a mapping node, but found {node.id}",
+                node.start_mark,
+            )
+        if any(key_node.tag == MERGE_TAG for key_node, _ in node.value):
+            self.flatten_mapping(node)
+        mapping = {}
+        str_keys = True
+        for key_node, value_node in node.value:
+            key = self.build(key_node, ancestors)
+            if not isinstance(key, str):
+                str_keys = False
+                try:
+                    hash(key)
+                except TypeError as error:
+                    raise ConstructorError(
+                        "while constructing a mapping",
+                        node.start_mark,
+                        f"found unhashable key ({error})",
+                        key_node.start_mark,
+                    )
+            mapping[key] = self.build(value_node, ancestors)
+        if str_keys:
+            return mapping
+        return {json_key(key): value for key, value in mapping.items()}
+
+    def construct_json_timestamp(self, node) -> str:
+        return self.construct_scalar(node)
+
+    def construct_unsupported(self, node):
+        raise ConstructorError(
+            None,
+            None,
+            f"{node.tag} values are not supported in compose files",
+            node.start_mark,
+        )
+
+
+ComposeLoader.add_constructor(
+    "tag:yaml.org,2002:timestamp", ComposeLoader.construct_json_timestamp
+)
+ComposeLoader.add_constructor(
+    "tag:yaml.org,2002:set", ComposeLoader.construct_unsupported
+)
+ComposeLoader.add_constructor(
+    "tag:yaml.org,2002:binary", ComposeLoader.construct_unsupported
+)
@@ -2,17 +2,63 @@
 
 """Tests for `compose_x_render` package."""
 
+import io
+import json
 import os
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from os import path
 from tempfile import TemporaryDirectory
 from unittest import mock
 
 import pytest
+import yaml
 from jsonschema.exceptions import ValidationError
 
-from compose_x_render.compose_x_render import ComposeDefinition
-from compose_x_render.envsubst import expandvars
+from compose_x_render.batch import load_manifest, render_batch
+from compose_x_render.cache import RenderCache, read_sources, referenced_variables
+from compose_x_render.cli import batch, main
+from compose_x_render.client import send_request
+from compose_x_render.compose_x_render import (
+    ComposeDefinition,
+    load_compose_file,
+    load_compose_files,
+    merge_config_files,
+    merge_config_files_chain,
+    merge_ports,
+    merge_service_definition,
+)
+from compose_x_render.envsubst import compile_template, expandvars
+from compose_x_render.instrumentation import STAGES, RenderProfile
+from compose_x_render.list_management import (
+    fingerprint,
+    handle_lists_merges,
+    set_from_dict,
+)
 from compose_x_render.networking import PORTS_STR_RE, set_service_ports
+from compose_x_render.output import OUTPUT_FORMATS
+from compose_x_render.schema_compiler import FastValidator, schema_hash
+from compose_x_render.selection import parse_selectors, select_paths
+from compose_x_render.server import RenderServer
+from compose_x_render.validation import (
+    build_validator,
+    get_compose_spec,
+    get_validator,
+    set_validator,
+    validate_definition,
+)
+from compose_x_render.watch import (
+    IncrementalRenderer,
+    InotifyWatcher,
+    PollingWatcher,
+    watch,
+)
+from compose_x_render.yaml_dumper import c_emittable, dump_yaml
+from compose_x_render.yaml_loader import ComposeLoader
 
 HERE = path.abspath(path.dirname(__file__))
 
@@ -30,11 +76,50 @@ def test_envsubst_inexistant(mock_settings_env_vars):
     assert expandvars("${TESTING_EXISTS:+override}") == "override"
 
 
+def test_envsubst_templates(mock_settings_env_vars):
+    assert expandvars("no variables") == "no variables"
+    assert expandvars("\\$TESTING_EXISTS") == "\\$TESTING_EXISTS"
+    assert expandvars("\\$TESTING_EXISTS", skip_escaped=False) == "\\ROUGE"
+    assert expandvars("${!TESTING_EXISTS}") == "${TESTING_EXISTS}"
+    assert expandvars("${AWS::Region}-$TESTING_EXISTS") == "${AWS::Region}-ROUGE"
+    assert expandvars("${TOTO:-$TESTING_EXISTS}/${TOTO}", default="") == "ROUGE/"
+    assert expandvars("${TOTO}", default=None) == "${TOTO}"
+    assert expandvars("a-${TOTO:-b-$TESTING_EXISTS}") == "a-b-ROUGE"
+    assert compile_template("a${TOTO}b") is compile_template("a${TOTO}b")
+    assert expandvars("$TESTING_EXISTS", environ={"TESTING_EXISTS": "VERT"}) == "VERT"
+
+
+def test_environ_snapshot():
+    test = ComposeDefinition([f"{HERE}/valid_input.yaml"])
+    with pytest.raises(TypeError):
+        test.environ["TESTING_EXISTS"] = "VERT"
+    assert test.environ["TESTING_EXISTS"] == "ROUGE"
+
+
+def test_concurrent_renders_environ():
+    def render(count: int) -> str:
+        environ = {"LOG_LEVEL": f"level-{count}"}
+        test = ComposeDefinition([f"{HERE}/valid_input.yaml"], environ=environ)
+        return test.definition["services"]["app01"]["environment"]["LOGLEVEL"]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(render, range(32)))
+    assert results == [f"level-{count}" for count in range(32)]
+
+
 def test_valid_input():
     test = ComposeDefinition([f"{HERE}/valid_input.yaml"])
     temp_dir = TemporaryDirectory()
     test.write_output(output_file=f"{temp_dir.name}/test.yaml")
     test.output_services_images(f"{temp_dir.name}/test.json")
+    with open(f"{temp_dir.name}/test.json") as images_fd:
+        assert images_fd.read() == json.dumps(
+            {
+                name: service["image"]
+                for name, service in test.definition["services"].items()
+                if "image" in service
+            }
+        )
 
 
 def test_valid_extension_input():
@@ -101,3 +186,1067 @@ def test_service_ports_names():
     assert "tcp_443" in port_names
     assert "udp_69" in port_names
     assert "alt_https" in port_names
+
+
+def test_service_ports_published_per_protocol():
+    service_ports = set_service_ports(["53:53/udp", "53:53", "53:5353", 80, "80"])
+    assert service_ports == [
+        {"protocol": "udp", "target": 53, "published": 53, "name": "udp_53"},
+        {"protocol": "tcp", "target": 5353, "published": 53, "name": "tcp_53"},
+        {"protocol": "tcp", "target": 80},
+    ]
+
+
+def test_merge_ports():
+    source = ["8080:80", "9090:90", "100"]
+    assert merge_ports(source, []) == []
+    merged = merge_ports(source, ["8080:81", "7070:70"])
+    assert [(port.get("published"), port["target"]) for port in merged] == [
+        (8080, 81),
+        (9090, 90),
+        (None, 100),
+        (7070, 70),
+    ]
+    ports = [f"{10000 + count}:{count % 100}/udp" for count in range(10000)]
+    assert len(set_service_ports(ports + ports)) == 10000
+
+
+def test_merge_ports_override_published():
+    temp_dir = TemporaryDirectory()
+    contents = [
+        {"services": {"a": {"image": "nginx", "ports": ["443:81"]}}},
+        {"services": {"a": {"ports": [80, "443:443"]}}},
+    ]
+    files = []
+    for count, content in enumerate(contents):
+        files.append(f"{temp_dir.name}/compose-{count}.yaml")
+        with open(files[-1], "w") as compose_fd:
+            yaml.dump(content, compose_fd)
+    ports = ComposeDefinition(files).definition["services"]["a"]["ports"]
+    assert {port.get("published"): port["target"] for port in ports} == {
+        443: 443,
+        None: 80,
+    }
+    merged = merge_ports(["443:81"], [80, "443:443"])
+    assert [(port.get("published"), port["target"]) for port in merged] == [
+        (443, 443),
+        (None, 80),
+    ]
+
+
+def test_validator_is_cached():
+    validator = get_validator()
+    ComposeDefinition([f"{HERE}/valid_input.yaml"])
+    assert get_validator() is validator
+
+
+def test_set_validator():
+    custom = build_validator({"type": "object", "required": ["services"]})
+    previous = set_validator(custom)
+    try:
+        with pytest.raises(ValidationError):
+            ComposeDefinition([], content={"x-only": {"a": "b"}})
+    finally:
+        set_validator(previous)
+    ComposeDefinition([], content={"x-only": {"a": "b"}})
+
+
+def test_validator_argument():
+    custom = build_validator({"type": "object", "required": ["networks"]})
+    with pytest.raises(ValidationError):
+        ComposeDefinition([f"{HERE}/valid_input.yaml"], validator=custom)
+
+
+@pytest.mark.parametrize(
+    "file_name",
+    [
+        "valid_input.yaml",
+        "extension_input.yaml",
+        "invalid_input.yaml",
+        "invalid_extension.yaml",
+        "invalid_port_format.yaml",
+    ],
+)
+def test_validation_engines_conformance(file_name):
+    definition = load_compose_file(f"{HERE}/{file_name}")
+    jsonschema_validator = get_validator("jsonschema")
+    fast_validator = get_validator("fast")
+    assert fast_validator.is_valid(definition) == jsonschema_validator.is_valid(
+        definition
+    )
+    for service in definition["services"].values():
+        service.setdefault("deploy", {})["replicas"] = "not-an-int"
+        service.setdefault("ports", []).append({"target": True})
+    errors = []
+    for validator in [jsonschema_validator, fast_validator]:
+        with pytest.raises(ValidationError) as error:
+            validate_definition(definition, validator)
+        errors.append(error.value)
+    assert errors[0].absolute_path == errors[1].absolute_path
+    assert errors[0].message == errors[1].message
+
+
+def test_fast_validator_engine():
+    ComposeDefinition(
+        [f"{HERE}/valid_input.yaml", f"{HERE}/extension_input.yaml"],
+        validator_engine="fast",
+    )
+    with pytest.raises(ValidationError):
+        ComposeDefinition([f"{HERE}/invalid_input.yaml"], validator_engine="fast")
+    with pytest.raises(ValueError):
+        build_validator(engine="nope")
+
+
+def test_fast_validator_disk_cache():
+    temp_dir = TemporaryDirectory()
+    schema = get_compose_spec()
+    FastValidator(get_validator(), cache_dir=temp_dir.name)
+    cached = os.listdir(temp_dir.name)
+    assert cached == [f"validator_{schema_hash(schema)[:32]}.py"]
+    FastValidator(get_validator(), cache_dir=temp_dir.name)
+    assert os.listdir(temp_dir.name) == cached
+    with open(f"{temp_dir.name}/{cached[0]}") as code_fd:
+        code = code_fd.read()
+    for tampered in ["validate = None", code + "validate = None\n", code[:-100]]:
+        with open(f"{temp_dir.name}/{cached[0]}", "w") as code_fd:
+            code_fd.write(tampered)
+        assert FastValidator(get_validator(), cache_dir=temp_dir.name).is_valid({})
+        with open(f"{temp_dir.name}/{cached[0]}") as code_fd:
+            assert code_fd.read() == code
+    with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": f"{temp_dir.name}/home"}):
+        FastValidator(get_validator())
+    assert os.listdir(f"{temp_dir.name}/home/compose-x-render/validators") == cached
+
+
+def test_fast_validator_unsupported_schema():
+    schema = {
+        "type": "object",
+        "properties": {"name": {"type": "string", "minLength": 3}},
+    }
+    validator = build_validator(schema, engine="fast")
+    assert not validator.compiled
+    assert validator.is_valid({"name": "abc"})
+    assert not validator.is_valid({"name": "ab"})
+    with pytest.raises(ValidationError):
+        validate_definition({"name": "ab"}, validator)
+    assert build_validator(engine="fast").compiled
+
+
+YAML_NORMALIZATION = """
+x-common: &common
+  environment: {A: 1}
+  labels: [a, b]
+a: *common
+b:
+  <<: *common
+  1: one
+  1.5: f
+  null: n
+  .inf: inf
+  0x1F: hex
+c: !!omap [{k: 1}, {2: v}, {3: {4: 5}}]
+d: [1.0, 2e3, -0.0, .inf, ~, yes, 'no', 0o17, !!str 12, !!int "3"]
+"""
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        open(f"{HERE}/valid_input.yaml").read(),
+        open(f"{HERE}/extension_input.yaml").read(),
+        YAML_NORMALIZATION,
+    ],
+)
+def test_compose_loader_json_compatible(content):
+    expected = json.loads(json.dumps(yaml.load(content, Loader=yaml.CLoader)))
+    loaded = yaml.load(content, Loader=ComposeLoader)
+    assert json.dumps(loaded) == json.dumps(expected)
+
+
+def test_compose_loader_aliases():
+    loaded = yaml.load(YAML_NORMALIZATION, Loader=ComposeLoader)
+    assert loaded["a"] == loaded["x-common"]
+    assert loaded["a"] is not loaded["x-common"]
+    assert loaded["b"]["environment"] is not loaded["x-common"]["environment"]
+    with pytest.raises(ValueError):
+        yaml.load("a: &x {b: *x}", Loader=ComposeLoader)
+    assert yaml.load("d: 2021-03-26", Loader=ComposeLoader) == {"d": "2021-03-26"}
+
+
+def test_merge_copy_on_write():
+    original = {
+        "services": {"app01": {"image": "nginx", "ports": [{"target": 80}]}},
+        "x-sns": {"topic": {"Properties": {"Name": "a"}}, "other": {"Lookup": {}}},
+    }
+    override = {
+        "services": {"app01": {"ports": [{"target": 443}]}},
+        "x-sns": {"topic": {"Properties": {"DisplayName": "b"}}},
+    }
+    untouched = original["x-sns"]["other"]
+    original_ports = original["services"]["app01"]["ports"]
+    merged = {key: dict(value) for key, value in original.items()}
+    merge_config_files(merged, override)
+    assert merged["x-sns"]["topic"]["Properties"] == {"Name": "a", "DisplayName": "b"}
+    assert original["x-sns"]["topic"]["Properties"] == {"Name": "a"}
+    assert merged["x-sns"]["other"] is untouched
+    assert original_ports == [{"target": 80}]
+    service = merge_service_definition(
+        original["services"]["app01"], override["services"]["app01"]
+    )
+    assert [port["target"] for port in service["ports"]] == [80, 443]
+    assert original["services"]["app01"]["ports"] is original_ports
+
+
+def test_merge_chain_same_as_pairwise():
+    files = [
+        f"{HERE}/valid_input.yaml",
+        f"{HERE}/extension_input.yaml",
+        f"{HERE}/valid_input.yaml",
+    ]
+    overrides = [
+        {
+            "services": {
+                "app01": {"ports": ["8080:80", 443], "image": "$TESTING_EXISTS"}
+            }
+        },
+        {"services": {"app04": {}}, "x-sqs": {"queue": {"Properties": {}}}},
+        {"services": {"app04": {"image": "nginx"}}, "x-sqs": {"queue": {"Lookup": {}}}},
+    ]
+    contents = [load_compose_file(file) for file in files] + overrides
+    merged = load_compose_file(files[0])
+    for content in [load_compose_file(file) for file in files[1:]] + overrides:
+        merge_config_files(merged, content)
+    assert merge_config_files_chain(contents) == merged
+    assert merged["services"]["app01"]["image"] == "ROUGE"
+
+
+@pytest.mark.parametrize(
+    "override", [{"x-a": ["v"]}, {"x-a": {"volumes": ["v", "v"]}}, {"x-a": None}]
+)
+def test_merge_chain_empty_mapping(override):
+    merged = {"x-a": {}}
+    merge_config_files(merged, deepcopy(override))
+    assert merge_config_files_chain([{"x-a": {}}, override]) == merged
+    projected = merge_config_files_chain([{"x-a": {}}, override], projected=True)
+    if isinstance(override["x-a"], dict):
+        assert projected == {"x-a": {"volumes": ["v"]}}
+    else:
+        assert projected == merged
+
+
+def test_load_compose_files_concurrently():
+    files = [
+        f"{HERE}/valid_input.yaml",
+        f"{HERE}/extension_input.yaml",
+        f"{HERE}/invalid_input.yaml",
+    ]
+    expected = [load_compose_file(file) for file in files]
+    assert load_compose_files(files, jobs=2) == expected
+    assert load_compose_files(files, jobs=2, process_threshold=1200) == expected
+    test = ComposeDefinition(files[:2], jobs=4)
+    assert test.definition == ComposeDefinition(files[:2]).definition
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_batch_render(jobs):
+    temp_dir = TemporaryDirectory()
+    manifest = {
+        "projects": [
+            {
+                "name": "valid",
+                "files": [f"{HERE}/valid_input.yaml"],
+                "output": "rendered/valid.yaml",
+                "env": {"LOG_LEVEL": "warning", "EXPIRY": 1.25},
+            },
+            {
+                "name": "invalid",
+                "files": [f"{HERE}/invalid_input.yaml"],
+                "output": "rendered/invalid.yaml",
+            },
+            {
+                "name": "compose-x",
+                "files": [f"{HERE}/valid_input.yaml", f"{HERE}/extension_input.yaml"],
+                "output": "rendered/compose-x.yaml",
+                "compose_x": True,
+            },
+        ]
+    }
+    manifest_path = f"{temp_dir.name}/manifest.yaml"
+    with open(manifest_path, "w") as manifest_fd:
+        manifest_fd.write(yaml.safe_dump(manifest))
+    summary = render_batch(load_manifest(manifest_path), jobs=jobs)
+    assert summary["total"] == 3
+    assert summary["failures"] == 1
+    statuses = {result["name"]: result["status"] for result in summary["projects"]}
+    assert statuses == {
+        "valid": "success",
+        "invalid": "failure",
+        "compose-x": "success",
+    }
+    rendered = load_compose_file(f"{temp_dir.name}/rendered/valid.yaml")
+    assert rendered["services"]["app01"]["environment"]["LOGLEVEL"] == "warning"
+    assert rendered["services"]["app01"]["x-logging"]["RetentionInDays"] == "1.25"
+    assert "Fn::Transform" in load_compose_file(
+        f"{temp_dir.name}/rendered/compose-x.yaml"
+    )
+    assert not path.exists(f"{temp_dir.name}/rendered/invalid.yaml")
+    summary_path = f"{temp_dir.name}/summary.json"
+    assert batch([manifest_path, "--summary", summary_path]) == 1
+    with open(summary_path) as summary_fd:
+        assert json.load(summary_fd)["failures"] == 1
+
+
+def test_render_cache():
+    temp_dir = TemporaryDirectory()
+    cache = RenderCache(f"{temp_dir.name}/cache")
+    files = [f"{HERE}/valid_input.yaml", f"{HERE}/extension_input.yaml"]
+    first = ComposeDefinition(files, cache=cache)
+    first.write_output(f"{temp_dir.name}/first.yaml", for_compose_x=True)
+    first.output_services_images(f"{temp_dir.name}/first.json")
+    assert first._definition is not None
+
+    with mock.patch.object(
+        ComposeDefinition, "render", side_effect=AssertionError("Rendered")
+    ):
+        second = ComposeDefinition(files, cache=cache)
+        second.write_output(f"{temp_dir.name}/second.yaml", for_compose_x=True)
+        second.output_services_images(f"{temp_dir.name}/second.json")
+    for extension in ["yaml", "json"]:
+        with open(f"{temp_dir.name}/first.{extension}") as first_fd, open(
+            f"{temp_dir.name}/second.{extension}"
+        ) as second_fd:
+            assert first_fd.read() == second_fd.read()
+
+    third = ComposeDefinition(files, cache=cache, environ={"LOG_LEVEL": "info"})
+    third.write_output(f"{temp_dir.name}/third.yaml", for_compose_x=True)
+    assert third._definition is not None
+    assert len(os.listdir(cache.cache_dir)) == 3
+
+    custom = build_validator({"type": "object", "required": ["networks"]})
+    fourth = ComposeDefinition(files, cache=cache, validator=custom)
+    with pytest.raises(ValidationError):
+        fourth.write_output(f"{temp_dir.name}/fourth.yaml", for_compose_x=True)
+
+
+def test_render_cache_sources(capsys):
+    temp_dir = TemporaryDirectory()
+    cache = RenderCache(f"{temp_dir.name}/cache")
+    file_path = f"{temp_dir.name}/compose.yaml"
+    with open(file_path, "w") as file_fd:
+        yaml.safe_dump(
+            {"services": {"app": {"image": "nginx"}, "builder": {"build": "."}}},
+            file_fd,
+        )
+
+    def read_then_edit(files_list):
+        sources = read_sources(files_list)
+        with open(file_path, "a") as file_fd:
+            file_fd.write("x-edited: {}\n")
+        return sources
+
+    with mock.patch(
+        "compose_x_render.compose_x_render.read_sources", side_effect=read_then_edit
+    ):
+        ComposeDefinition([file_path], cache=cache).write_output(
+            f"{temp_dir.name}/first.yaml"
+        )
+    edited = ComposeDefinition([file_path], cache=cache)
+    edited.write_output(f"{temp_dir.name}/edited.yaml")
+    assert "x-edited" not in open(f"{temp_dir.name}/first.yaml").read()
+    assert "x-edited" in open(f"{temp_dir.name}/edited.yaml").read()
+
+    capsys.readouterr()
+    for _ in range(2):
+        ComposeDefinition([file_path], cache=cache).output_services_images()
+        assert capsys.readouterr().out == (
+            "Service builder has no image defined. Skipping\n"
+            + json.dumps({"app": "nginx"}, indent=2)
+            + "\n"
+        )
+
+
+def test_render_cache_eviction():
+    temp_dir = TemporaryDirectory()
+    cache = RenderCache(temp_dir.name, max_size=10)
+    cache.put("first", "0123456789")
+    assert cache.get("first") == "0123456789"
+    cache.put("second", "0123456789")
+    assert cache.get("first") is None
+    assert cache.get("second") == "0123456789"
+
+
+def test_referenced_variables():
+    assert referenced_variables("a: ${A:-$B}/${C:+c} \\$D $$E ${AWS::Region}") == {
+        "A",
+        "B",
+        "C",
+        "D",
+        "E",
+        "AWS",
+    }
+
+
+def test_benchmarks_suite():
+    from benchmarks.generators import ProjectShape, project_environ, write_project
+    from benchmarks.suite import STAGES, compare, run_suite
+
+    shape = ProjectShape(services=5, ports=4, depth=2, extensions=3, interpolation=0.5)
+    temp_dir = TemporaryDirectory()
+    compose_file = ComposeDefinition(
+        write_project(shape, temp_dir.name), environ=project_environ(shape)
+    )
+    assert len(compose_file.definition["services"]) == 5
+    assert "${" not in json.dumps(compose_file.definition)
+
+    results = run_suite([shape], repeat=1)
+    assert [result["stage"] for result in results["results"]] == STAGES
+    results = json.loads(json.dumps(results))
+    comparisons = compare(results, results)
+    assert len(comparisons) == len(STAGES)
+    assert all(comparison["ratio"] == 1 for comparison in comparisons)
+
+
+def test_render_profile():
+    records = []
+    profile = RenderProfile(callback=records.append, track_memory=True)
+    files = [f"{HERE}/valid_input.yaml", f"{HERE}/extension_input.yaml"]
+    compose_file = ComposeDefinition(files, profile=profile)
+    temp_dir = TemporaryDirectory()
+    compose_file.write_output(f"{temp_dir.name}/output.yaml")
+    assert [stage["stage"] for stage in profile.stages] == STAGES
+    assert all(stage["peak_memory"] > 0 for stage in profile.stages)
+    assert [loaded["file"] for loaded in profile.files] == files
+    assert len(records) == len(STAGES) + len(files)
+    assert json.loads(json.dumps(profile.as_dict()))["total"] > 0
+    assert "validation" in profile.report()
+
+
+def test_lists_merges():
+    original = ["b:/b", {"source": "s", "options": ["ro"]}, "a:/a", 1, True]
+    override = ["a:/a", {"options": ["ro"], "source": "s"}, "c:/c", 1.0, 1, "1"]
+    assert handle_lists_merges(original, override, uniqfy=True) == [
+        "b:/b",
+        {"source": "s", "options": ["ro"]},
+        "a:/a",
+        1,
+        True,
+        "c:/c",
+        1.0,
+        "1",
+    ]
+    assert len(handle_lists_merges(original, override)) == 9
+    assert fingerprint({"a": [{"b": 1, "c": 2}]}) == fingerprint(
+        {"a": [{"c": 2, "b": 1}]}
+    )
+    assert fingerprint({"a": [1, 2]}) != fingerprint({"a": [2, 1]})
+    assert handle_lists_merges([1, None, 2], [2, None, 3]) == [1, None, 2, 3]
+    assert handle_lists_merges([["a"]], [["b"], ["a"]]) == [["a"], ["b"], ["a"]]
+    assert handle_lists_merges([["a"]], [["b"], ["a"]], uniqfy=True) == [["a"], ["b"]]
+    with pytest.warns(DeprecationWarning):
+        assert set_from_dict({"a": {"b": 1}}) == frozenset(
+            {("a", frozenset({("b", 1)}))}
+        )
+
+
+def test_lists_merges_hash_seed():
+    code = (
+        "from compose_x_render.list_management import handle_lists_merges;"
+        "print(handle_lists_merges([f'v{i}:/v' for i in range(50)], ['z:/z', 'v3:/v']))"
+    )
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", code],
+            env=dict(os.environ, PYTHONHASHSEED=seed),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        for seed in ["1", "2", "3"]
+    }
+    assert len(outputs) == 1
+
+
+@pytest.mark.parametrize(
+    "data, emittable",
+    [
+        ({"services": {"app": {"command": ["echo", "a: b"], "init": True}}}, True),
+        ({"command": "multi\nline", "labels": {"desc": "\u00e9t\u00e9 " * 30}}, False),
+        ({"": "empty key", "k" * 100: "long key"}, False),
+    ],
+)
+def test_dump_yaml(data, emittable):
+    assert c_emittable(data) is emittable
+    assert dump_yaml(data) == yaml.safe_dump(data)
+    stream = io.StringIO()
+    assert dump_yaml(data, stream) is None
+    assert stream.getvalue() == yaml.safe_dump(data)
+
+
+def test_write_output_stdout(capsys):
+    compose_file = ComposeDefinition([f"{HERE}/valid_input.yaml"])
+    compose_file.write_output()
+    assert capsys.readouterr().out == yaml.safe_dump(compose_file.definition) + "\n"
+
+
+@pytest.mark.parametrize("output_format", OUTPUT_FORMATS)
+@pytest.mark.parametrize("for_compose_x", [False, True])
+def test_write_output_formats(output_format, for_compose_x):
+    compose_file = ComposeDefinition(
+        [f"{HERE}/valid_input.yaml", f"{HERE}/extension_input.yaml"]
+    )
+    temp_dir = TemporaryDirectory()
+    output_file = f"{temp_dir.name}/output"
+    compose_file.write_output(output_file, for_compose_x, output_format)
+    with open(output_file) as output_fd:
+        content = output_fd.read()
+    if output_format == "yaml":
+        output = yaml.safe_load(content)
+    elif output_format == "ndjson":
+        lines = content.splitlines()
+        assert len(lines) == len(compose_file.definition) - 1 + len(
+            compose_file.definition["services"]
+        )
+        output = {}
+        for line in lines:
+            fragment = json.loads(line)
+            if for_compose_x:
+                output.setdefault(
+                    "Fn::Transform", {"Name": "compose-x", "Parameters": {"Raw": {}}}
+                )
+                raw = output["Fn::Transform"]["Parameters"]["Raw"]
+                fragment = fragment["Fn::Transform"]["Parameters"]["Raw"]
+            else:
+                raw = output
+            for key, value in fragment.items():
+                if key == "services":
+                    raw.setdefault(key, {}).update(value)
+                else:
+                    raw[key] = value
+    else:
+        assert (len(content.splitlines()) == 1) is (output_format == "json-compact")
+        output = json.loads(content)
+    if for_compose_x:
+        assert output["Fn::Transform"]["Name"] == "compose-x"
+        output = output["Fn::Transform"]["Parameters"]["Raw"]
+    assert output == json.loads(json.dumps(compose_file.definition))
+
+
+def test_write_output_invalid_format():
+    compose_file = ComposeDefinition([f"{HERE}/valid_input.yaml"])
+    with pytest.raises(ValueError):
+        compose_file.write_output(output_format="toml")
+
+
+def test_reinterpolate():
+    files = [f"{HERE}/valid_input.yaml"]
+    compose_file = ComposeDefinition(
+        files, environ={"LOG_LEVEL": "info"}, index_variables=True
+    )
+    assert (
+        compose_file.definition
+        == ComposeDefinition(files, environ={"LOG_LEVEL": "info"}).definition
+    )
+    assert compose_file.variables_index.variables == {"LOG_LEVEL", "EXPIRY"}
+    with mock.patch(
+        "compose_x_render.compose_x_render.validate_definition"
+    ) as validate:
+        assert compose_file.reinterpolate({"LOG_LEVEL": "info", "OTHER": "a"}) is False
+        validate.assert_not_called()
+    previous = compose_file.definition
+    assert compose_file.reinterpolate({"LOG_LEVEL": "debug", "EXPIRY": "7"}) is True
+    assert (
+        compose_file.definition
+        == ComposeDefinition(
+            files, environ={"LOG_LEVEL": "debug", "EXPIRY": "7"}
+        ).definition
+    )
+    assert previous["services"]["app01"]["environment"]["LOGLEVEL"] == "info"
+    assert (
+        compose_file.template["services"]["app01"]["environment"]["LOGLEVEL"]
+        == "$LOG_LEVEL"
+    )
+    with pytest.raises(ValueError):
+        ComposeDefinition(files).reinterpolate({})
+
+
+def test_incremental_renderer():
+    temp_dir = TemporaryDirectory()
+    files = []
+    for name in ["valid_input.yaml", "extension_input.yaml"]:
+        shutil.copy(f"{HERE}/{name}", temp_dir.name)
+        files.append(f"{temp_dir.name}/{name}")
+    renderer = IncrementalRenderer(files)
+    assert renderer.render() == ComposeDefinition(files).definition
+    with open(files[1]) as file_fd:
+        content = file_fd.read()
+    with open(files[1], "w") as file_fd:
+        file_fd.write(content.replace("image: nginx", "image: nginx:latest"))
+    with mock.patch.object(renderer, "load_function", wraps=load_compose_file) as load:
+        definition = renderer.render({files[1]})
+        load.assert_called_once_with(files[1])
+    assert definition == ComposeDefinition(files).definition
+    assert definition["services"]["app01"]["image"] == "nginx:latest"
+    assert renderer.render(set()) is definition
+
+    with open(files[1], "w") as file_fd:
+        file_fd.write(content.replace("image: nginx", "image: 5"))
+    with pytest.raises(ValidationError) as error:
+        renderer.render({files[1]})
+    assert list(error.value.path) == ["services", "app01", "image"]
+    assert renderer.definition is definition
+
+    outputs = []
+    with open(files[1], "w") as file_fd:
+        file_fd.write(content)
+    watcher = mock.MagicMock()
+    watcher.wait.return_value = {files[1]}
+    watch(renderer, outputs.append, watcher, renders=2)
+    assert outputs[-1]["services"]["app01"]["image"] == "nginx"
+    watcher.close.assert_called_once()
+
+
+@pytest.mark.parametrize("watcher_class", [PollingWatcher, InotifyWatcher])
+def test_files_watchers(watcher_class):
+    temp_dir = TemporaryDirectory()
+    file_path = f"{temp_dir.name}/docker-compose.yaml"
+    other_path = f"{temp_dir.name}/other.yaml"
+    for path_to_write in [file_path, other_path]:
+        with open(path_to_write, "w") as file_fd:
+            file_fd.write("services: {}\n")
+    try:
+        watcher = (
+            watcher_class([file_path], 0.01)
+            if watcher_class is PollingWatcher
+            else watcher_class([file_path])
+        )
+    except OSError:
+        pytest.skip("inotify is not available")
+    try:
+        assert watcher.wait(0.05) == set()
+        with open(other_path, "w") as file_fd:
+            file_fd.write("services: {app: {}}\n")
+        assert watcher.wait(0.05) == set()
+        with open(file_path, "w") as file_fd:
+            file_fd.write("services: {app: {}}\n")
+        assert watcher.wait(2) == {file_path}
+    finally:
+        watcher.close()
+
+
+def test_render_server(capsys):
+    temp_dir = TemporaryDirectory()
+    socket_path = f"{temp_dir.name}/render.sock"
+    files = [f"{HERE}/valid_input.yaml", f"{HERE}/extension_input.yaml"]
+    server = RenderServer(socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        request = {"files": files, "env": {"LOG_LEVEL": "debug"}}
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            responses = list(
+                executor.map(lambda _: send_request(socket_path, request), range(8))
+            )
+        expected = ComposeDefinition(files, environ={"LOG_LEVEL": "debug"})
+        assert all(
+            response
+            == {"status": "success", "output": yaml.safe_dump(expected.definition)}
+            for response in responses
+        )
+        assert len(server.files_cache.files) == 2
+
+        response = send_request(socket_path, {"files": [f"{HERE}/invalid_input.yaml"]})
+        assert response["status"] == "failure"
+        assert response["error"].startswith("ValidationError")
+        assert send_request(socket_path, {})["status"] == "failure"
+        with pytest.raises(OSError):
+            RenderServer(socket_path)
+
+        output_file = f"{temp_dir.name}/rendered.json"
+        with mock.patch.object(
+            sys,
+            "argv",
+            ["compose-x-render", "-f", files[0], "-o", output_file, "--format", "json"],
+        ), mock.patch.dict(os.environ, {"COMPOSE_X_RENDER_SOCKET": socket_path}):
+            with mock.patch(
+                "compose_x_render.compose_x_render.ComposeDefinition.render"
+            ) as local_render:
+                assert main() == 0
+                local_render.assert_not_called()
+        with open(output_file) as output_fd:
+            assert json.load(output_fd) == ComposeDefinition([files[0]]).definition
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not path.exists(socket_path)
+    with pytest.raises(OSError):
+        send_request(socket_path, {"files": files})
+
+
+def test_cli_startup_imports():
+    from benchmarks.startup_bench import imported_modules, scenarios
+
+    temp_dir = TemporaryDirectory()
+    socket_path = f"{temp_dir.name}/render.sock"
+    invocations = scenarios(temp_dir.name)
+    subprocess.run(
+        [sys.executable, "-m", "compose_x_render.cli"] + invocations["cached render"],
+        capture_output=True,
+        check=True,
+    )
+    server = RenderServer(socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        forwarded = imported_modules(
+            invocations["render"],
+            dict(os.environ, COMPOSE_X_RENDER_SOCKET=socket_path),
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+    for modules in [
+        imported_modules(invocations["help"]),
+        imported_modules(invocations["argument error"]),
+        imported_modules(invocations["diff help"]),
+        imported_modules(invocations["diff argument error"]),
+        imported_modules(invocations["cached render"]),
+        forwarded,
+    ]:
+        assert "argparse" in modules
+        assert "jsonschema" not in modules
+        assert "yaml" not in modules
+    for name in ["help", "argument error", "diff help", "diff argument error"]:
+        assert "compose_x_common.compose_x_common" not in imported_modules(
+            invocations[name]
+        )
+    assert "compose_x_render.compose_x_render" not in forwarded
+    assert "jsonschema" in imported_modules(invocations["render"])
+
+
+@pytest.mark.parametrize(
+    "files, select",
+    [
+        (["valid_input.yaml", "extension_input.yaml"], ["services.*.image"]),
+        (
+            ["valid_input.yaml", "extension_input.yaml"],
+            ["services.*.ports", "services.app01.deploy"],
+        ),
+        (
+            ["valid_input.yaml", "extension_input.yaml"],
+            ["services.*.environment", "volumes", "secrets.*.file", "x-*"],
+        ),
+        (
+            ["valid_input.yaml", "extension_input.yaml"],
+            ["services.app01", "services.*.image"],
+        ),
+        (["valid_input.yaml", "extension_input.yaml"], ["*"]),
+        (["select_input.yaml", "select_override.yaml"], ["x-a.volumes"]),
+        (["select_input.yaml", "select_override.yaml"], ["x-b.c.volumes"]),
+    ],
+)
+def test_select(files, select):
+    files = [f"{HERE}/{file_name}" for file_name in files]
+    selection = parse_selectors(select)
+    compose_file = ComposeDefinition(files, select=select)
+    assert compose_file.definition == select_paths(
+        ComposeDefinition(files).definition, selection
+    )
+    assert (
+        ComposeDefinition(files, select=select, validator_engine="fast").definition
+        == compose_file.definition
+    )
+
+
+def test_select_validation():
+    assert parse_selectors(["services", "services.*.image", r"x-a\.b.c"]) == {
+        "services": {},
+        "x-a.b": {"c": {}},
+    }
+    with pytest.raises(ValueError):
+        parse_selectors(["services..image"])
+    files = [f"{HERE}/invalid_input.yaml"]
+    assert ComposeDefinition(files, select=["services.*.image"]).definition == {
+        "services": {"app01": {"image": "nginx"}}
+    }
+    for select, engine in [
+        (["services.*.deploy"], "jsonschema"),
+        (["services.app01.deploy.update_config"], "jsonschema"),
+        (["services.*.deploy"], "fast"),
+    ]:
+        with pytest.raises(ValidationError) as error:
+            ComposeDefinition(files, select=select, validator_engine=engine)
+        assert list(error.value.path) == [
+            "services",
+            "app01",
+            "deploy",
+            "update_config",
+            "failure_action",
+        ]
+    content = {"services": {"app": {"image": 5}, "other": []}, "volumes": 3}
+    with pytest.raises(ValidationError) as error:
+        ComposeDefinition(None, content=content, select=["services.app.image"])
+    assert list(error.value.path) == ["services", "app", "image"]
+    with pytest.raises(ValidationError) as error:
+        ComposeDefinition(None, content=content, select=["services.other.image"])
+    assert list(error.value.path) == ["services", "other"]
+    with pytest.raises(ValidationError):
+        ComposeDefinition(None, content=content, select=["volumes.data"])
+
+    extends = {"service": "base", "file": "common.yaml"}
+    content = {"services": {"app": {"image": "nginx", "extends": extends}}}
+    assert ComposeDefinition(
+        None, content=deepcopy(content), select=["services.*.extends.file"]
+    ).definition == {"services": {"app": {"extends": {"file": "common.yaml"}}}}
+    extends["file"] = 3
+    with pytest.raises(ValidationError) as error:
+        ComposeDefinition(None, content=content, select=["services.*.extends.file"])
+    assert list(error.value.absolute_path) == ["services", "app", "extends", "file"]
+    del extends["service"]
+    with pytest.raises(ValidationError) as error:
+        ComposeDefinition(
+            None, content=content, select=["services.app.extends.service"]
+        )
+    assert "'service' is a required property" in error.value.message
+
+
+def test_prune_services():
+    temp_dir = TemporaryDirectory()
+    base = {
+        "services": {
+            "web": {
+                "image": "nginx",
+                "depends_on": {"api": {"condition": "service_started"}},
+                "networks": {"front": {}},
+                "volumes": [
+                    "./html:/usr/share/nginx/html",
+                    "${STATIC_VOLUME}:/static",
+                    "${LOGS_VOLUME:-logs}:/var/log",
+                ],
+            },
+            "api": {
+                "image": "api",
+                "links": ["db:database"],
+                "secrets": [{"source": "token", "target": "/run/token"}],
+                "networks": ["back"],
+            },
+            "db": {
+                "image": "postgres",
+                "volumes": [{"type": "volume", "source": "data", "target": "/var"}],
+            },
+            "sidecar": {"image": "envoy", "network_mode": "service:web"},
+            "batch": {"image": "batch", "depends_on": ["db"], "configs": ["jobs"]},
+            "worker": {
+                "image": "worker",
+                "links": ["${BACKEND:-api}:backend"],
+                "volumes_from": ["service:${SOURCE:-db}:ro"],
+            },
+        },
+        "networks": {
+            "front": {},
+            "back": {},
+            "batch": {},
+            "default": {"driver": "bridge", "name": "custom-default"},
+        },
+        "volumes": {"data": {}, "static": {}, "logs": {}, "cache": {}},
+        "secrets": {"token": {"file": "token"}, "other": {"file": "other"}},
+        "configs": {"jobs": {"file": "jobs"}},
+        "x-tags": {"team": "web"},
+    }
+    override = {"services": {"api": {"configs": ["jobs"]}, "batch": {"image": "v2"}}}
+    files = []
+    for name, content in [("base.yaml", base), ("override.yaml", override)]:
+        files.append(f"{temp_dir.name}/{name}")
+        with open(files[-1], "w") as file_fd:
+            yaml.safe_dump(content, file_fd)
+    environ = {"STATIC_VOLUME": "static"}
+    full = ComposeDefinition(files, environ=environ).definition
+    definition = ComposeDefinition(files, environ=environ, services=["web"]).definition
+    assert set(definition["services"]) == {"web", "api", "db"}
+    assert all(
+        service == full["services"][name]
+        for name, service in definition["services"].items()
+    )
+    assert definition["networks"] == {
+        "front": {},
+        "back": {},
+        "default": {"driver": "bridge", "name": "custom-default"},
+    }
+    assert definition["volumes"] == {"data": {}, "static": {}, "logs": {}}
+    assert definition["secrets"] == {"token": {"file": "token"}}
+    assert definition["configs"] == {"jobs": {"file": "jobs"}}
+    assert definition["x-tags"] == {"team": "web"}
+
+    definition = ComposeDefinition(files, services=["sidecar", "batch"]).definition
+    assert set(definition["services"]) == {"sidecar", "web", "api", "db", "batch"}
+    definition = ComposeDefinition(files, services=["worker"]).definition
+    assert set(definition["services"]) == {"worker", "api", "db"}
+    definition = ComposeDefinition(files, services=["db"]).definition
+    assert set(definition) == {"services", "networks", "volumes", "x-tags"}
+    assert list(definition["networks"]) == ["default"]
+    definition = ComposeDefinition(files, services=["api"]).definition
+    assert list(definition["networks"]) == ["back", "default"]
+    with pytest.raises(ValueError):
+        ComposeDefinition(files, services=["web", "cache"])
+
+
+def test_render_sharded():
+    from benchmarks.generators import ProjectShape, project_contents, project_environ
+
+    shape = ProjectShape(services=120, ports=2, depth=2, extensions=3)
+    environ = project_environ(shape)
+    merged = merge_config_files_chain(project_contents(shape), environ)
+    expected = ComposeDefinition(
+        None, content=deepcopy(merged), environ=environ
+    ).definition
+    for validator in [None, get_validator()]:
+        definition = ComposeDefinition(
+            None,
+            content=deepcopy(merged),
+            environ=environ,
+            validator=validator,
+            service_jobs=2,
+        ).definition
+        assert definition == expected
+        assert list(definition["services"]) == list(expected["services"])
+
+    invalid_name = deepcopy(merged)
+    invalid_name["services"]["app 0001"] = invalid_name["services"].pop("app0001")
+    merged["services"]["app0100"]["image"] = 5
+    merged["services"]["app0010"]["ports"] = [{"target": "http"}]
+    for content in [merged, invalid_name]:
+        with pytest.raises(ValidationError) as expected_error:
+            ComposeDefinition(None, content=deepcopy(content), environ=environ)
+        for engine in ["jsonschema", "fast"]:
+            profile = RenderProfile()
+            with pytest.raises(ValidationError) as error:
+                ComposeDefinition(
+                    None,
+                    content=deepcopy(content),
+                    environ=environ,
+                    validator_engine=engine,
+                    service_jobs=4,
+                    profile=profile,
+                )
+            assert list(error.value.path) == list(expected_error.value.path)
+            assert error.value.message == expected_error.value.message
+            assert [stage["stage"] for stage in profile.stages] == [
+                "services",
+                "validation",
+            ]
+
+
+def test_diff_definitions():
+    from compose_x_render.diff import diff_definitions, diff_renders, format_changes
+    from compose_x_render.fingerprints import definition_fingerprints
+
+    old = {
+        "services": {
+            "a": {"image": "nginx:1", "ports": [{"target": 80}, {"target": 443}]},
+            "b": {"image": "redis", "x-tags": {"a.b": 1}},
+        },
+        "volumes": {"data": {}},
+    }
+    new = deepcopy(old)
+    new["services"]["a"]["ports"].reverse()
+    assert diff_definitions(old, new) == []
+
+    new["services"]["a"]["image"] = "nginx:2"
+    new["services"]["a"]["ports"].append({"target": 8080})
+    new["services"]["b"]["x-tags"]["a.b"] = 2
+    del new["volumes"]
+    new["networks"] = {"front": {}}
+    changes = diff_definitions(old, new)
+    assert format_changes(changes) == (
+        '~ services.a.image: "nginx:1" -> "nginx:2"\n'
+        '+ services.a.ports[2]: {"target":8080}\n'
+        "~ services.b.x-tags.a\\.b: 1 -> 2\n"
+        '- volumes: {"data":{}}\n'
+        '+ networks: {"front":{}}\n'
+    )
+    assert json.loads(format_changes(changes, "json"))[0] == {
+        "path": ["services", "a", "image"],
+        "change": "changed",
+        "old": "nginx:1",
+        "new": "nginx:2",
+    }
+    with pytest.raises(ValueError):
+        format_changes(changes, "yaml")
+
+    old = {"services": {"a": {"command": ["--port", 1, "--admin", 2]}}}
+    new = {"services": {"a": {"command": ["--port", 2, "--admin", 1]}}}
+    assert format_changes(diff_definitions(old, new)) == (
+        "~ services.a.command[1]: 1 -> 2\n~ services.a.command[3]: 2 -> 1\n"
+    )
+    assert definition_fingerprints(old) != definition_fingerprints(new)
+    new["services"]["a"]["command"] = ["--debug", "--port", 1, "--admin", 2]
+    assert format_changes(diff_definitions(old, new)) == (
+        '+ services.a.command[0]: "--debug"\n'
+    )
+
+    files = [f"{HERE}/valid_input.yaml", f"{HERE}/extension_input.yaml"]
+    assert diff_renders(files[:1], files[:1]) == []
+    changes = diff_renders(files[:1], files, select=["services.*.environment"])
+    assert changes[0] == {
+        "path": ["services", "app01", "environment", "LOGLEVEL"],
+        "change": "changed",
+        "old": "",
+        "new": "DEBUG",
+    }
+    with mock.patch.object(
+        sys,
+        "argv",
+        ["compose-x-render", "diff", "--old", files[0], "--new", files[0]],
+    ):
+        assert main() == 0
+
+
+def test_fingerprints():
+    from compose_x_render.fingerprints import definition_fingerprints
+
+    definition = ComposeDefinition([f"{HERE}/valid_input.yaml"]).definition
+    fingerprints = definition_fingerprints(definition)
+    assert set(fingerprints["services"]) == set(definition["services"])
+    assert set(fingerprints["sections"]) == set(definition)
+
+    reordered = {
+        key: (
+            {name: dict(reversed(service.items())) for name, service in value.items()}
+            if key == "services"
+            else value
+        )
+        for key, value in reversed(definition.items())
+    }
+    assert definition_fingerprints(reordered) == fingerprints
+    reordered["services"]["app01"]["ports"].reverse()
+    assert definition_fingerprints(reordered) == fingerprints
+    changed = deepcopy(definition)
+    changed["services"]["app01"]["image"] = "nginx:changed"
+    changed_fingerprints = definition_fingerprints(changed)
+    assert [
+        name
+        for name, value in changed_fingerprints["services"].items()
+        if value != fingerprints["services"][name]
+    ] == ["app01"]
+    assert [
+        key
+        for key, value in changed_fingerprints["sections"].items()
+        if value != fingerprints["sections"][key]
+    ] == ["services"]
+    assert definition_fingerprints({"services": {"a": {"x": 1}}}) != (
+        definition_fingerprints({"services": {"a": {"x": "1"}}})
+    )
+
+    temp_dir = TemporaryDirectory()
+    manifests = []
+    for hash_seed in ["1", "2"]:
+        fingerprints_file = f"{temp_dir.name}/fingerprints-{hash_seed}.json"
+        subprocess.run(
+            [sys.executable, "-m", "compose_x_render.cli"]
+            + ["-f", f"{HERE}/valid_input.yaml", "-o", f"{temp_dir.name}/out.yaml"]
+            + ["--fingerprints", fingerprints_file, "--no-server"],
+            env=dict(os.environ, PYTHONHASHSEED=hash_seed),
+            check=True,
+        )
+        with open(fingerprints_file) as fingerprints_fd:
+            manifests.append(json.load(fingerprints_fd))
+    assert manifests[0] == manifests[1] == fingerprints